@@ -0,0 +1,438 @@
+"""
+Checkpoint and resume of experiments
+
+Executes the runs of a radCAD Experiment or Simulation, checkpointing progress to a
+directory, so that a long experiment interrupted by a crash or a notebook kernel restart
+can be resumed without repeating completed work:
+* Each completed run is written to `{directory}/runs/`, and skipped when resuming
+* Every `every` timesteps, each in-flight run appends the results since its last
+  checkpoint, and the state of its random number generator, to `{directory}/in_flight/`,
+  and resumes from its last checkpoint
+
+Every run draws from its own random number generator, seeded from the `seed` System
+Parameter, or the experiment `seed` of the checkpointer if given, and its simulation,
+subset and run indices (see `model.utils.run_rng(...)`), so that runs are reproducible
+independently of the process and order they are executed in, and a resumed experiment
+produces results identical to an uninterrupted experiment with the same seed.
+
+The runs of an experiment can also be split across independent jobs (e.g. on several
+nodes) using `shard`, each checkpointing a deterministic slice of the runs to its own
+directory, see `experiments.shard`.
+
+Usage:
+```python
+from experiments.checkpoint import Checkpointer
+from experiments.run import run, resume
+
+df, exceptions = run(experiment, checkpointer=Checkpointer("checkpoints", every=50))
+# After an interruption, skip completed runs and resume in-flight runs from their last
+# checkpoint
+df, exceptions = resume(experiment, checkpointer=Checkpointer("checkpoints", every=50))
+```
+"""
+
+import dataclasses
+import glob
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import traceback
+from functools import partial
+
+import numpy as np
+import radcad.core as core
+from radcad import Backend
+from radcad.utils import extract_exceptions
+
+from model.utils import run_rng
+
+
+def _fingerprint(value):
+    """A JSON-serializable representation of a System Parameter value, independent of
+    the process it is computed in"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {str(key): _fingerprint(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_fingerprint(item) for item in value]
+    if isinstance(value, np.ndarray):
+        array = np.ascontiguousarray(value)
+        return [
+            array.dtype.str,
+            list(array.shape),
+            hashlib.sha1(array.tobytes()).hexdigest(),
+        ]
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return [type(value).__qualname__, _fingerprint(dataclasses.asdict(value))]
+    if getattr(value, "spec", None) is not None:
+        # A `SampledProcess` of a process specification
+        return [type(value).__qualname__, _fingerprint(value.spec)]
+    if hasattr(value, "samples"):
+        return [type(value).__qualname__, _fingerprint(np.asarray(value.samples))]
+    if hasattr(value, "__code__"):
+        return [
+            value.__module__,
+            value.__qualname__,
+            hashlib.sha1(value.__code__.co_code).hexdigest(),
+        ]
+    if hasattr(value, "__slots__"):
+        return [
+            type(value).__qualname__,
+            {name: _fingerprint(getattr(value, name)) for name in value.__slots__},
+        ]
+    if hasattr(value, "__dict__"):
+        return [type(value).__qualname__, _fingerprint(vars(value))]
+    return repr(value)
+
+
+UNHASHED_PARAMETERS = ["date_start"]
+"""System Parameters excluded from `parameters_hash(...)`: `date_start` defaults to the
+current time, so differs between the jobs of an experiment, and only sets the timestamps
+of the results"""
+
+
+def parameters_hash(params: dict) -> str:
+    """A stable hash of the System Parameters of a subset, identifying the configuration
+    of its runs across processes and nodes, e.g. to detect a checkpoint or shard of a
+    different configuration"""
+    params = {
+        key: value for key, value in params.items() if key not in UNHASHED_PARAMETERS
+    }
+    encoded = json.dumps(_fingerprint(params), sort_keys=True, default=str)
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+
+def scalar_parameters(params: dict) -> dict:
+    """The System Parameters of a subset with scalar values, e.g. `dt` or `option_type`,
+    recorded in the manifest so that the results of a checkpoint or its shards can be
+    post-processed without the experiment, see `load_parameters(...)`"""
+    return {
+        key: value
+        for key, value in params.items()
+        if key not in UNHASHED_PARAMETERS
+        and (value is None or isinstance(value, (bool, int, float, str)))
+    }
+
+
+def load_parameters(directory, simulation=0) -> dict:
+    """Load the scalar System Parameters of each subset of a simulation from the
+    manifest of a checkpoint directory, as the System Parameters of a radCAD Model, e.g.
+    for `experiments.post_processing.post_process(...)`"""
+    with open(os.path.join(directory, "manifest.json")) as f:
+        subsets = json.load(f)["simulations"][simulation]["parameter_values"]
+    return {key: [subset[key] for subset in subsets] for key in subsets[0]}
+
+
+def _run_name(run_args):
+    return f"{run_args.simulation}-{run_args.subset}-{run_args.run}.pkl"
+
+
+def _write_atomic(path, value):
+    """Pickle `value` to `path`, replacing any existing file only once the value is
+    completely written"""
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(value, f, -1)
+    os.replace(path + ".tmp", path)
+
+
+def _load_in_flight(path):
+    """Load the results and RNG state of an in-flight run from its last complete
+    checkpoint, if any"""
+    result, rng_state = [], None
+    if not os.path.exists(path):
+        return result, rng_state
+    with open(path, "rb") as f:
+        end = 0
+        while True:
+            try:
+                rows, rng_state_ = pickle.load(f)
+            except Exception:
+                # A checkpoint that was interrupted while being written is ignored
+                break
+            result.extend(rows)
+            rng_state = rng_state_
+            end = f.tell()
+    # Truncate any incomplete checkpoint, so that new checkpoints are appended after the
+    # last complete one
+    os.truncate(path, end)
+    return result, rng_state
+
+
+def _execute_run(args):
+    """Execute a single run, resuming from and writing checkpoints
+
+    A reimplementation of `radcad.core._single_run(...)` that can continue a run from a
+    partial result, which radCAD itself only supports from the Initial State.
+    """
+    run_args, directory, every, raise_exceptions = args
+    simulation, timesteps, run, subset = run_args[:4]
+    initial_state, state_update_blocks, params, deepcopy, drop_substeps = run_args[4:]
+    name = _run_name(run_args)
+    in_flight_path = os.path.join(directory, "in_flight", name)
+
+    result, rng_state = _load_in_flight(in_flight_path)
+    rng = run_rng(params)
+    # Number of results already written to the in-flight checkpoint
+    checkpointed = len(result)
+    if result:
+        logging.info(
+            f"Resuming simulation {simulation} / run {run} / subset {subset} "
+            f"from timestep {len(result) - 1}"
+        )
+        rng.set_state(rng_state)
+        initial_state = result[0][0]
+    else:
+        logging.info(f"Starting simulation {simulation} / run {run} / subset {subset}")
+        initial_state["simulation"] = simulation
+        initial_state["subset"] = subset
+        initial_state["run"] = run + 1
+        initial_state["substep"] = 0
+        if not initial_state.get("timestep", False):
+            initial_state["timestep"] = 0
+        result.append([initial_state])
+
+    try:
+        for timestep in range(len(result) - 1, timesteps):
+            previous_state = result[-1][-1].copy()
+            substeps = []
+            substate = previous_state.copy()
+            for substep, psu in enumerate(state_update_blocks):
+                substate = (
+                    previous_state.copy()
+                    if substep == 0
+                    else substeps[substep - 1].copy()
+                )
+                substate_copy = (
+                    pickle.loads(pickle.dumps(substate, -1))
+                    if deepcopy
+                    else substate.copy()
+                )
+                substate["substep"] = substep + 1
+                signals = core.reduce_signals(
+                    params, substep, result, substate_copy, psu, deepcopy
+                )
+                updated_state = map(
+                    partial(
+                        core._update_state,
+                        initial_state,
+                        params,
+                        substep,
+                        result,
+                        substate_copy,
+                        signals,
+                    ),
+                    psu["variables"].items(),
+                )
+                substate.update(updated_state)
+                substate["timestep"] = (
+                    (previous_state["timestep"] + 1) if timestep == 0 else timestep + 1
+                )
+                substeps.append(substate)
+            substeps = [substate] if not substeps else substeps
+            result.append(substeps if not drop_substeps else [substeps.pop()])
+
+            if (timestep + 1) % every == 0 and timestep + 1 < timesteps:
+                with open(in_flight_path, "ab") as f:
+                    pickle.dump((result[checkpointed:], rng.get_state()), f, -1)
+                checkpointed = len(result)
+        exception = None
+        trace = None
+    except Exception as error:
+        if raise_exceptions:
+            raise
+        exception = error
+        trace = traceback.format_exc()
+        logging.warning(
+            f"Simulation {simulation} / run {run} / subset {subset} failed! "
+            "Returning partial results."
+        )
+
+    _write_atomic(os.path.join(directory, "runs", name), (result, exception, trace))
+    if os.path.exists(in_flight_path):
+        os.remove(in_flight_path)
+    return name
+
+
+def load_runs(paths):
+    """Load completed run files, returning the results and exceptions of each run in the
+    format of `radcad.core` executors"""
+    results = []
+    for path in paths:
+        with open(path, "rb") as f:
+            result, exception, trace = pickle.load(f)
+        simulation, subset, run = map(
+            int, os.path.basename(path)[: -len(".pkl")].split("-")
+        )
+        results.append(
+            (
+                result,
+                {
+                    "exception": exception,
+                    "traceback": trace,
+                    "simulation": simulation,
+                    "run": run,
+                    "subset": subset,
+                },
+            )
+        )
+    return results
+
+
+class Checkpointer:
+    """Checkpointed execution of an experiment, see the module documentation
+
+    Args:
+        directory (str): Checkpoint directory
+        every (int): Checkpoint in-flight runs every `every` timesteps
+        seed (int, optional): Experiment seed, from which the seed of each run is
+            derived, overriding the `seed` System Parameter if given
+    """
+
+    def __init__(self, directory="checkpoints", every=50, seed=None):
+        self.directory = os.path.abspath(directory)
+        self.every = every
+        self.seed = seed
+
+    def _params(self, simulation):
+        """The System Parameters of `simulation`, with the `seed` System Parameter
+        overridden by the experiment seed"""
+        params = simulation.model.params
+        return params if self.seed is None else dict(params, seed=[self.seed])
+
+    def _manifest(self, executable, shard=None):
+        """The experiment configuration, checked when resuming from a checkpoint and
+        when merging shards: the seed, shard, and the size, a hash, and the scalar
+        values of the System Parameters of each subset of each simulation"""
+        configurations = []
+        for simulation in getattr(executable, "simulations", [executable]):
+            subsets = core.generate_parameter_sweep(self._params(simulation))
+            configurations.append(
+                {
+                    "timesteps": simulation.timesteps,
+                    "runs": simulation.runs,
+                    "subsets": len(subsets) or 1,
+                    "parameters": [parameters_hash(subset) for subset in subsets],
+                    "parameter_values": [
+                        scalar_parameters(subset) for subset in subsets
+                    ],
+                }
+            )
+        return {
+            "seed": self.seed,
+            "shard": list(shard) if shard else None,
+            "simulations": configurations,
+        }
+
+    def _clear(self):
+        """Remove the checkpoint from the directory, leaving any other files in it"""
+        manifest_path = os.path.join(self.directory, "manifest.json")
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        for name in ("runs", "in_flight"):
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def completed(self):
+        """Return the file names of the completed runs,
+        `{simulation}-{subset}-{run}.pkl`"""
+        return {
+            os.path.basename(path)
+            for path in glob.glob(os.path.join(self.directory, "runs", "*.pkl"))
+        }
+
+    def run(self, executable, resume=False, shard=None):
+        """Execute all runs of `executable`, setting its `results` and `exceptions` as
+        `executable.run()` does
+
+        Args:
+            resume (bool): Resume from the checkpoint directory, rather than starting
+                from scratch
+            shard (tuple, optional): Only execute the runs of shard `(index, count)`,
+                i.e. every `count`-th run of the experiment starting from run `index`,
+                in the order radCAD executes runs, setting `results` to the results of
+                those runs only
+        """
+        if shard and not 0 <= shard[0] < shard[1]:
+            raise ValueError(f"Invalid shard {shard[0]} of {shard[1]}")
+        manifest = self._manifest(executable, shard)
+        manifest_path = os.path.join(self.directory, "manifest.json")
+        if resume and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                if json.load(f) != manifest:
+                    raise ValueError(
+                        f"Checkpoint in {self.directory} is for a different experiment "
+                        "configuration or seed"
+                    )
+        else:
+            self._clear()
+        os.makedirs(os.path.join(self.directory, "runs"), exist_ok=True)
+        os.makedirs(os.path.join(self.directory, "in_flight"), exist_ok=True)
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+
+        engine = executable.engine
+        engine.executable = executable
+        simulations = getattr(executable, "simulations", [executable])
+        configs = [
+            (
+                simulation.model.initial_state,
+                simulation.model.state_update_blocks,
+                self._params(simulation),
+                simulation.timesteps,
+                simulation.runs,
+            )
+            for simulation in simulations
+        ]
+
+        experiment = executable if hasattr(executable, "simulations") else None
+        executable._before_experiment(experiment=experiment)
+        completed = self.completed()
+        names = []
+        pending = []
+        for index, run_args in enumerate(engine._run_stream(configs)):
+            if shard and index % shard[1] != shard[0]:
+                continue
+            names.append(_run_name(run_args))
+            if names[-1] in completed:
+                # Remove the checkpoint of a run interrupted after it completed
+                in_flight_path = os.path.join(self.directory, "in_flight", names[-1])
+                if os.path.exists(in_flight_path):
+                    os.remove(in_flight_path)
+            else:
+                pending.append(
+                    (run_args, self.directory, self.every, engine.raise_exceptions)
+                )
+        logging.info(
+            f"{len(names) - len(pending)} of {len(names)} runs already completed"
+        )
+
+        if engine.backend in [Backend.DEFAULT, Backend.PATHOS] and len(pending) > 1:
+            from pathos.multiprocessing import ProcessPool
+
+            with ProcessPool(engine.processes) as pool:
+                pool.map(_execute_run, pending)
+                pool.close()
+                pool.join()
+                pool.clear()
+        elif engine.backend == Backend.MULTIPROCESSING and len(pending) > 1:
+            import multiprocessing
+
+            with multiprocessing.get_context("spawn").Pool(
+                processes=engine.processes
+            ) as pool:
+                pool.map(_execute_run, pending)
+        else:
+            for args in pending:
+                _execute_run(args)
+
+        results = load_runs(
+            [os.path.join(self.directory, "runs", name) for name in names]
+        )
+        executable.results, executable.exceptions = extract_exceptions(results)
+        executable._after_experiment(experiment=experiment)
+        return executable.results
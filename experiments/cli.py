@@ -0,0 +1,219 @@
+"""
+Headless command line interface
+
+Runs an experiment of the default model with the simulation size and configuration given
+by command line flags or a JSON config file, building the model at runtime using
+`experiments.default_experiment.create_experiment(...)`, so that scaling studies and
+batch jobs don't require editing `experiments.simulation_configuration`.
+
+Flags override the config file, which overrides the defaults of
+`experiments.simulation_configuration` and `model.system_parameters`.
+
+Usage, from the root of the project directory:
+```bash
+python -m experiments.cli --timesteps 365 --runs 20 --agents 500 --scenario Bear \
+    --option-type put --backend SINGLE_PROCESS --output results.pkl
+python -m experiments.cli --config job.json --runs 4
+python -m experiments.cli --runs 1000 --process block_bootstrap_process \
+    --price-history prices.csv
+```
+where `job.json` contains any of the flags as keys, e.g.
+`{"agents": 500, "option_type": "put"}`. Results are written as a pickled DataFrame
+for a `.pkl` output path, or as a CSV file of the State Variables other than agents for
+a `.csv` output path.
+
+With `--price-history`, a local CSV or Parquet file of historical prices is used by the
+`--process`, e.g. `historical_replay_process` or `block_bootstrap_process`, see
+`model.historical_prices`.
+
+With `--shards`, only the runs of shard `--shard` are executed and checkpointed to
+`--checkpoint`, with the shard index read from the batch scheduler's job array task
+index if not given, and the shards are merged using `python -m experiments.shard`, see
+`experiments.shard`.
+"""
+
+import argparse
+import json
+import logging
+import os
+
+import experiments.simulation_configuration as simulation_configuration
+
+
+DEFAULTS = {
+    "timesteps": simulation_configuration.TIMESTEPS,
+    "runs": simulation_configuration.MONTE_CARLO_RUNS,
+    "agents": simulation_configuration.N_AGENTS,
+    "scenario": "Bull",
+    "option_type": "call",
+    "process": "manual_gbm_process",
+    "price_history": None,
+    "backend": "DEFAULT",
+    "output": None,
+    "event_driven": False,
+    "checkpoint": None,
+    "resume": False,
+    "seed": 1,
+    "shards": None,
+    "shard": None,
+}
+"""Default configuration, see `parse_config(...)`"""
+
+
+def parse_config(argv=None) -> dict:
+    """Parse the command line flags and config file into a configuration dictionary with
+    the keys of `DEFAULTS`"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--config", help="JSON config file, with any of the flags below as keys"
+    )
+    parser.add_argument("--timesteps", type=int, help="Number of timesteps")
+    parser.add_argument("--runs", type=int, help="Number of Monte Carlo runs")
+    parser.add_argument("--agents", type=int, help="Number of agents")
+    parser.add_argument("--scenario", help="Market scenario, e.g. Bull or Bear")
+    parser.add_argument(
+        "--option-type", dest="option_type", help="Option type: call, put or straddle"
+    )
+    parser.add_argument(
+        "--process",
+        help="Price process, e.g. heston_process or block_bootstrap_process",
+    )
+    parser.add_argument(
+        "--price-history",
+        dest="price_history",
+        help="Historical prices file, .csv or .parquet",
+    )
+    parser.add_argument(
+        "--backend",
+        help="radCAD Backend name, e.g. DEFAULT, SINGLE_PROCESS or MULTIPROCESSING",
+    )
+    parser.add_argument("--output", help="Results path, .pkl or .csv")
+    parser.add_argument(
+        "--event-driven",
+        dest="event_driven",
+        action="store_true",
+        default=None,
+        help="Run in event-driven mode",
+    )
+    parser.add_argument(
+        "--checkpoint", help="Checkpoint directory, see experiments.checkpoint"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        default=None,
+        help="Resume from the checkpoint directory",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="Experiment seed, from which the seed of each run is derived",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        help="Number of shards the runs are split across, see experiments.shard",
+    )
+    parser.add_argument(
+        "--shard",
+        type=int,
+        help="Index of the shard to execute, by default from the job array task index",
+    )
+    args = vars(parser.parse_args(argv))
+
+    config = dict(DEFAULTS)
+    config_path = args.pop("config")
+    if config_path:
+        with open(config_path) as f:
+            file_config = json.load(f)
+        unknown = set(file_config) - set(DEFAULTS)
+        if unknown:
+            parser.error(
+                f"Unknown keys in config file {config_path}: {sorted(unknown)}"
+            )
+        config.update(file_config)
+    config.update({key: value for key, value in args.items() if value is not None})
+    return config
+
+
+def write_results(df, output):
+    """Write the results DataFrame to `output`, a `.pkl` or `.csv` path"""
+    extension = os.path.splitext(output)[1]
+    if extension in (".pkl", ".pickle"):
+        df.to_pickle(output)
+    elif extension == ".csv":
+        # Agents and other objects aren't representable as CSV values
+        columns = [
+            column
+            for column in df.columns
+            if not column.startswith("agent_") and df[column].dtype != object
+        ]
+        df[columns].to_csv(output, index=False)
+    else:
+        raise ValueError(f"Unsupported output format {extension}, one of .pkl or .csv")
+
+
+def main(argv=None):
+    """Run the experiment configured by the command line flags `argv` and config file,
+    see `parse_config(...)`
+
+    Returns:
+        tuple: The post-processed results DataFrame and the exceptions of the runs, as
+            `experiments.run.run(...)`
+    """
+    config = parse_config(argv)
+
+    from radcad import Backend
+
+    from experiments.default_experiment import create_experiment
+    from experiments.run import run
+
+    experiment = create_experiment(
+        timesteps=config["timesteps"],
+        runs=config["runs"],
+        n_agents=config["agents"],
+        scenario=config["scenario"],
+        option_type=config["option_type"],
+        backend=Backend[config["backend"]],
+        process=config["process"],
+        process_parameters=(
+            {"path": config["price_history"]} if config["price_history"] else None
+        ),
+    )
+    for simulation in experiment.simulations:
+        simulation.model.params.update({"seed": [config["seed"]]})
+    logging.info(f"Running experiment with configuration {config}")
+
+    checkpointer = None
+    if config["checkpoint"]:
+        from experiments.checkpoint import Checkpointer
+
+        checkpointer = Checkpointer(config["checkpoint"])
+
+    shard = None
+    if config["shards"]:
+        from experiments.shard import shard_from_environment
+
+        index = (
+            config["shard"] if config["shard"] is not None else shard_from_environment()
+        )
+        shard = (index, config["shards"])
+
+    df, exceptions = run(
+        experiment,
+        event_driven=config["event_driven"],
+        checkpointer=checkpointer,
+        resume=config["resume"],
+        shard=shard,
+    )
+
+    if config["output"]:
+        write_results(df, config["output"])
+        logging.info(f"Results written to {config['output']}")
+    else:
+        print(df)
+    return df, exceptions
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,111 @@ The defaults are defined in their respective modules:
 * Initial State in `model/state_variables.py`
 * System Parameters in `model/system_parameters.py`
 * Simulation Configuration in `experiments/simulation_configuration.py`
+
+Experiments of other sizes and configurations are created at runtime using `create_experiment(...)`,
+e.g. by the command line interface in `experiments/cli.py`.
 """
 
-from radcad import Simulation, Experiment, Backend
+import copy
+
+from radcad import Model, Simulation, Experiment, Backend
 
 from model import model
-from experiments.simulation_configuration import TIMESTEPS, MONTE_CARLO_RUNS
+from experiments.simulation_configuration import TIMESTEPS, MONTE_CARLO_RUNS, N_AGENTS
 from model.initialization import setup_initial_state
+from model.state_update_blocks import create_state_update_blocks
+from model.state_variables import create_initial_state
+from model.system_parameters import (
+    parameters,
+    scenario as default_scenario,
+    create_agents,
+    create_volatile_asset_price_process,
+)
+
+
+def configure_experiment(simulation, experiment, backend=Backend.DEFAULT):
+    """Configure the engine and hooks of an experiment of a single simulation"""
+    # Configure Simulation & Experiment engine
+    simulation.engine = experiment.engine
+    experiment.engine.backend = backend
+    experiment.engine.deepcopy = True
+    experiment.engine.drop_substeps = True
+
+    # Configure simulation hooks
+    before_subset = lambda context: [
+        setup_initial_state(context),
+    ]
+    simulation.before_subset = before_subset
+    experiment.before_subset = before_subset
+
+
+def configure_model(simulation):
+    """Build the State Update Blocks and Initial State of the model of `simulation` from its System Parameters,
+    including those of the multi-position option market and loan book only if `position_ledger` and `loan_book`
+    are enabled in any parameter subset
+
+    Call after updating the `position_ledger` or `loan_book` System Parameters of an existing simulation, e.g.
+    ```python
+    simulation.model.params.update({"position_ledger": [True]})
+    configure_model(simulation)
+    ```
+    """
+    params = simulation.model.params
+    position_ledger = any(params["position_ledger"])
+    loan_book = any(params["loan_book"])
+    simulation.model.state_update_blocks = create_state_update_blocks(list(params["agents"][0]), position_ledger, loan_book)
+    simulation.model.initial_state = create_initial_state(position_ledger, loan_book)
+
+
+def create_experiment(
+    timesteps=TIMESTEPS,
+    runs=MONTE_CARLO_RUNS,
+    n_agents=N_AGENTS,
+    scenario=default_scenario,
+    option_type="call",
+    backend=Backend.DEFAULT,
+    process="manual_gbm_process",
+    process_parameters=None,
+) -> Experiment:
+    """Create an experiment of the default model with the given size and configuration,
+    building the agent State Variables, State Update Blocks and price paths at runtime
+
+    Args:
+        timesteps (int): Number of timesteps
+        runs (int): Number of Monte Carlo runs
+        n_agents (int): Number of agents
+        scenario (str): Market scenario, one of `model.system_parameters.market_conditions`
+        option_type (str): Option type, one of `model.parts.options.PAYOFFS`
+        backend (radcad.Backend): radCAD engine backend
+        process (str): Price process, see `model.stochastic_processes.create_stochastic_process_realizations(...)`,
+            e.g. `block_bootstrap_process` to backtest against bootstrapped historical returns
+        process_parameters (dict): Price process parameters in addition to those of the scenario,
+            e.g. `{"path": "prices.csv"}`
+    """
+    from model.parts.options import PAYOFFS
+
+    if option_type not in PAYOFFS:
+        raise ValueError(f"Unknown option type {option_type}, one of {list(PAYOFFS)}")
+
+    agents = create_agents(n_agents)
+    params = copy.deepcopy(parameters)
+    params.update(
+        {
+            "agents": [agents],
+            "volatile_asset_price_process": [
+                create_volatile_asset_price_process(
+                    scenario, timesteps, runs, process=process, **(process_parameters or {})
+                )
+            ],
+            "option_type": [option_type],
+        }
+    )
+    runtime_model = Model(params=params)
+    runtime_simulation = Simulation(model=runtime_model, timesteps=timesteps, runs=runs)
+    configure_model(runtime_simulation)
+    runtime_experiment = Experiment([runtime_simulation])
+    configure_experiment(runtime_simulation, runtime_experiment, backend)
+    return runtime_experiment
 
 
 # +
@@ -22,15 +120,4 @@ simulation = Simulation(
 )
 # Create Experiment of single Simulation
 experiment = Experiment([simulation])
-# Configure Simulation & Experiment engine
-simulation.engine = experiment.engine
-experiment.engine.backend = Backend.DEFAULT
-experiment.engine.deepcopy = True
-experiment.engine.drop_substeps = True
-
-# Configure simulation hooks
-before_subset = lambda context: [
-    setup_initial_state(context),
-]
-simulation.before_subset = before_subset
-experiment.before_subset = before_subset
+configure_experiment(simulation, experiment)
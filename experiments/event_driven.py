@@ -0,0 +1,337 @@
+"""
+Event-driven simulation mode
+
+An alternative execution engine for the default single-position agent model
+(`model.parts.agents.policy_agents(...)`), that only executes the timesteps where agents
+act, instead of executing the policy for every agent and every timestep.
+
+In the step-by-step model each agent draws independent Bernoulli(p) sell, buy and
+exercise decisions every timestep, most of which have no effect. The times at which each
+decision succeeds form a Bernoulli process, so the gap to the next success is
+geometrically distributed: the event-driven engine draws each agent's next action time
+from the geometric distribution, and processes actions from a priority queue ordered by
+(timestep, agent, action), which is the order in which the step-by-step policy processes
+agents within a timestep. Action conditions and effects are evaluated using the same
+`Agent` methods as the step-by-step policy, so the results are statistically equivalent,
+although not identical for the same seed.
+
+A clock is dropped when its action can no longer have an effect (e.g. the buy clock of
+an agent with a counterparty, or all clocks of an agent that has exercised), and
+restarted when the agent state makes it effective again. The timesteps between actions
+only update the volatile asset price and the discounted payoff, which are computed in
+bulk, and a run terminates early when no clocks remain.
+
+The results DataFrame has the same format as `pd.DataFrame(simulation.results)` with
+`drop_substeps` enabled. Agents that don't change between timesteps share the same
+`Agent` instance across rows, rather than being copied.
+
+Usage:
+```python
+from experiments.run import run
+
+df, exceptions = run(experiment, event_driven=True)
+```
+"""
+
+import copy
+import heapq
+import logging
+from bisect import insort
+
+import numpy as np
+import pandas as pd
+from radcad.core import generate_parameter_sweep
+from radcad.wrappers import Context
+
+import model.parts.options as options
+from model.types import Option
+from model.utils import run_rng
+
+
+# Agent actions, in the order the step-by-step policy evaluates them for each agent
+# within a timestep
+SELL = 0
+BUY = 1
+EXERCISE = 2
+
+
+def estimate_volatilities(prices, option_maturity):
+    """Vectorized `model.parts.agents.estimate_volatility(...)` for every timestep
+
+    Args:
+        prices (np.ndarray): The volatile asset price of each row of the results, from
+            timestep 0 to T
+    Returns:
+        np.ndarray: The volatility used by the agent policy at each timestep from 0 to T
+    """
+    returns = prices[1:] / prices[:-1] - 1
+    count = np.arange(1, len(returns) + 1)
+    mean = np.cumsum(returns) / count
+    variance = np.maximum(np.cumsum(returns**2) / count - mean**2, 0.0)
+
+    sigma = np.full(len(prices), 0.1)
+    # At timestep t the policy uses the returns of the prices of timesteps 0 to t - 1,
+    # i.e. the first t - 1 returns
+    timesteps = np.arange(3, len(prices))
+    sigma[timesteps] = np.sqrt(variance[timesteps - 2]) * np.sqrt(option_maturity)
+    return sigma
+
+
+def simulate_run(initial_state: dict, params: dict, timesteps: int, run: int):
+    """Simulate a single run of the default agent model in event-driven mode
+
+    Args:
+        initial_state (dict): Initial State, including `agent_*` State Variables
+        params (dict): System Parameters of a single subset
+        timesteps (int): Number of timesteps
+        run (int): Run number, starting from 1
+    Returns:
+        tuple: A dictionary of results columns from timestep 0 to T, and a dictionary of
+            run statistics
+    """
+    if params.get("position_ledger"):
+        raise ValueError(
+            "The event-driven mode doesn't support the multi-position option market"
+        )
+    if params.get("loan_book"):
+        raise ValueError("The event-driven mode doesn't support the loan book")
+    strategies = {
+        name for name, share in params["agent_strategies"].items() if share > 0
+    }
+    if strategies != {"random"}:
+        raise ValueError(
+            "The event-driven mode only supports agents of the random strategy"
+        )
+
+    dt = params["dt"]
+    strike_price = params["strike_price"]
+    option_maturity = params["option_maturity"]
+    option_type = params["option_type"]
+    option_pricing_surface = params.get("option_pricing_surface")
+    risk_free_rate = initial_state["risk_free_rate"]
+    process = params["volatile_asset_price_process"]
+
+    # Volatile asset price and discounted payoff, see `model.parts.options`
+    prices = np.empty(timesteps + 1)
+    prices[0] = initial_state["volatile_asset_price"]
+    prices[1:] = [process(run, timestep * dt) for timestep in range(timesteps)]
+    discounted_payoffs = options.discounted_payoff_series(
+        prices, option_type, strike_price, option_maturity, risk_free_rate, dt
+    )
+    discounted_payoffs[0] = initial_state["discounted_payoff"]
+    volatilities = estimate_volatilities(prices, option_maturity)
+
+    agent_keys = sorted(
+        (key for key in initial_state if key.startswith("agent_")),
+        key=lambda key: int(key[6:]),
+    )
+    agents = [initial_state[key] for key in agent_keys]
+    index_of = {agent.agent_id: index for index, agent in enumerate(agents)}
+    # Versions of each agent: the timestep from which each version applies, and the
+    # Agent instance
+    version_timesteps = [[0] for _ in agents]
+    versions = [[agent] for agent in agents]
+
+    def mutable(index, timestep):
+        """Return the agent at `index`, copied before its first mutation at
+        `timestep`"""
+        if version_timesteps[index][-1] != timestep:
+            version_timesteps[index].append(timestep)
+            versions[index].append(copy.copy(versions[index][-1]))
+        return versions[index][-1]
+
+    p_buy = params["p_buy"]
+    p_sell = params["p_sell"]
+    p_exercise = params["p_exercise"]
+    probabilities = {SELL: p_sell, BUY: p_buy, EXERCISE: p_exercise}
+    rng = run_rng(params)
+
+    queue = []
+    # Timestep of the pending clock of each agent and action, at most one per agent and
+    # action
+    pending = {}
+
+    def schedule(index, action, start):
+        """Schedule the first success from `start` (inclusive) of the Bernoulli
+        decisions of an agent action"""
+        if (index, action) in pending:
+            return
+        timestep = start + rng.geometric(probabilities[action]) - 1
+        pending[(index, action)] = timestep
+        heapq.heappush(queue, (timestep, index, action))
+
+    accepting = []
+    for index, agent in enumerate(agents):
+        if agent.accepting_buy_order:
+            accepting.append(index)
+        if agent.exercised:
+            continue
+        if not agent.accepting_buy_order and agent.option_side != "buy":
+            schedule(index, SELL, 1)
+        if not agent.has_counterparty:
+            schedule(index, BUY, 1)
+        if agent.option_side == "buy" and agent.has_counterparty:
+            schedule(index, EXERCISE, 1)
+
+    option_timestep = None
+    events = 0
+    last_event = 0
+    while queue and queue[0][0] <= timesteps:
+        timestep, index, action = heapq.heappop(queue)
+        del pending[(index, action)]
+        agent = versions[index][-1]
+        # An agent that has exercised takes no further actions
+        if agent.exercised:
+            continue
+
+        if option_timestep != timestep:
+            option_timestep = timestep
+            option = Option(
+                option_type=option_type,
+                underlying_price=prices[timestep],
+                strike_price=strike_price,
+                maturity=option_maturity,
+                risk_free_rate=risk_free_rate,
+                volatility=volatilities[timestep],
+            )
+            bsm_price = None
+
+        if action == SELL:
+            # Listing has no effect while the agent is listed or holds a bought option,
+            # until it sells an option
+            if agent.accepting_buy_order or agent.option_side == "buy":
+                continue
+            mutable(index, timestep).accepting_buy_order = True
+            insort(accepting, index)
+            events += 1
+            last_event = timestep
+            continue
+
+        if action == BUY:
+            # Buying has no effect once the agent has a counterparty, until it exercises
+            if agent.has_counterparty:
+                continue
+            if accepting:
+                # Buy from the first available seller, as in the step-by-step policy
+                seller_index = accepting.pop(0)
+                if bsm_price is None:
+                    if option_pricing_surface is not None:
+                        bsm_price = option_pricing_surface.option_price(
+                            option, timestep
+                        )
+                    else:
+                        bsm_price = option.bsm_price(timestep)
+                seller = mutable(seller_index, timestep)
+                agent = mutable(index, timestep)
+                agent.buy_option(seller, timestep, bsm_price)
+                events += 1
+                last_event = timestep
+
+                # The buyer can exercise from the next timestep, as in the step-by-step
+                # policy, where only agents holding an option at the start of a timestep
+                # exercise
+                schedule(index, EXERCISE, timestep + 1)
+                # The seller can list again, from the current timestep if it is yet to
+                # act in this timestep
+                if not seller.exercised:
+                    schedule(
+                        seller_index,
+                        SELL,
+                        timestep if seller_index > index else timestep + 1,
+                    )
+                continue
+
+        if action == EXERCISE:
+            # Exercising has no effect once the agent no longer holds a bought option
+            if agent.option_side != "buy" or not agent.has_counterparty:
+                continue
+            payoff_value = option.payoff()(prices[timestep], strike_price)
+            if payoff_value - agent.premium_paid > 0:
+                seller = mutable(index_of[agent.bought_from_Id], timestep)
+                mutable(index, timestep).exercise(
+                    seller, option, prices[timestep], timestep
+                )
+                events += 1
+                last_event = timestep
+                continue
+
+        # The action had no effect at this timestep, so schedule its next decision
+        schedule(index, action, timestep + 1)
+
+    columns = {}
+    for key, value in initial_state.items():
+        if key == "volatile_asset_price":
+            columns[key] = prices
+        elif key == "discounted_payoff":
+            columns[key] = discounted_payoffs
+        elif key.startswith("agent_"):
+            index = agent_keys.index(key)
+            counts = np.diff(np.append(version_timesteps[index], timesteps + 1))
+            column = np.empty(timesteps + 1, dtype=object)
+            column[:] = np.repeat(
+                np.array(versions[index] + [None], dtype=object)[:-1], counts
+            )
+            columns[key] = column
+        else:
+            columns[key] = [value] * (timesteps + 1)
+
+    statistics = {
+        "events": events,
+        "last_event_timestep": last_event,
+        "terminated_early": not queue,
+    }
+    return columns, statistics
+
+
+def run_event_driven(executable) -> pd.DataFrame:
+    """Run an experiment or simulation of the default agent model in event-driven mode
+
+    Returns:
+        pd.DataFrame: Results in the same format as `pd.DataFrame(executable.results)`
+    """
+    simulations = getattr(executable, "simulations", [executable])
+    results = []
+    statistics = []
+    for simulation_index, simulation in enumerate(simulations):
+        params = simulation.model.params
+        param_sweep = generate_parameter_sweep(params) or [params]
+        substeps = len(simulation.model.state_update_blocks)
+        for run_index in range(simulation.runs):
+            for subset_index, param_set in enumerate(param_sweep):
+                if simulation.before_subset:
+                    simulation.before_subset(
+                        Context(
+                            simulation_index,
+                            run_index,
+                            subset_index,
+                            simulation.timesteps,
+                            simulation.model.initial_state,
+                            param_set,
+                        )
+                    )
+                initial_state = copy.deepcopy(simulation.model.initial_state)
+                columns, run_statistics = simulate_run(
+                    initial_state,
+                    copy.deepcopy(param_set),
+                    simulation.timesteps,
+                    run_index + 1,
+                )
+                columns.update(
+                    {
+                        "simulation": simulation_index,
+                        "subset": subset_index,
+                        "run": run_index + 1,
+                        "substep": [0] + [substeps] * simulation.timesteps,
+                        "timestep": np.arange(simulation.timesteps + 1),
+                    }
+                )
+                results.append(pd.DataFrame(columns))
+                statistics.append(run_statistics)
+
+    statistics = pd.DataFrame(statistics)
+    logging.info(
+        f"Event-driven mode processed {statistics['events'].sum()} agent events in "
+        f"{len(statistics)} runs, {statistics['terminated_early'].sum()} runs "
+        "terminated early"
+    )
+    return pd.concat(results, ignore_index=True)
@@ -0,0 +1,109 @@
+"""
+Instrumentation helpers
+
+Shared building blocks for the opt-in experiment instrumentation in
+`experiments.profiling` and `experiments.memory`:
+* Per-process record stores, that worker processes write to an output directory when
+  they exit, so that records can be aggregated across all runs and worker processes
+* Replacing and restoring the State Update Blocks of an experiment or simulation
+"""
+
+import glob
+import os
+import pickle
+
+
+# Record stores of the current process: (store name, output directory) -> store
+_stores = {}
+# Process ID that owns each record store: (store name, output directory) -> process ID
+_store_pids = {}
+
+
+def process_store(name, output_dir, factory):
+    """Return the record store `name` of the current process, creating it using
+    `factory()` on first use
+
+    When a store is created, it is registered to be written to `output_dir` when the
+    process exits. Worker processes exit using `os._exit()`, which skips `atexit`
+    handlers, so the finalizer is registered with the (multiprocess and multiprocessing)
+    `util.Finalize` mechanism instead.
+    """
+    key = (name, output_dir)
+    if _store_pids.get(key) == os.getpid():
+        return _stores[key]
+
+    _stores[key] = factory()
+    _store_pids[key] = os.getpid()
+
+    import multiprocessing.util
+
+    multiprocessing.util.Finalize(
+        None, flush_store, args=(name, output_dir), exitpriority=100
+    )
+    try:
+        import multiprocess.util
+
+        multiprocess.util.Finalize(
+            None, flush_store, args=(name, output_dir), exitpriority=100
+        )
+    except ImportError:
+        pass
+
+    return _stores[key]
+
+
+def flush_store(name, output_dir):
+    """Write the record store `name` of the current process to
+    `{output_dir}/{name}-{pid}.pkl`"""
+    key = (name, output_dir)
+    if _store_pids.get(key) != os.getpid() or not _stores.get(key):
+        return
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, f"{name}-{os.getpid()}.pkl"), "wb") as f:
+        pickle.dump(_stores[key], f, -1)
+
+
+def load_stores(name, output_dir):
+    """Return the record stores `name` of the current process and all worker processes
+    that have exited"""
+    flush_store(name, output_dir)
+
+    stores = []
+    for path in sorted(glob.glob(os.path.join(output_dir, f"{name}-*.pkl"))):
+        with open(path, "rb") as f:
+            stores.append(pickle.load(f))
+    return stores
+
+
+def clear_stores(name, output_dir):
+    """Remove the record store `name` of the current process and any stores written to
+    `output_dir`"""
+    _stores.pop((name, output_dir), None)
+    _store_pids.pop((name, output_dir), None)
+    for path in glob.glob(os.path.join(output_dir, f"{name}-*.pkl")):
+        os.remove(path)
+
+
+def replace_state_update_blocks(executable, transform):
+    """Replace the State Update Blocks of every Simulation of `executable` with
+    `transform(state_update_blocks)`
+
+    Returns:
+        list: The original State Update Blocks of each Simulation, to be passed to
+            `restore_state_update_blocks(...)`
+    """
+    simulations = getattr(executable, "simulations", [executable])
+    originals = []
+    for simulation in simulations:
+        originals.append(simulation.model.state_update_blocks)
+        simulation.model.state_update_blocks = transform(
+            simulation.model.state_update_blocks
+        )
+    return originals
+
+
+def restore_state_update_blocks(executable, originals):
+    """Restore the State Update Blocks returned by `replace_state_update_blocks(...)`"""
+    simulations = getattr(executable, "simulations", [executable])
+    for simulation, state_update_blocks in zip(simulations, originals):
+        simulation.model.state_update_blocks = state_update_blocks
@@ -0,0 +1,312 @@
+"""
+Memory footprint tracking
+
+Opt-in instrumentation that samples the process RSS and the estimated size of each State
+Variable every `every` timesteps of every run, and at each stage of post-processing, to
+show how memory grows per timestep and per run, and which State Variables dominate.
+
+The estimated size of a State Variable is the size of its pickled representation, which
+is also the representation radCAD uses to deepcopy State Variables and to transfer
+results between processes. State Variables with a numeric suffix, such as
+`agent_0`...`agent_99`, are grouped together as `agent_*`.
+
+Usage:
+```python
+from experiments.memory import MemoryTracker
+from experiments.run import run
+
+df, exceptions = run(experiment, memory_tracker=MemoryTracker("memory", every=10))
+```
+which logs a summary and writes the sampled growth curves and summary tables to the
+`memory/` directory.
+"""
+
+import json
+import logging
+import os
+import pickle
+import re
+
+import numpy as np
+import pandas as pd
+import psutil
+
+from experiments.instrumentation import (
+    clear_stores,
+    load_stores,
+    process_store,
+    replace_state_update_blocks,
+    restore_state_update_blocks,
+)
+
+
+STORE = "memory"
+"""Name of the per-process record store, a list of sample dictionaries"""
+
+MB = 2**20
+
+RUN_INDEX = ["simulation", "subset", "run"]
+"""Columns identifying the run of a sample"""
+
+
+def _new_store():
+    return []
+
+
+def estimate_size(value) -> int:
+    """Estimate the memory footprint of a value, in bytes, as the size of its pickled
+    representation"""
+    return len(pickle.dumps(value, -1))
+
+
+def variable_group(key: str) -> str:
+    """Group State Variables with a numeric suffix, e.g. `agent_42` -> `agent_*`"""
+    return re.sub(r"_\d+$", "_*", key)
+
+
+def rss() -> int:
+    """Return the resident set size of the current process, in bytes"""
+    return psutil.Process().memory_info().rss
+
+
+def sample_state(state: dict, state_sizes=True) -> dict:
+    """Sample the RSS and the estimated size of each State Variable group of `state`"""
+    sample = {
+        "pid": os.getpid(),
+        "simulation": state.get("simulation"),
+        "subset": state.get("subset"),
+        "run": state.get("run"),
+        "timestep": state.get("timestep"),
+        "rss_bytes": rss(),
+    }
+    if state_sizes:
+        sizes = {}
+        for key, value in state.items():
+            group = variable_group(key)
+            sizes[group] = sizes.get(group, 0) + estimate_size(value)
+        sample["state_bytes"] = sum(sizes.values())
+        sample.update({f"bytes:{group}": size for group, size in sizes.items()})
+    return sample
+
+
+class _MemorySampledFunction:
+    """A picklable wrapper of the first function of the first State Update Block, that
+    samples memory every `every` timesteps"""
+
+    def __init__(self, function, output_dir, every=1, state_sizes=True):
+        self.function = function
+        self.output_dir = output_dir
+        self.every = every
+        self.state_sizes = state_sizes
+
+    def __call__(self, params, substep, state_history, previous_state, *args):
+        if previous_state["timestep"] % self.every == 0:
+            sample = sample_state(previous_state, self.state_sizes)
+            # Number of states held in the run's history, which is retained until the
+            # end of the experiment
+            sample["history_length"] = len(state_history)
+            process_store(STORE, self.output_dir, _new_store).append(sample)
+        return self.function(params, substep, state_history, previous_state, *args)
+
+
+def instrument_state_update_blocks(
+    state_update_blocks, output_dir, every=1, state_sizes=True
+):
+    """Return a copy of `state_update_blocks` with the first function of the first block
+    wrapped for memory sampling"""
+    state_update_blocks = [dict(block) for block in state_update_blocks]
+    first_block = state_update_blocks[0]
+    kind = "policies" if first_block.get("policies") else "variables"
+    functions = dict(first_block[kind])
+    key = next(iter(functions))
+    functions[key] = _MemorySampledFunction(
+        functions[key], output_dir, every, state_sizes
+    )
+    first_block[kind] = functions
+    return state_update_blocks
+
+
+class MemoryTracker:
+    """Opt-in memory footprint tracker of an experiment
+
+    Args:
+        output_dir (str): Directory for per-process samples and the report files
+        every (int): Sample every `every` timesteps of every run
+        state_sizes (bool): Whether to estimate the size of each State Variable group
+            when sampling (adds overhead)
+        plot (bool): Whether to write the growth curves as a Plotly HTML figure to
+            `memory_report.html`
+    """
+
+    def __init__(self, output_dir="memory", every=1, state_sizes=True, plot=False):
+        self.output_dir = os.path.abspath(output_dir)
+        self.every = every
+        self.state_sizes = state_sizes
+        self.plot = plot
+        self.stages = []
+        self._original_state_update_blocks = []
+
+    def instrument(self, executable):
+        """Wrap the State Update Blocks of every Simulation of `executable` and clear
+        any previous samples"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        clear_stores(STORE, self.output_dir)
+        self.stages = []
+        self.sample_stage("before experiment")
+
+        self._original_state_update_blocks = replace_state_update_blocks(
+            executable,
+            lambda state_update_blocks: instrument_state_update_blocks(
+                state_update_blocks, self.output_dir, self.every, self.state_sizes
+            ),
+        )
+
+    def restore(self, executable):
+        """Restore the original State Update Blocks of `executable`"""
+        restore_state_update_blocks(executable, self._original_state_update_blocks)
+
+    def sample_stage(self, stage, df: pd.DataFrame = None):
+        """Sample the RSS of the current process, and optionally the size of a results
+        DataFrame, at a named stage"""
+        sample = {"stage": stage, "rss_bytes": rss()}
+        if df is not None:
+            sample["dataframe_bytes"] = int(
+                df.memory_usage(index=True, deep=True).sum()
+            )
+            sample["dataframe_rows"] = len(df)
+        self.stages.append(sample)
+
+    def samples(self) -> pd.DataFrame:
+        """Return all per-timestep samples across runs and worker processes"""
+        rows = [
+            sample for store in load_stores(STORE, self.output_dir) for sample in store
+        ]
+        df = pd.DataFrame(rows)
+        if df.empty:
+            return df
+        df = df.sort_values(RUN_INDEX + ["timestep"])
+        return df.reset_index(drop=True)
+
+    def runs(self, samples: pd.DataFrame) -> pd.DataFrame:
+        """Summarise the samples per run: peak RSS, RSS growth per timestep, and final
+        state and history size"""
+
+        def summarise(run):
+            final = run.iloc[-1]
+            growth = np.nan
+            if len(run) > 1:
+                growth = np.polyfit(run["timestep"], run["rss_bytes"], 1)[0]
+            summary = {
+                "pid": final["pid"],
+                "peak_rss_mb": run["rss_bytes"].max() / MB,
+                "rss_growth_bytes_per_timestep": growth,
+                "timesteps_sampled": len(run),
+            }
+            if "state_bytes" in run:
+                summary["final_state_bytes"] = final["state_bytes"]
+                summary["estimated_history_mb"] = (
+                    final["state_bytes"] * final["history_length"] / MB
+                )
+            return pd.Series(summary)
+
+        return samples.groupby(RUN_INDEX).apply(summarise).reset_index()
+
+    def variables(self, samples: pd.DataFrame) -> pd.DataFrame:
+        """Return the mean estimated size of each State Variable group at the last
+        sampled timestep of each run"""
+        columns = [column for column in samples.columns if column.startswith("bytes:")]
+        if not columns:
+            return pd.DataFrame()
+        final = samples.groupby(RUN_INDEX).tail(1)[columns].mean()
+        df = pd.DataFrame(
+            {
+                "variable": [column.split(":", 1)[1] for column in columns],
+                "mean_bytes": final.values,
+            }
+        )
+        df["share_pct"] = 100 * df["mean_bytes"] / df["mean_bytes"].sum()
+        return df.sort_values("mean_bytes", ascending=False).reset_index(drop=True)
+
+    def report(self) -> dict:
+        """Log a summary, and write the samples, per-run and per-variable tables,
+        stages, and an optional figure"""
+        samples = self.samples()
+        stages = pd.DataFrame(self.stages)
+        summary = {"stages": self.stages}
+
+        samples.to_csv(os.path.join(self.output_dir, "memory_samples.csv"), index=False)
+        stages.to_csv(os.path.join(self.output_dir, "memory_stages.csv"), index=False)
+
+        if not samples.empty:
+            runs = self.runs(samples)
+            variables = self.variables(samples)
+            runs.to_csv(os.path.join(self.output_dir, "memory_runs.csv"), index=False)
+            variables.to_csv(
+                os.path.join(self.output_dir, "memory_variables.csv"), index=False
+            )
+            growth = runs["rss_growth_bytes_per_timestep"].mean()
+            estimated_results_mb = None
+            if "estimated_history_mb" in runs:
+                estimated_results_mb = runs["estimated_history_mb"].sum()
+            top_variables = variables.head(10)
+            summary.update(
+                {
+                    "peak_rss_mb": samples["rss_bytes"].max() / MB,
+                    "mean_rss_growth_bytes_per_timestep": growth,
+                    "estimated_results_mb": estimated_results_mb,
+                    "variables": top_variables.to_dict(orient="records"),
+                }
+            )
+            logging.info(f"Memory per run:\n{runs.describe().to_string()}")
+            logging.info(
+                f"Memory per State Variable:\n{top_variables.to_string(index=False)}"
+            )
+            if self.plot:
+                self.figure(samples).write_html(
+                    os.path.join(self.output_dir, "memory_report.html")
+                )
+
+        logging.info(f"Memory per stage:\n{stages.to_string(index=False)}")
+        with open(os.path.join(self.output_dir, "memory_summary.json"), "w") as f:
+            json.dump(summary, f, indent=2, default=float)
+
+        return summary
+
+    def figure(self, samples: pd.DataFrame):
+        """Return a Plotly figure of RSS and estimated run history size growth curves
+        per run"""
+        from plotly.subplots import make_subplots
+        import plotly.graph_objects as go
+
+        fig = make_subplots(
+            rows=1,
+            cols=2,
+            subplot_titles=["RSS (MB)", "Estimated run history size (MB)"],
+        )
+        for (simulation, subset, run), df in samples.groupby(RUN_INDEX):
+            name = f"simulation {simulation} / subset {subset} / run {run}"
+            fig.add_trace(
+                go.Scatter(
+                    x=df["timestep"],
+                    y=df["rss_bytes"] / MB,
+                    name=name,
+                    legendgroup=name,
+                ),
+                row=1,
+                col=1,
+            )
+            if "state_bytes" in df:
+                fig.add_trace(
+                    go.Scatter(
+                        x=df["timestep"],
+                        y=df["state_bytes"] * df["history_length"] / MB,
+                        name=name,
+                        legendgroup=name,
+                        showlegend=False,
+                    ),
+                    row=1,
+                    col=2,
+                )
+        fig.update_xaxes(title_text="Timestep")
+        fig.update_layout(title="Memory footprint per timestep and run")
+        return fig
@@ -1,12 +1,11 @@
 # +
 import numpy as np
 import pandas as pd
-from tqdm.notebook import tqdm, trange
-import statsmodels.api as sm
-import plotly.graph_objects as go
 
 import experiments.simulation_configuration as simulation
 
+# NOTE: tqdm.notebook, statsmodels and plotly are imported on first use, rather than when the helpers are imported
+
 
 # -
 
@@ -67,6 +66,8 @@ def check_agent_counterparty_for_run(df, n_agents, run=1, side='buy'):
 
 def check_agent_counterparty_for_simulation(df, n_agents, subset=0, side='buy'):
         
+    from tqdm.notebook import tqdm
+
     df_ = df.query('subset==@subset')
     
     for run in tqdm(df_['run'].unique()):
@@ -110,6 +111,8 @@ def get_KPIs_for_run(df, n_agents, kpi_list, run):
 
 def get_KPIs_for_simulation(df, n_agents, kpi_list, subset=0):
     
+    from tqdm.notebook import tqdm
+
     L = []
     
     df_ = df.query('subset==@subset')
@@ -158,6 +161,8 @@ def get_option_payoff(df):
 
 
 def get_OLS_params(KPI_df, variable):
+    import statsmodels.api as sm
+
     X = KPI_df['final_va_price']
     Y = KPI_df[variable]
     X = sm.add_constant(X)
@@ -196,6 +201,7 @@ def get_regression_df(KPI_df, variables):
 
 
 def plot_agent_PnL(KPI_df, KPI_regression_df, scenario, summary_stat, option_type):
+    import plotly.graph_objects as go
 
     fig = go.Figure()
 
@@ -258,3 +264,149 @@ def plot_agent_PnL(KPI_df, KPI_regression_df, scenario, summary_stat, option_typ
     )
 
     fig.show()
+
+
+def lttb(x, y, n_out):
+    """
+    Downsamples a series to `n_out` points using the Largest-Triangle-Three-Buckets algorithm,
+    which keeps the visually significant points (e.g. peaks and troughs) of the series.
+    Returns the indices of the selected points, including the first and last points.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Buckets of the points between the first and last points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Average point of the next bucket, or the last point
+        if i + 2 < len(edges):
+            next_start, next_stop = edges[i + 1], edges[i + 2]
+            avg_x = x[next_start:next_stop].mean()
+            avg_y = y[next_start:next_stop].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        # Point of the bucket forming the largest triangle with the previous selected point and the next bucket average
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:stop] - y[a])
+            - (x[a] - x[start:stop]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+
+    return indices
+
+
+def get_run_paths(df, variable, subset=0):
+    """
+    Returns the paths of a variable as a timestep x run DataFrame, using the last substep of each timestep
+    """
+    df_ = df.query('subset==@subset').drop_duplicates(['run', 'timestep'], keep='last')
+    return df_.pivot(index='timestep', columns='run', values=variable)
+
+
+def get_quantile_bands(df, variable, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), subset=0):
+    """
+    Returns the per-timestep quantiles of a variable across Monte Carlo runs, as a timestep x quantile DataFrame
+    """
+    paths = get_run_paths(df, variable, subset)
+    bands = np.quantile(paths.to_numpy(dtype=float), quantiles, axis=1).T
+    return pd.DataFrame(bands, index=paths.index, columns=list(quantiles))
+
+
+def plot_fan_chart(
+    df,
+    variable,
+    quantiles=(0.05, 0.25, 0.5, 0.75, 0.95),
+    sample_paths=3,
+    max_points=500,
+    subset=0,
+    seed=1,
+    title=None,
+    yaxis_title=None,
+    color="blue",
+):
+    """
+    Plots a Monte Carlo fan chart of a variable: shaded quantile bands across runs, the median,
+    and a few sampled run paths, with each series downsampled to at most `max_points` points using LTTB.
+    The figure has a fixed number of traces and points, independent of the number of runs,
+    unlike `df.plot(color='run')` which creates one trace per run.
+    """
+    import plotly.graph_objects as go
+
+    paths = get_run_paths(df, variable, subset)
+    bands = get_quantile_bands(df, variable, quantiles, subset)
+    timesteps = bands.index.to_numpy()
+    median = bands.iloc[:, len(quantiles) // 2].to_numpy()
+
+    # The bands share the points selected for the median, so that band edges stay aligned
+    points = lttb(timesteps, median, max_points)
+    rgb = {"blue": "0, 0, 255", "red": "255, 0, 0", "green": "0, 128, 0"}.get(color, "0, 0, 255")
+
+    fig = go.Figure()
+
+    # Bands from the outermost to the innermost, each as a lower and a filled upper trace
+    for i in range(len(quantiles) // 2):
+        lower, upper = quantiles[i], quantiles[-1 - i]
+        fig.add_trace(
+            go.Scatter(
+                x=timesteps[points],
+                y=bands[lower].to_numpy()[points],
+                mode="lines",
+                line=dict(width=0),
+                showlegend=False,
+                hoverinfo="skip",
+            )
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=timesteps[points],
+                y=bands[upper].to_numpy()[points],
+                mode="lines",
+                line=dict(width=0),
+                fill="tonexty",
+                fillcolor=f"rgba({rgb}, {0.15 + 0.15 * i})",
+                name=f"{lower:.0%}-{upper:.0%}",
+            )
+        )
+
+    fig.add_trace(
+        go.Scatter(
+            x=timesteps[points],
+            y=median[points],
+            mode="lines",
+            line=dict(color=color),
+            name="median",
+        )
+    )
+
+    rng = np.random.default_rng(seed)
+    runs = rng.choice(paths.columns.to_numpy(), size=min(sample_paths, len(paths.columns)), replace=False)
+    for run in runs:
+        path = paths[run].to_numpy(dtype=float)
+        path_points = lttb(timesteps, path, max_points)
+        fig.add_trace(
+            go.Scatter(
+                x=timesteps[path_points],
+                y=path[path_points],
+                mode="lines",
+                line=dict(width=1, dash="dot"),
+                name=f"run {run}",
+            )
+        )
+
+    fig.update_layout(
+        title=title or variable + " across monte carlo runs",
+        xaxis_title="Timestep",
+        yaxis_title=yaxis_title or variable,
+    )
+
+    return fig
@@ -0,0 +1,255 @@
+"""
+Per-block profiling of State Update Blocks
+
+Opt-in instrumentation that wraps every Policy and State Update Function in the State
+Update Blocks of an experiment, recording call counts, cumulative and p50/p99 latency,
+and optionally memory allocations per function. The time radCAD spends deep-copying
+State Variables between substeps (pickle round-trips in `radcad.core`) is recorded under
+the `radcad.core` block.
+
+Statistics are recorded in the process that executes the functions. When a multi-process
+radCAD backend is used, each worker process writes its statistics to the profiling
+output directory when it exits, and `Profiler.collect()` aggregates the statistics
+across all runs and worker processes.
+
+Usage:
+```python
+from experiments.profiling import Profiler
+from experiments.run import run
+
+df, exceptions = run(experiment, profiler=Profiler("profiling", allocations=True))
+```
+which logs a summary table and writes `profiling/profile_summary.csv` and
+`profiling/profile_summary.json`.
+"""
+
+import cProfile
+import logging
+import os
+import pickle
+import time
+import tracemalloc
+from array import array
+
+import numpy as np
+import pandas as pd
+import radcad.core
+
+from experiments.instrumentation import (
+    clear_stores,
+    load_stores,
+    process_store,
+    replace_state_update_blocks,
+    restore_state_update_blocks,
+)
+
+
+STORE = "profile"
+"""Name of the per-process record store, a dictionary of label -> (durations in seconds,
+allocated bytes, peak bytes)"""
+
+
+def _new_store():
+    return {}
+
+
+def _record(output_dir, label, duration, allocated=0, peak=0):
+    """Record a single function call in the current process"""
+    store = process_store(STORE, output_dir, _new_store)
+    stats = store.get(label)
+    if stats is None:
+        stats = store[label] = (array("d"), array("q"), array("q"))
+    stats[0].append(duration)
+    stats[1].append(allocated)
+    stats[2].append(peak)
+
+
+class _ProfiledFunction:
+    """A picklable wrapper of a Policy or State Update Function that records its latency
+    and allocations"""
+
+    def __init__(self, function, label, output_dir, allocations=False):
+        self.function = function
+        self.label = label
+        self.output_dir = output_dir
+        self.allocations = allocations
+
+    def __call__(self, *args):
+        # Time the radCAD State Variable deepcopy in the process executing the run
+        if radcad.core.pickle is pickle:
+            radcad.core.pickle = _ProfiledPickle(self.output_dir)
+
+        if not self.allocations:
+            start = time.perf_counter()
+            result = self.function(*args)
+            _record(self.output_dir, self.label, time.perf_counter() - start)
+            return result
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        current_start, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        result = self.function(*args)
+        duration = time.perf_counter() - start
+        current_end, peak = tracemalloc.get_traced_memory()
+        allocated, peak = current_end - current_start, peak - current_start
+        _record(self.output_dir, self.label, duration, allocated, peak)
+        return result
+
+
+class _ProfiledPickle:
+    """A stand-in for the `pickle` module used by `radcad.core`, timing the State
+    Variable deepcopy"""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+
+    def dumps(self, obj, *args, **kwargs):
+        start = time.perf_counter()
+        result = pickle.dumps(obj, *args, **kwargs)
+        duration = time.perf_counter() - start
+        _record(self.output_dir, "radcad.core|deepcopy|pickle.dumps", duration)
+        return result
+
+    def loads(self, data, *args, **kwargs):
+        start = time.perf_counter()
+        result = pickle.loads(data, *args, **kwargs)
+        duration = time.perf_counter() - start
+        _record(self.output_dir, "radcad.core|deepcopy|pickle.loads", duration)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(pickle, name)
+
+
+def _function_name(function):
+    """Return a readable name for a function, including `functools.partial` objects"""
+    inner = getattr(function, "func", function)
+    return f"{inner.__module__}.{inner.__qualname__}"
+
+
+def instrument_state_update_blocks(state_update_blocks, output_dir, allocations=False):
+    """Return a copy of `state_update_blocks` with every Policy and State Update
+    Function wrapped for profiling
+
+    Each function is labelled
+    `{block index}|{policies or variables}|{key}:{function name}`.
+    """
+    instrumented = []
+    for index, block in enumerate(state_update_blocks):
+        block = dict(block)
+        for kind in ["policies", "variables"]:
+            block[kind] = {
+                key: _ProfiledFunction(
+                    function,
+                    f"{index}|{kind}|{key}:{_function_name(function)}",
+                    output_dir,
+                    allocations,
+                )
+                for key, function in block.get(kind, {}).items()
+            }
+        instrumented.append(block)
+    return instrumented
+
+
+class Profiler:
+    """Opt-in profiler of an experiment's State Update Blocks
+
+    Args:
+        output_dir (str): Directory for per-process statistics and the summary files
+        allocations (bool): Whether to record memory allocations per function using
+            `tracemalloc` (adds overhead)
+        cprofile (bool): Whether to also record a cProfile of the executing process to
+            `{output_dir}/experiment.prof`, which can be rendered as a flamegraph, e.g.
+            using `snakeviz` or `flameprof`. Only covers the parent process, so is most
+            useful with the `Backend.SINGLE_PROCESS` backend.
+    """
+
+    def __init__(self, output_dir="profiling", allocations=False, cprofile=False):
+        self.output_dir = os.path.abspath(output_dir)
+        self.allocations = allocations
+        self.cprofile = cprofile
+        self._profile = None
+        self._original_state_update_blocks = []
+
+    def instrument(self, executable):
+        """Wrap the State Update Blocks of every Simulation of `executable` and clear
+        any previous statistics"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        clear_stores(STORE, self.output_dir)
+        if os.path.exists(os.path.join(self.output_dir, "experiment.prof")):
+            os.remove(os.path.join(self.output_dir, "experiment.prof"))
+
+        self._original_state_update_blocks = replace_state_update_blocks(
+            executable,
+            lambda state_update_blocks: instrument_state_update_blocks(
+                state_update_blocks, self.output_dir, self.allocations
+            ),
+        )
+
+        if self.cprofile:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def restore(self, executable):
+        """Restore the original State Update Blocks of `executable` and the radCAD
+        deepcopy implementation"""
+        if self._profile:
+            self._profile.disable()
+            self._profile.dump_stats(os.path.join(self.output_dir, "experiment.prof"))
+            self._profile = None
+
+        restore_state_update_blocks(executable, self._original_state_update_blocks)
+        radcad.core.pickle = pickle
+
+    def collect(self):
+        """Aggregate the statistics of the current process and all worker processes"""
+        merged = {}
+        for store in load_stores(STORE, self.output_dir):
+            for label, stats in store.items():
+                merged.setdefault(label, ([], [], []))
+                for values, new_values in zip(merged[label], stats):
+                    values.extend(new_values)
+        return merged
+
+    def summary(self):
+        """Return a summary `pd.DataFrame` of call counts, latency and allocations per
+        function"""
+        rows = []
+        for label, (durations, allocated, peak) in self.collect().items():
+            block, kind, name = label.split("|", 2)
+            durations = np.asarray(durations)
+            p50, p99 = np.percentile(durations, [50, 99])
+            rows.append(
+                {
+                    "block": block,
+                    "type": kind,
+                    "function": name,
+                    "calls": len(durations),
+                    "cumulative_s": durations.sum(),
+                    "mean_us": durations.mean() * 1e6,
+                    "p50_us": p50 * 1e6,
+                    "p99_us": p99 * 1e6,
+                    "allocated_bytes": int(np.sum(allocated)),
+                    "peak_bytes": int(np.max(peak)),
+                }
+            )
+        df = pd.DataFrame(rows)
+        if df.empty:
+            return df
+        df["cumulative_pct"] = 100 * df["cumulative_s"] / df["cumulative_s"].sum()
+        return df.sort_values("cumulative_s", ascending=False).reset_index(drop=True)
+
+    def report(self):
+        """Log the summary table and write it to `profile_summary.csv` and
+        `profile_summary.json`"""
+        df = self.summary()
+        df.to_csv(os.path.join(self.output_dir, "profile_summary.csv"), index=False)
+        df.to_json(
+            os.path.join(self.output_dir, "profile_summary.json"),
+            orient="records",
+            indent=2,
+        )
+        logging.info(f"Profile summary:\n{df.to_string(index=False)}")
+        return df
@@ -0,0 +1,648 @@
+"""
+Columnar results store with lazy, column-projected queries
+
+Stores experiment results on disk as one `.npy` file per column, in parts of up to
+`chunk_size` rows, and queries them lazily using memory-mapped files, reading only the
+requested columns and the rows that match the query, so that experiments larger than
+memory can be analysed without materializing the full results DataFrame.
+
+* Numeric State Variables, such as `volatile_asset_price`, are stored as one column each
+* Each `Agent` field, such as `premium_paid`, is stored as a 2-D column of shape (rows,
+  agents), with `Optional` fields stored as floats with NaN for `None`, and string
+  fields (IDs and the option side) stored as integer codes of a category list, with -1
+  for `None`
+* Other State Variables (e.g. the `positions` ledger) are not stored
+* Each part keeps an index of the row range of each (simulation, subset, run), so that
+  subset, run and timestep predicates select row ranges without scanning the data
+
+In compact mode (`compact=True`), roughly halving the size of the store and of query
+results:
+* Floats, e.g. prices, premiums and payoffs, are stored as float32
+* Integers, including the index columns, are stored as int32, and `Optional` integers as
+  int32 with -1 for `None`
+* Agent IDs (`agent_id`, `bought_from_Id` and `sold_to_Id`) are stored as int32 agent
+  indices, with -1 for `None`
+* The option side is stored as an int8 code of `OPTION_SIDE_CODES`, with -1 for `None`
+
+The model computes in float64, and values are only rounded to float32 when stored, so
+each stored float has a relative error of at most `FLOAT32_RELATIVE_PRECISION` (2^-24,
+about 6e-8), e.g. within about 0.0001 USD of a 2,000 USD price, and all other values are
+stored exactly. `precision_report(...)` checks this against a full-precision store of
+the same results. Sums over many stored floats (e.g. total PnL across agents and runs)
+should be accumulated in float64, e.g. `values.sum(dtype=np.float64)`, so that rounding
+errors don't accumulate.
+
+Usage:
+```python
+from experiments.results_store import ResultsStore, write_results
+
+write_results("results", experiment.results)
+# Or, without loading all results in memory, from a checkpointed experiment (see
+# `experiments.checkpoint`)
+write_checkpoint_results("results", "checkpoints")
+
+store = ResultsStore("results")
+df = (
+    store.select("volatile_asset_price", agent_fields=["premium_paid", "exercised"])
+    .where(subsets=[0], runs=(1, 10), timesteps=(100, 365), agents=[0, 5])
+    .to_pandas()
+)
+final_prices = (
+    store.select("volatile_asset_price").where(final=True).to_numpy()
+)["volatile_asset_price"]
+
+compact_store = write_results("results-compact", experiment.results, compact=True)
+assert precision_report(compact_store, store)["within_precision"].all()
+```
+"""
+
+import glob
+import json
+import os
+import pickle
+import shutil
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from model.types import Agent
+
+
+INDEX_COLUMNS = ["simulation", "subset", "run", "timestep"]
+"""Columns that identify each row of the results"""
+
+OPTION_SIDE_CODES = {"buy": 0, "sell": 1}
+"""Codes of the `option_side` Agent field in compact mode"""
+
+FLOAT32_RELATIVE_PRECISION = 2.0**-24
+"""Maximum relative error of a float64 value rounded to float32, see
+`precision_report(...)`"""
+
+
+def _agent_index(key):
+    return int(key[len("agent_") :])
+
+
+def _field_encoding(_type) -> str:
+    """Return the storage encoding of an `Agent` field type: bool, int, float,
+    optional_int or category"""
+    if _type is bool:
+        return "bool"
+    if _type is int:
+        return "int"
+    if _type in (float, Union[int, float]):
+        return "float"
+    if _type == Optional[int]:
+        return "optional_int"
+    return "category"
+
+
+FIELD_ENCODINGS = {
+    field: _field_encoding(_type) for field, _type in Agent.fields.items()
+}
+"""Storage encoding of each `Agent` field"""
+
+_COMPACT_ENCODINGS = {
+    "int": "int32",
+    "float": "float32",
+    "optional_int": "optional_int32",
+}
+
+COMPACT_FIELD_ENCODINGS = {
+    **{
+        field: _COMPACT_ENCODINGS.get(encoding, encoding)
+        for field, encoding in FIELD_ENCODINGS.items()
+    },
+    "agent_id": "agent_index",
+    "bought_from_Id": "agent_index",
+    "sold_to_Id": "agent_index",
+    "option_side": "side",
+}
+"""Storage encoding of each `Agent` field in compact mode"""
+
+_DTYPES = {
+    "bool": np.bool_,
+    "int": np.int64,
+    "float": np.float64,
+    "optional_int": np.float64,
+    "category": np.int32,
+    "int32": np.int32,
+    "float32": np.float32,
+    "optional_int32": np.int32,
+    "agent_index": np.int32,
+    "side": np.int8,
+}
+
+# Encodings stored with -1 for `None`
+_NULLABLE_INT_ENCODINGS = {"optional_int32", "agent_index"}
+
+
+def _encode_nullable(values, encode=int):
+    """Encode an object array of values as integers, with -1 for `None`"""
+    return np.fromiter(
+        (-1 if value is None else encode(value) for value in values.ravel()),
+        dtype=np.int64,
+        count=values.size,
+    )
+
+
+def _decode(store, field, values):
+    """Decode the stored values of an agent field to an object array of the original
+    `Agent` field values"""
+    encoding = store.fields[field]
+    if encoding in ("category", "side"):
+        categories = (
+            store.categories[field]
+            if encoding == "category"
+            else list(OPTION_SIDE_CODES)
+        )
+        # Code -1 selects the final `None`
+        return np.array(categories + [None], dtype=object)[values]
+    if encoding == "agent_index":
+        return np.array(
+            [None if value == -1 else str(value) for value in values.ravel()],
+            dtype=object,
+        ).reshape(values.shape)
+    if encoding in ("optional_int", "optional_int32"):
+        missing = np.isnan(values) if encoding == "optional_int" else values == -1
+        # Missing values are filled before the cast, which is undefined for NaN
+        return np.where(
+            missing, None, np.where(missing, 0, values).astype(np.int64).astype(object)
+        )
+    return values
+
+
+class ResultsWriter:
+    """Writes results to a results store directory, one part per call to `append(...)`
+
+    Args:
+        directory (str): Results store directory, replacing any existing store
+        compact (bool): Store floats as float32 and agent IDs and the option side as
+            integer codes, see the module documentation
+    """
+
+    def __init__(self, directory, compact=False):
+        self.directory = os.path.abspath(directory)
+        for path in glob.glob(os.path.join(self.directory, "part-*")):
+            shutil.rmtree(path)
+        os.makedirs(self.directory, exist_ok=True)
+        self.compact = compact
+        self.fields = COMPACT_FIELD_ENCODINGS if compact else FIELD_ENCODINGS
+        self.parts = []
+        self.columns = None
+        self.agents = None
+        self.categories = {
+            field: []
+            for field, encoding in self.fields.items()
+            if encoding == "category"
+        }
+        self._codes = {field: {} for field in self.categories}
+
+    def _encode_category(self, field, values):
+        codes = self._codes[field]
+        categories = self.categories[field]
+        encoded = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            if value is None:
+                encoded[i] = -1
+                continue
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(categories)
+                categories.append(value)
+            encoded[i] = code
+        return encoded
+
+    def append(self, states):
+        """Write a list of result states (e.g. `simulation.results`), or a results
+        DataFrame, as a new part"""
+        if isinstance(states, pd.DataFrame):
+            states = states.to_dict("records")
+        if not states:
+            return
+
+        float_encoding, int_encoding = (
+            ("float32", "int32") if self.compact else ("float", "int")
+        )
+        if self.columns is None:
+            first = states[0]
+            self.agents = sorted(
+                (key for key in first if key.startswith("agent_")), key=_agent_index
+            )
+            self.columns = {}
+            for key, value in first.items():
+                if key.startswith("agent_"):
+                    continue
+                if isinstance(value, (bool, np.bool_)):
+                    self.columns[key] = "bool"
+                elif isinstance(value, (int, np.integer)):
+                    self.columns[key] = int_encoding
+                elif isinstance(value, (float, np.floating)):
+                    self.columns[key] = float_encoding
+
+        part = os.path.join(self.directory, f"part-{len(self.parts):05d}")
+        os.makedirs(part, exist_ok=True)
+        for key, encoding in self.columns.items():
+            values = np.array([state[key] for state in states])
+            if values.dtype.kind == "f" and encoding != float_encoding:
+                # A State Variable with an integer initial value (e.g. a payoff of 0) is
+                # promoted to float
+                encoding = self.columns[key] = float_encoding
+                for previous in self.parts:
+                    path = os.path.join(self.directory, previous["path"], f"{key}.npy")
+                    np.save(path, np.load(path).astype(_DTYPES[encoding]))
+            np.save(os.path.join(part, f"{key}.npy"), values.astype(_DTYPES[encoding]))
+
+        # Agent fields, extracted for all agents and rows at once
+        agent_states = np.array(
+            [
+                [agent.__getstate__() for agent in map(state.__getitem__, self.agents)]
+                for state in states
+            ],
+            dtype=object,
+        )
+        for field_index, (field, encoding) in enumerate(self.fields.items()):
+            values = agent_states[:, :, field_index]
+            if encoding == "category":
+                column = self._encode_category(field, values.ravel()).reshape(
+                    values.shape
+                )
+            elif encoding in ("optional_int32", "agent_index"):
+                column = _encode_nullable(values).reshape(values.shape).astype(np.int32)
+            elif encoding == "side":
+                column = (
+                    _encode_nullable(values, OPTION_SIDE_CODES.__getitem__)
+                    .reshape(values.shape)
+                    .astype(np.int8)
+                )
+            elif encoding == "optional_int":
+                missing = values == None  # noqa: E711
+                column = np.where(missing, np.nan, values).astype(np.float64)
+            else:
+                column = values.astype(_DTYPES[encoding])
+            np.save(os.path.join(part, f"agent.{field}.npy"), column)
+
+        # Row range of each (simulation, subset, run) in the part
+        keys = np.array(
+            [[state["simulation"], state["subset"], state["run"]] for state in states]
+        )
+        timesteps = np.array([state["timestep"] for state in states])
+        starts = np.flatnonzero(np.r_[True, (keys[1:] != keys[:-1]).any(axis=1)])
+        stops = np.r_[starts[1:], len(states)]
+        self.parts.append(
+            {
+                "path": os.path.basename(part),
+                "rows": len(states),
+                "blocks": [
+                    [
+                        *map(int, keys[start]),
+                        int(start),
+                        int(stop),
+                        int(timesteps[start]),
+                        int(timesteps[stop - 1]),
+                    ]
+                    for start, stop in zip(starts, stops)
+                ],
+            }
+        )
+
+    def close(self):
+        """Write the store metadata"""
+        with open(os.path.join(self.directory, "store.json"), "w") as f:
+            json.dump(
+                {
+                    "columns": self.columns,
+                    "agents": [_agent_index(key) for key in self.agents],
+                    "compact": self.compact,
+                    "fields": self.fields,
+                    "categories": self.categories,
+                    "parts": self.parts,
+                },
+                f,
+            )
+
+
+def write_results(directory, results, chunk_size=100_000, compact=False):
+    """Write results, a list of result states or a results DataFrame, to a results store
+    in parts of `chunk_size` rows"""
+    writer = ResultsWriter(directory, compact=compact)
+    for start in range(0, len(results), chunk_size):
+        writer.append(results[start : start + chunk_size])
+    writer.close()
+    return ResultsStore(directory)
+
+
+def write_checkpoint_results(directory, checkpoint_directory, compact=False):
+    """Write the completed runs of a checkpointed experiment (see
+    `experiments.checkpoint`) to a results store, loading a single run in memory at a
+    time"""
+    writer = ResultsWriter(directory, compact=compact)
+    paths = glob.glob(os.path.join(checkpoint_directory, "runs", "*.pkl"))
+    for path in sorted(
+        paths,
+        key=lambda path: tuple(
+            map(int, os.path.basename(path)[: -len(".pkl")].split("-"))
+        ),
+    ):
+        with open(path, "rb") as f:
+            result, _exception, _trace = pickle.load(f)
+        writer.append([state for substeps in result for state in substeps])
+    writer.close()
+    return ResultsStore(directory)
+
+
+class Query:
+    """A lazy query of a `ResultsStore`, built using `ResultsStore.select(...)` and
+    `Query.where(...)`, and executed using `to_numpy()`, `to_pandas()` or
+    `iter_pandas()`"""
+
+    def __init__(self, store, columns=(), agent_fields=(), predicates=None):
+        self.store = store
+        self.columns = list(columns)
+        self.agent_fields = list(agent_fields)
+        self.predicates = predicates or {}
+
+    def where(
+        self,
+        simulations=None,
+        subsets=None,
+        runs=None,
+        timesteps=None,
+        agents=None,
+        final=None,
+    ) -> "Query":
+        """Return a new query restricted by the given predicates
+
+        Args:
+            simulations, subsets (int or list): Simulation and subset indices
+            runs (int, list or tuple): Run numbers, or an inclusive `(first, last)`
+                range of run numbers
+            timesteps (int or tuple): Timestep, or an inclusive `(first, last)` range of
+                timesteps
+            agents (list): Agent indices, e.g. `[0, 5]` for `agent_0` and `agent_5`, for
+                the selected agent fields
+            final (bool): Only select the final row of each run
+        """
+        predicates = dict(self.predicates)
+        for key, value in dict(
+            simulations=simulations,
+            subsets=subsets,
+            runs=runs,
+            timesteps=timesteps,
+            agents=agents,
+            final=final,
+        ).items():
+            if value is not None:
+                predicates[key] = value
+        return Query(self.store, self.columns, self.agent_fields, predicates)
+
+    def _row_ranges(self):
+        """Yield the part and row slice of each selected row range, using the block
+        index and the timestep column"""
+        predicates = self.predicates
+
+        def matches(value, predicate, is_range=False):
+            if predicate is None:
+                return True
+            if isinstance(predicate, tuple) and is_range:
+                return predicate[0] <= value <= predicate[1]
+            if np.isscalar(predicate):
+                return value == predicate
+            return value in predicate
+
+        timesteps = predicates.get("timesteps")
+        if np.isscalar(timesteps):
+            timesteps = (timesteps, timesteps)
+
+        # A run can span several parts, so its final row is the last row of its last
+        # block
+        final_blocks = {}
+        for part_index, part in enumerate(self.store.parts):
+            for block_index, block in enumerate(part["blocks"]):
+                final_blocks[tuple(block[:3])] = (part_index, block_index)
+        final_blocks = set(final_blocks.values())
+
+        for part_index, part in enumerate(self.store.parts):
+            for block_index, block in enumerate(part["blocks"]):
+                simulation, subset, run, start, stop = block[:5]
+                first_timestep, last_timestep = block[5:]
+                if not (
+                    matches(simulation, predicates.get("simulations"))
+                    and matches(subset, predicates.get("subsets"))
+                    and matches(run, predicates.get("runs"), is_range=True)
+                ):
+                    continue
+                if predicates.get("final"):
+                    if (part_index, block_index) in final_blocks:
+                        yield part, slice(stop - 1, stop)
+                    continue
+                if timesteps is not None:
+                    if timesteps[0] > last_timestep or timesteps[1] < first_timestep:
+                        continue
+                    # Timesteps are sorted within a run, so the timestep range is found
+                    # by binary search
+                    column = self.store._column(part, "timestep")[start:stop]
+                    start, stop = (
+                        start + int(np.searchsorted(column, timesteps[0], "left")),
+                        start + int(np.searchsorted(column, timesteps[1], "right")),
+                    )
+                yield part, slice(start, stop)
+
+    def _read(self, part, rows):
+        agent_positions = self.store.agent_positions(self.predicates.get("agents"))
+        data = {
+            column: np.array(self.store._column(part, column)[rows])
+            for column in INDEX_COLUMNS + self.columns
+        }
+        for field in self.agent_fields:
+            data[f"agent.{field}"] = np.array(
+                self.store._column(part, f"agent.{field}")[rows][:, agent_positions]
+            )
+        return data
+
+    def to_numpy(self) -> dict:
+        """Execute the query, returning a dictionary of arrays, with agent fields as
+        `agent.{field}` arrays of shape (rows, agents)"""
+        chunks = [self._read(part, rows) for part, rows in self._row_ranges()]
+        keys = (
+            INDEX_COLUMNS
+            + self.columns
+            + [f"agent.{field}" for field in self.agent_fields]
+        )
+        if not chunks:
+            agents = len(self.store.agent_positions(self.predicates.get("agents")))
+            return {
+                key: np.empty(
+                    (0, agents) if key.startswith("agent.") else 0,
+                    dtype=self.store.dtype(key),
+                )
+                for key in keys
+            }
+        return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in keys}
+
+    def _to_pandas(self, data) -> pd.DataFrame:
+        agent_ids = self.store.agent_ids(self.predicates.get("agents"))
+        columns = {key: data[key] for key in INDEX_COLUMNS + self.columns}
+        for field in self.agent_fields:
+            values = data[f"agent.{field}"]
+            encoding = self.store.fields[field]
+            categories = (
+                list(OPTION_SIDE_CODES)
+                if encoding == "side"
+                else self.store.categories.get(field)
+            )
+            for position, agent_id in enumerate(agent_ids):
+                column = values[:, position]
+                if categories is not None:
+                    column = pd.Categorical.from_codes(column, categories)
+                elif encoding in _NULLABLE_INT_ENCODINGS:
+                    column = pd.arrays.IntegerArray(column, column == -1)
+                columns[f"agent_{agent_id}.{field}"] = column
+        return pd.DataFrame(columns)
+
+    def to_pandas(self) -> pd.DataFrame:
+        """Execute the query, returning a DataFrame with a column per State Variable and
+        `agent_{id}.{field}` column per agent field"""
+        return self._to_pandas(self.to_numpy())
+
+    def iter_pandas(self):
+        """Execute the query, yielding a DataFrame per selected row range (at most one
+        run), for out-of-core analysis"""
+        for part, rows in self._row_ranges():
+            yield self._to_pandas(self._read(part, rows))
+
+
+class ResultsStore:
+    """A results store directory written by `ResultsWriter`, `write_results(...)` or
+    `write_checkpoint_results(...)`"""
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        with open(os.path.join(self.directory, "store.json")) as f:
+            metadata = json.load(f)
+        self.columns = metadata["columns"]
+        self.agents = metadata["agents"]
+        self.compact = metadata.get("compact", False)
+        self.fields = metadata["fields"]
+        self.categories = metadata["categories"]
+        self.parts = metadata["parts"]
+        self._memmaps = {}
+
+    def __len__(self):
+        return sum(part["rows"] for part in self.parts)
+
+    def _column(self, part, column):
+        """Return a memory-mapped column of a part"""
+        key = (part["path"], column)
+        if key not in self._memmaps:
+            self._memmaps[key] = np.load(
+                os.path.join(self.directory, part["path"], f"{column}.npy"),
+                mmap_mode="r",
+            )
+        return self._memmaps[key]
+
+    def dtype(self, key):
+        if key.startswith("agent."):
+            return _DTYPES[self.fields[key[len("agent.") :]]]
+        return _DTYPES[self.columns[key]]
+
+    def agent_positions(self, agents=None):
+        """Return the column positions of agent indices `agents`, or of all agents"""
+        if agents is None:
+            return np.arange(len(self.agents))
+        position_of = {agent: position for position, agent in enumerate(self.agents)}
+        return np.array([position_of[agent] for agent in agents], dtype=np.intp)
+
+    def agent_ids(self, agents=None):
+        return self.agents if agents is None else list(agents)
+
+    def select(self, *columns, agent_fields=()) -> Query:
+        """Start a lazy query of State Variable `columns` and `agent_fields`, see
+        `Query.where(...)`"""
+        for column in columns:
+            if column not in self.columns:
+                raise KeyError(
+                    f"Column {column} not in results store, one of {list(self.columns)}"
+                )
+        for field in agent_fields:
+            if field not in self.fields:
+                raise KeyError(
+                    f"Agent field {field} not in results store, "
+                    f"one of {list(self.fields)}"
+                )
+        return Query(
+            self,
+            [column for column in columns if column not in INDEX_COLUMNS],
+            agent_fields,
+        )
+
+
+def precision_report(store, reference) -> pd.DataFrame:
+    """Compare each State Variable column and agent field of `store`, e.g. a compact
+    store, with `reference`, a full-precision store of the same results, one column or
+    field at a time
+
+    Returns:
+        pd.DataFrame: Per column and agent field, the storage dtypes, the maximum
+        absolute and relative errors of floats, the number of other values that differ,
+        and whether the column is `within_precision`: floats within a relative error of
+        `FLOAT32_RELATIVE_PRECISION`, and all other values identical
+    """
+    if len(store) != len(reference):
+        raise ValueError(
+            f"Stores have different numbers of rows, {len(store)} and {len(reference)}"
+        )
+
+    def compare(name, dtype, reference_dtype, values, expected):
+        if values.dtype.kind == "f":
+            values = values.astype(np.float64)
+            error = np.abs(values - expected)
+            relative_error = np.divide(
+                error, np.abs(expected), out=np.zeros_like(error), where=expected != 0
+            )
+            missing = np.isnan(values) | np.isnan(expected)
+            mismatches = int(
+                np.count_nonzero(
+                    (np.isnan(values) != np.isnan(expected))
+                    | ((expected == 0) & (values != 0))
+                )
+            )
+            max_error = float(error[~missing].max(initial=0.0))
+            max_relative_error = float(relative_error[~missing].max(initial=0.0))
+        else:
+            mismatches = int(np.count_nonzero(values != expected))
+            max_error = max_relative_error = 0.0
+        return {
+            "name": name,
+            "dtype": np.dtype(dtype).name,
+            "reference_dtype": np.dtype(reference_dtype).name,
+            "max_abs_error": max_error,
+            "max_rel_error": max_relative_error,
+            "mismatches": mismatches,
+            "within_precision": (
+                mismatches == 0 and max_relative_error <= FLOAT32_RELATIVE_PRECISION
+            ),
+        }
+
+    report = []
+    for column in store.columns:
+        values = store.select(column).to_numpy()[column]
+        expected = reference.select(column).to_numpy()[column]
+        report.append(
+            compare(
+                column, store.dtype(column), reference.dtype(column), values, expected
+            )
+        )
+    for field in store.fields:
+        key = f"agent.{field}"
+        values = _decode(
+            store, field, store.select(agent_fields=[field]).to_numpy()[key]
+        )
+        expected = _decode(
+            reference, field, reference.select(agent_fields=[field]).to_numpy()[key]
+        )
+        report.append(
+            compare(key, store.dtype(key), reference.dtype(key), values, expected)
+        )
+    return pd.DataFrame(report).set_index("name")
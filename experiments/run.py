@@ -17,19 +17,83 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 
 
-def run(executable=experiment):
+def run(
+    executable=experiment,
+    profiler=None,
+    memory_tracker=None,
+    event_driven=False,
+    checkpointer=None,
+    resume=False,
+    shard=None,
+):
+    """Run an experiment or simulation and return the post-processed results and exceptions
+
+    Args:
+        executable: radCAD Experiment or Simulation
+        profiler (experiments.profiling.Profiler, optional): Opt-in profiler of the State Update Blocks
+        memory_tracker (experiments.memory.MemoryTracker, optional): Opt-in memory footprint tracker
+        event_driven (bool, optional): Run the default agent model in event-driven mode, see `experiments.event_driven`
+        checkpointer (experiments.checkpoint.Checkpointer, optional): Checkpoint progress to disk, see `resume(...)`
+        resume (bool, optional): Resume from the checkpoint of `checkpointer`, rather than starting from scratch
+        shard (tuple, optional): Only execute the runs of shard `(index, count)`, using `checkpointer`, see `experiments.shard`
+    """
+    if event_driven and (profiler or memory_tracker):
+        raise ValueError("Profiling and memory tracking instrument the State Update Blocks, which the event-driven mode doesn't execute")
+    if event_driven and checkpointer:
+        raise ValueError("The event-driven mode doesn't support checkpointing")
+    if resume and not checkpointer:
+        raise ValueError("Resuming an experiment requires a checkpointer")
+    if shard and not checkpointer:
+        raise ValueError("Executing a shard of an experiment requires a checkpointer")
+
     logging.info("Running experiment")
     start_time = time.time()
 
-    executable.run()
+    if event_driven:
+        from experiments.event_driven import run_event_driven
+
+        df = run_event_driven(executable)
+        logging.info(f"Experiment complete in {time.time() - start_time} seconds")
+
+        try:
+            parameters = executable.simulations[0].model.params
+        except:
+            parameters = executable.model.params
+
+        return post_process(df, parameters=parameters), []
+
+    if memory_tracker:
+        memory_tracker.instrument(executable)
+    if profiler:
+        profiler.instrument(executable)
+    try:
+        if checkpointer:
+            checkpointer.run(executable, resume=resume, shard=shard)
+        else:
+            executable.run()
+    finally:
+        if profiler:
+            profiler.restore(executable)
+        if memory_tracker:
+            memory_tracker.restore(executable)
 
     experiment_duration = time.time() - start_time
     logging.info(f"Experiment complete in {experiment_duration} seconds")
 
+    if profiler:
+        profiler.report()
+
     logging.info("Post-processing results")
+    post_processing_start_time = time.time()
+
+    if memory_tracker:
+        memory_tracker.sample_stage("experiment complete")
 
     df = pd.DataFrame(executable.results)
 
+    if memory_tracker:
+        memory_tracker.sample_stage("results DataFrame", df)
+
     try:
         parameters = executable.simulations[0].model.params
     except:
@@ -37,12 +101,30 @@ def run(executable=experiment):
 
     df = post_process(df, parameters=parameters)
 
-    post_processing_duration = time.time() - start_time - experiment_duration
+    post_processing_duration = time.time() - post_processing_start_time
     logging.info(f"Post-processing complete in {post_processing_duration} seconds")
 
+    if memory_tracker:
+        memory_tracker.sample_stage("post-processed DataFrame", df)
+        memory_tracker.report()
+
     return df, executable.exceptions
 
 
+def resume(executable=experiment, checkpointer=None, **kwargs):
+    """Resume an interrupted experiment or simulation from its checkpoint, skipping completed runs
+
+    Args:
+        checkpointer (experiments.checkpoint.Checkpointer, optional): Defaults to the `checkpoints` directory
+        **kwargs: Other arguments of `run(...)`
+    """
+    if checkpointer is None:
+        from experiments.checkpoint import Checkpointer
+
+        checkpointer = Checkpointer()
+    return run(executable, checkpointer=checkpointer, resume=True, **kwargs)
+
+
 if __name__ == '__main__':
     df, _exceptions = run()
     print(df)
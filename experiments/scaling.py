@@ -0,0 +1,218 @@
+"""
+Scaling benchmark harness
+
+Sweeps the number of agents, timesteps and Monte Carlo runs on a log grid,
+running the default experiment at each point, and fits a scaling exponent per dimension.
+
+Each dimension is swept one at a time around a base configuration, with the other two
+dimensions held at their base values. Every point is executed in a fresh Python
+subprocess, so that peak RSS is measured independently for each point, using an
+experiment of the point's size created by
+`experiments.default_experiment.create_experiment(...)`.
+
+Usage, from the root of the project directory:
+```bash
+python -m experiments.scaling --agents 10 1000 5 --timesteps 30 365 4 --runs 2 64 6 \
+    --output scaling_report
+```
+which writes `scaling_report.json` (points and fitted exponents) and
+`scaling_report.csv` (points).
+"""
+
+import argparse
+import json
+import logging
+import pickle
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+
+DIMENSIONS = {
+    "agents": "n_agents",
+    "timesteps": "timesteps",
+    "runs": "runs",
+}
+"""Mapping of sweep dimension to the `create_experiment(...)` argument it sets"""
+
+DEFAULT_BASE = {"agents": 20, "timesteps": 50, "runs": 4}
+"""Base configuration, held constant for the dimensions not being swept"""
+
+
+def log_grid(start, stop, num):
+    """Return `num` unique integers spaced evenly on a log scale between `start` and
+    `stop` (inclusive)"""
+    return [int(x) for x in np.unique(np.geomspace(start, stop, int(num)).round())]
+
+
+def run_point(agents, timesteps, runs, backend="SINGLE_PROCESS"):
+    """Run the default experiment for a single point of the grid and return its
+    measurements
+
+    NOTE This should be executed in a fresh process, so that peak RSS isn't affected by
+    previous points.
+    """
+    import psutil
+    from memory_profiler import memory_usage
+
+    from radcad import Backend
+    from experiments.default_experiment import create_experiment
+
+    arguments = dict(zip(DIMENSIONS.values(), (agents, timesteps, runs)))
+    experiment = create_experiment(**arguments, backend=Backend[backend])
+    baseline_rss = psutil.Process().memory_info().rss / 2**20
+
+    start_time = time.time()
+    peak_rss, _ = memory_usage(
+        (experiment.run, (), {}),
+        interval=0.05,
+        include_children=True,
+        max_usage=True,
+        retval=True,
+    )
+    wall_time = time.time() - start_time
+
+    results = experiment.results
+
+    return {
+        "agents": agents,
+        "timesteps": timesteps,
+        "runs": runs,
+        "backend": backend,
+        "wall_time": wall_time,
+        "time_per_timestep": wall_time / (timesteps * runs),
+        "peak_rss_mb": float(peak_rss),
+        "peak_rss_increase_mb": float(peak_rss) - baseline_rss,
+        "result_rows": len(results),
+        "result_bytes": len(pickle.dumps(results, -1)),
+    }
+
+
+def measure_point(agents, timesteps, runs, backend="SINGLE_PROCESS"):
+    """Run `run_point(...)` in a subprocess and return its measurements"""
+    logging.info(f"Measuring agents={agents} timesteps={timesteps} runs={runs}")
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "experiments.scaling",
+            "--point",
+            str(agents),
+            str(timesteps),
+            str(runs),
+            "--backend",
+            backend,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    # The measurements are printed as JSON on the last line of stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def fit_scaling_exponent(x, y):
+    """Fit `y = a * x ** k` using least squares in log-log space and return the scaling
+    exponent `k`"""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if len(x) < 2 or (y <= 0).any():
+        return None
+    k, _log_a = np.polyfit(np.log(x), np.log(y), 1)
+    return float(k)
+
+
+def sweep(grids, base=DEFAULT_BASE, backend="SINGLE_PROCESS"):
+    """Sweep each dimension in `grids` one at a time around the `base` configuration
+
+    Args:
+        grids (dict): Mapping of dimension ("agents", "timesteps", "runs") to a list of
+            values
+        base (dict): Base configuration for dimensions not being swept
+        backend (str): radCAD `Backend` name
+
+    Returns:
+        tuple: A `pd.DataFrame` of measured points and a dictionary of fitted scaling
+            exponents
+    """
+    rows = []
+    exponents = {}
+
+    for dimension, values in grids.items():
+        points = []
+        for value in values:
+            config = {**base, dimension: value}
+            point = measure_point(
+                config["agents"], config["timesteps"], config["runs"], backend
+            )
+            points.append({"dimension": dimension, **point})
+        rows.extend(points)
+
+        x = [point[dimension] for point in points]
+        exponents[dimension] = {
+            metric: fit_scaling_exponent(x, [point[metric] for point in points])
+            for metric in ["wall_time", "peak_rss_increase_mb", "result_bytes"]
+        }
+
+    return pd.DataFrame(rows), exponents
+
+
+def write_report(df, exponents, output):
+    """Write the scaling report to `{output}.json` and `{output}.csv`"""
+    df.to_csv(f"{output}.csv", index=False)
+    with open(f"{output}.json", "w") as f:
+        report = {"exponents": exponents, "points": df.to_dict(orient="records")}
+        json.dump(report, f, indent=2)
+
+
+def main(argv=None):
+    """Sweep the grids given by the command line flags `argv`, and write the scaling
+    report to `--output`
+
+    With `--point`, instead run a single point of the grid and print its measurements as
+    JSON, which is how `measure_point(...)` executes each point in a fresh subprocess.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    for dimension in DIMENSIONS:
+        parser.add_argument(
+            f"--{dimension}",
+            nargs=3,
+            type=int,
+            metavar=("START", "STOP", "NUM"),
+            help=f"Log grid for the number of {dimension}",
+        )
+    parser.add_argument(
+        "--base", nargs=3, type=int, metavar=("AGENTS", "TIMESTEPS", "RUNS")
+    )
+    parser.add_argument(
+        "--backend", default="SINGLE_PROCESS", help="radCAD Backend name"
+    )
+    parser.add_argument(
+        "--output", default="scaling_report", help="Report path without extension"
+    )
+    parser.add_argument("--point", nargs=3, type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.point:
+        print(json.dumps(run_point(*args.point, backend=args.backend)))
+        return
+
+    logging.basicConfig(level=logging.INFO)
+
+    base = dict(zip(DIMENSIONS, args.base)) if args.base else DEFAULT_BASE
+    grids = {
+        dimension: log_grid(*getattr(args, dimension))
+        for dimension in DIMENSIONS
+        if getattr(args, dimension)
+    }
+    df, exponents = sweep(grids, base=base, backend=args.backend)
+    write_report(df, exponents, args.output)
+
+    print(df.to_string(index=False))
+    print(json.dumps(exponents, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Sharded execution and merging of experiments
+
+Splits the runs of an experiment across independent jobs, e.g. the tasks of a batch
+scheduler job array on several nodes. Shard `index` of `count` executes every `count`-th
+(simulation, subset, run) of the experiment starting from `index`, in the order radCAD
+executes runs, and checkpoints its completed runs to its own directory (see
+`experiments.checkpoint`). Every run is seeded from the experiment seed and its
+simulation, subset and run indices, so its results don't depend on the shard it is
+executed in, and merging the shards produces results identical to a single-node
+checkpointed run of the experiment with the same seed.
+
+Usage, e.g. as the tasks of a job array, with the shard index read from the scheduler's
+environment if not given:
+```bash
+python -m experiments.cli --runs 200 --agents 100 --shards 16 --shard 3 \
+    --checkpoint shards/3
+python -m experiments.shard shards/* --output results.pkl
+```
+or in Python:
+```python
+from experiments.checkpoint import Checkpointer
+from experiments.shard import merge_shards
+
+for shard in range(4):
+    Checkpointer(f"shards/{shard}", seed=1).run(experiment, shard=(shard, 4))
+results, exceptions = merge_shards([f"shards/{shard}" for shard in range(4)])
+```
+"""
+
+import argparse
+import json
+import logging
+import os
+
+from radcad.utils import extract_exceptions
+
+from experiments.checkpoint import load_parameters, load_runs
+
+
+SHARD_INDEX_VARIABLES = {
+    "SLURM_ARRAY_TASK_ID": 0,
+    "PBS_ARRAYID": 0,
+    "PBS_ARRAY_INDEX": 0,
+    "AWS_BATCH_JOB_ARRAY_INDEX": 0,
+    "SGE_TASK_ID": 1,
+    "LSB_JOBINDEX": 1,
+}
+"""Environment variables of the job array task index of common batch schedulers, and the
+index of their first task"""
+
+
+def shard_from_environment(environ=os.environ) -> int:
+    """Return the 0-based shard index from the job array task index of the batch
+    scheduler"""
+    for variable, first in SHARD_INDEX_VARIABLES.items():
+        value = environ.get(variable)
+        if value not in (None, "", "undefined"):
+            return int(value) - first
+    raise ValueError(
+        f"No shard index given, and none of {list(SHARD_INDEX_VARIABLES)} set"
+    )
+
+
+def _read_manifest(directory):
+    with open(os.path.join(directory, "manifest.json")) as f:
+        return json.load(f)
+
+
+def merge_shards(directories):
+    """Merge the checkpoint directories of all shards of an experiment
+
+    Returns:
+        tuple: The results and exceptions of the experiment, identical to those of a
+            single-node checkpointed run
+    Raises:
+        ValueError: If the shards are of different experiments, or shards or runs are
+            missing
+    """
+    manifests = {directory: _read_manifest(directory) for directory in directories}
+    first = next(iter(manifests.values()))
+    count = first["shard"][1] if first["shard"] else 1
+
+    shards = {}
+    for directory, manifest in manifests.items():
+        if (
+            manifest["seed"] != first["seed"]
+            or manifest["simulations"] != first["simulations"]
+        ):
+            raise ValueError(
+                f"Shard {directory} is of a different experiment configuration or seed"
+            )
+        index = manifest["shard"][0] if manifest["shard"] else 0
+        shard_count = manifest["shard"][1] if manifest["shard"] else 1
+        if shard_count != count or index in shards:
+            raise ValueError(
+                f"Shard {directory} is inconsistent with the other shards, "
+                "or duplicated"
+            )
+        shards[index] = directory
+    missing = sorted(set(range(count)) - set(shards))
+    if missing:
+        raise ValueError(f"Missing shards {missing} of {count}")
+
+    # Runs in the order radCAD executes them, which determines the shard of each run
+    paths = []
+    for simulation, configuration in enumerate(first["simulations"]):
+        for run in range(configuration["runs"]):
+            for subset in range(configuration["subsets"]):
+                directory = shards[len(paths) % count]
+                path = os.path.join(
+                    directory, "runs", f"{simulation}-{subset}-{run}.pkl"
+                )
+                if not os.path.exists(path):
+                    raise ValueError(
+                        f"Run {os.path.basename(path)} of shard {directory} is "
+                        "incomplete, resume the shard"
+                    )
+                paths.append(path)
+
+    logging.info(f"Merging {len(paths)} runs of {count} shards")
+    return extract_exceptions(load_runs(paths))
+
+
+def main(argv=None):
+    """Merge the shards given on the command line, and write the post-processed results
+    to `--output`
+
+    The results are post-processed with the System Parameters of the experiment recorded
+    in the shard manifests, see `experiments.checkpoint.load_parameters(...)`.
+    """
+    parser = argparse.ArgumentParser(
+        description="Merge the checkpoint directories of all shards of an experiment"
+    )
+    parser.add_argument("directories", nargs="+", help="Shard checkpoint directories")
+    parser.add_argument("--output", required=True, help="Results path, .pkl or .csv")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+
+    from experiments.cli import write_results
+    from experiments.post_processing import post_process
+
+    results, exceptions = merge_shards(args.directories)
+    failed = [
+        exception for exception in exceptions if exception["exception"] is not None
+    ]
+    if failed:
+        logging.warning(
+            f"{len(failed)} runs failed, see the exceptions of their checkpoints"
+        )
+    parameters = load_parameters(args.directories[0])
+    write_results(
+        post_process(pd.DataFrame(results), parameters=parameters), args.output
+    )
+
+
+if __name__ == "__main__":
+    main()
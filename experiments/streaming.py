@@ -0,0 +1,452 @@
+"""
+Streaming per-timestep statistics across Monte Carlo runs
+
+Aggregates per-timestep distribution statistics of metrics (e.g. the volatile asset
+price, the discounted payoff and open interest) across runs, one run at a time, without
+keeping the results of previous runs:
+* `TimestepMoments`: count, mean, variance, minimum and maximum of each timestep
+* `TimestepQuantileSketch`: a merging t-digest of each timestep, for approximate
+  quantiles
+* `StreamingAggregator`: the moments and quantile sketch of each metric, for each
+  (simulation, subset)
+
+Memory is O(timesteps x metrics x compression), independent of the number of runs, and
+all statistics can be merged, so that partial aggregates computed by worker processes
+can be combined.
+
+Usage:
+```python
+from experiments.streaming import StreamingAggregator
+
+aggregator = StreamingAggregator()
+for result in results_of_each_run:
+    aggregator.update_run(result)
+# Or, from a checkpointed experiment (see `experiments.checkpoint`), in parallel worker
+# processes
+aggregator = StreamingAggregator.from_checkpoint("checkpoints", processes=4)
+
+bands = aggregator.quantile_bands("volatile_asset_price")
+risk_table = aggregator.risk_table("discounted_payoff")
+```
+"""
+
+import glob
+import os
+import pickle
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+
+def open_interest(state) -> int:
+    """Number of open options: options bought by agents and not yet exercised, and open
+    positions of the position ledger"""
+    count = sum(
+        agent.option_side == "buy" and agent.has_counterparty
+        for key, agent in state.items()
+        if key.startswith("agent_")
+    )
+    positions = state.get("positions")
+    if positions is not None:
+        count += len(positions.open_positions())
+    return count
+
+
+METRICS = {
+    "volatile_asset_price": lambda state: state["volatile_asset_price"],
+    "discounted_payoff": lambda state: state["discounted_payoff"],
+    "open_interest": open_interest,
+}
+"""Default metrics, functions of the state at the end of each timestep"""
+
+
+class TimestepMoments:
+    """Running count, mean, variance, minimum and maximum of each timestep, ignoring NaN
+    values
+
+    Args:
+        timesteps (int): Number of timesteps, including the initial timestep 0
+    """
+
+    def __init__(self, timesteps: int):
+        self.count = np.zeros(timesteps)
+        self.mean = np.zeros(timesteps)
+        self.m2 = np.zeros(timesteps)
+        self.min = np.full(timesteps, np.inf)
+        self.max = np.full(timesteps, -np.inf)
+
+    def _combine(self, count, mean, m2, minimum, maximum):
+        # Parallel algorithm of Chan et al. for combining the moments of two samples
+        total = self.count + count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = mean - self.mean
+            self.mean = np.where(total > 0, self.mean + delta * count / total, 0.0)
+            self.m2 = np.where(
+                total > 0, self.m2 + m2 + delta**2 * self.count * count / total, 0.0
+            )
+        self.count = total
+        self.min = np.fmin(self.min, minimum)
+        self.max = np.fmax(self.max, maximum)
+
+    def update(self, values):
+        """Add the values of one run, an array of shape (timesteps,), or of several
+        runs, of shape (runs, timesteps)"""
+        values = np.atleast_2d(np.asarray(values, dtype=float))
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(
+                count > 0, np.where(valid, values, 0.0).sum(axis=0) / count, 0.0
+            )
+        m2 = np.where(valid, (values - mean) ** 2, 0.0).sum(axis=0)
+        self._combine(
+            count,
+            mean,
+            m2,
+            np.where(valid, values, np.inf).min(axis=0),
+            np.where(valid, values, -np.inf).max(axis=0),
+        )
+
+    def merge(self, other: "TimestepMoments"):
+        """Merge the moments of another sample into these moments"""
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    @property
+    def variance(self) -> np.ndarray:
+        """Sample variance of each timestep, NaN with fewer than two values"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 1, self.m2 / (self.count - 1), np.nan)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.variance)
+
+
+class TimestepQuantileSketch:
+    """A merging t-digest of each timestep, ignoring NaN values
+
+    The values of each timestep are summarised by at most about `compression / 2`
+    weighted centroids, which are small near the tails and large near the median, so
+    that tail quantiles remain accurate. The sketches of all timesteps are stored as
+    (timesteps, centroids) arrays, and compressed at once.
+
+    Args:
+        timesteps (int): Number of timesteps, including the initial timestep 0
+        compression (int): Compression parameter, the accuracy / memory trade-off
+        buffer_size (int): Number of values buffered before the centroids are compressed
+    """
+
+    def __init__(self, timesteps: int, compression: int = 200, buffer_size: int = 256):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.means = np.zeros((timesteps, 0))
+        self.weights = np.zeros((timesteps, 0))
+        self.min = np.full(timesteps, np.inf)
+        self.max = np.full(timesteps, -np.inf)
+
+    @property
+    def timesteps(self) -> int:
+        return self.means.shape[0]
+
+    def _append(self, means, weights):
+        self.means = np.concatenate([self.means, means], axis=1)
+        self.weights = np.concatenate([self.weights, weights], axis=1)
+        if self.means.shape[1] > self.compression + self.buffer_size:
+            self.compress()
+
+    def update(self, values):
+        """Add the values of one run, an array of shape (timesteps,), or of several
+        runs, of shape (runs, timesteps)"""
+        values = np.atleast_2d(np.asarray(values, dtype=float)).T
+        valid = ~np.isnan(values)
+        self.min = np.fmin(self.min, np.where(valid, values, np.inf).min(axis=1))
+        self.max = np.fmax(self.max, np.where(valid, values, -np.inf).max(axis=1))
+        self._append(np.where(valid, values, 0.0), valid.astype(float))
+
+    def merge(self, other: "TimestepQuantileSketch"):
+        """Merge the centroids of another sketch into this sketch"""
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        self._append(other.means, other.weights)
+
+    def _sorted(self):
+        """Return the centroids of each timestep sorted by mean, with empty centroids
+        last"""
+        order = np.argsort(
+            np.where(self.weights > 0, self.means, np.inf), axis=1, kind="stable"
+        )
+        means = np.take_along_axis(self.means, order, axis=1)
+        weights = np.take_along_axis(self.weights, order, axis=1)
+        return means, weights
+
+    def compress(self):
+        """Merge adjacent centroids of each timestep, using the k1 scale function of the
+        t-digest"""
+        means, weights = self._sorted()
+        total = weights.sum(axis=1, keepdims=True)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            q = np.clip((np.cumsum(weights, axis=1) - weights / 2) / total, 0.0, 1.0)
+        # k1(q) = compression / (2 pi) * arcsin(2q - 1), shifted to start at 0, so that
+        # each unit of k is one centroid
+        k = np.arcsin(2 * np.nan_to_num(q) - 1) + np.pi / 2
+        k *= self.compression / (2 * np.pi)
+        n_bins = int(np.floor(self.compression / 2)) + 1
+        offsets = n_bins * np.arange(self.timesteps)[:, None]
+        bins = np.minimum(k.astype(int), n_bins - 1) + offsets
+
+        size = n_bins * self.timesteps
+        merged_weights = np.bincount(bins.ravel(), weights.ravel(), minlength=size)
+        sums = np.bincount(bins.ravel(), (weights * means).ravel(), minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            merged_means = np.where(merged_weights > 0, sums / merged_weights, 0.0)
+        self.means = merged_means.reshape(self.timesteps, n_bins)
+        self.weights = merged_weights.reshape(self.timesteps, n_bins)
+
+    def quantile(self, quantiles) -> np.ndarray:
+        """Return the approximate quantiles of each timestep, an array of shape
+        (quantiles, timesteps)
+
+        Quantiles are interpolated between the centroids, at the midpoint of their
+        cumulative weight, and the minimum and maximum, and are NaN for timesteps
+        without values.
+        """
+        quantiles = np.atleast_1d(np.asarray(quantiles, dtype=float))
+        means, weights = self._sorted()
+        total = weights.sum(axis=1, keepdims=True)
+        midpoints = np.cumsum(weights, axis=1) - weights / 2
+        # Empty centroids are placed at the maximum, so that each row remains sorted
+        means = np.where(weights > 0, means, self.max[:, None])
+        midpoints = np.where(weights > 0, midpoints, total)
+
+        x = np.concatenate([np.zeros_like(total), midpoints, total], axis=1)
+        y = np.concatenate([self.min[:, None], means, self.max[:, None]], axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            x = x / total
+        x = np.nan_to_num(x)
+
+        # Interpolate all timesteps at once, by offsetting each row of x into a disjoint
+        # interval
+        rows = np.arange(self.timesteps)[:, None]
+        offset_x = (x + 2 * rows).ravel()
+        targets = (quantiles[None, :] + 2 * rows).ravel()
+        upper = np.clip(
+            np.searchsorted(offset_x, targets, side="right"), 1, offset_x.size - 1
+        )
+        lower = upper - 1
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fraction = np.where(
+                offset_x[upper] > offset_x[lower],
+                (targets - offset_x[lower]) / (offset_x[upper] - offset_x[lower]),
+                0.0,
+            )
+        flat_y = y.ravel()
+        with np.errstate(invalid="ignore"):
+            fraction = np.clip(fraction, 0.0, 1.0)
+            values = flat_y[lower] + fraction * (flat_y[upper] - flat_y[lower])
+        values = values.reshape(self.timesteps, len(quantiles))
+        values[total[:, 0] == 0] = np.nan
+        return values.T
+
+
+def _run_states(result):
+    """Return the state at the end of each timestep of a single run, from a list of
+    substeps, a list of states or a DataFrame"""
+    if isinstance(result, pd.DataFrame):
+        return result.drop_duplicates("timestep", keep="last").to_dict("records")
+    if result and isinstance(result[0], list):
+        return [substeps[-1] for substeps in result]
+    states = {}
+    for state in result:
+        states[state["timestep"]] = state
+    return list(states.values())
+
+
+class StreamingAggregator:
+    """Per-timestep moments and quantile sketches of metrics, for each (simulation,
+    subset), updated one run at a time
+
+    Args:
+        metrics (dict): Metric names and functions of the state at the end of each
+            timestep, by default `METRICS`
+        compression (int): Compression parameter of the quantile sketches
+    """
+
+    def __init__(self, metrics=None, compression: int = 200):
+        self.metrics = dict(METRICS if metrics is None else metrics)
+        self.compression = compression
+        self.timesteps = None
+        # (simulation, subset) -> metric -> (TimestepMoments, TimestepQuantileSketch)
+        self.groups = {}
+        self.runs = {}
+
+    def __getstate__(self):
+        # Default metrics (lambdas) are pickled by name, so that aggregates can be
+        # returned from worker processes, and other metric functions as they are
+        state = self.__dict__.copy()
+        state["metrics"] = {
+            metric: metric if METRICS.get(metric) is function else function
+            for metric, function in self.metrics.items()
+        }
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.metrics = {}
+        for metric, function in state["metrics"].items():
+            if isinstance(function, str):
+                if function not in METRICS:
+                    raise ValueError(
+                        f"Unknown metric {function}, one of {list(METRICS)}"
+                    )
+                function = METRICS[function]
+            self.metrics[metric] = function
+
+    def _group(self, key, timesteps):
+        if self.timesteps is None:
+            self.timesteps = timesteps
+        if key not in self.groups:
+            self.groups[key] = {
+                metric: (
+                    TimestepMoments(self.timesteps),
+                    TimestepQuantileSketch(self.timesteps, self.compression),
+                )
+                for metric in self.metrics
+            }
+            self.runs[key] = 0
+        return self.groups[key]
+
+    def update_run(self, result, timesteps: int = None):
+        """Add the metrics of a single completed run
+
+        Args:
+            result: The results of the run, a list of substeps per timestep as returned
+                by radCAD, a list of states, or a DataFrame
+            timesteps (int): Number of timesteps of the experiment, by default that of
+                the first run; metrics of runs that terminated early are NaN after their
+                last timestep
+        """
+        states = _run_states(result)
+        key = (states[0]["simulation"], states[0]["subset"])
+        length = len(states) if timesteps is None else timesteps + 1
+        group = self._group(key, length)
+        for metric, function in self.metrics.items():
+            values = np.full(self.timesteps, np.nan)
+            for state in states[: self.timesteps]:
+                values[state["timestep"]] = function(state)
+            moments, sketch = group[metric]
+            moments.update(values)
+            sketch.update(values)
+        self.runs[key] += 1
+
+    def update_results(self, results):
+        """Add the metrics of every run of a list of result states or a results
+        DataFrame"""
+        if isinstance(results, pd.DataFrame):
+            for _, df in results.groupby(["simulation", "subset", "run"], sort=False):
+                self.update_run(df)
+            return
+        run = []
+        for state in results:
+            if run and (state["simulation"], state["subset"], state["run"]) != (
+                run[-1]["simulation"],
+                run[-1]["subset"],
+                run[-1]["run"],
+            ):
+                self.update_run(run)
+                run = []
+            run.append(state)
+        if run:
+            self.update_run(run)
+
+    def merge(self, other: "StreamingAggregator") -> "StreamingAggregator":
+        """Merge the aggregate of another set of runs, e.g. computed by another worker
+        process, into this aggregate"""
+        for key, group in other.groups.items():
+            if self.timesteps is not None and other.timesteps != self.timesteps:
+                raise ValueError(
+                    f"Can't merge aggregates of {other.timesteps} and "
+                    f"{self.timesteps} timesteps"
+                )
+            if key not in self.groups:
+                self._group(key, other.timesteps)
+            for metric, (moments, sketch) in group.items():
+                self.groups[key][metric][0].merge(moments)
+                self.groups[key][metric][1].merge(sketch)
+            self.runs[key] += other.runs[key]
+        return self
+
+    @classmethod
+    def from_checkpoint(
+        cls, directory, metrics=None, compression: int = 200, processes: int = None
+    ):
+        """Aggregate the completed runs of a checkpointed experiment (see
+        `experiments.checkpoint`), loading a single run in memory at a time, optionally
+        in parallel worker processes"""
+        paths = sorted(glob.glob(os.path.join(directory, "runs", "*.pkl")))
+        chunks = [paths[i :: processes or 1] for i in range(processes or 1)]
+        arguments = [(chunk, metrics, compression) for chunk in chunks if chunk]
+        if processes and processes > 1 and len(arguments) > 1:
+            from pathos.multiprocessing import ProcessPool
+
+            with ProcessPool(processes) as pool:
+                aggregates = pool.map(_aggregate_run_files, arguments)
+                pool.close()
+                pool.join()
+                pool.clear()
+        else:
+            aggregates = list(map(_aggregate_run_files, arguments))
+        return reduce(cls.merge, aggregates, cls(metrics, compression))
+
+    def moments(self, metric, simulation=0, subset=0) -> TimestepMoments:
+        return self.groups[(simulation, subset)][metric][0]
+
+    def quantile_bands(
+        self, metric, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), simulation=0, subset=0
+    ) -> pd.DataFrame:
+        """Per-timestep quantiles across runs as a timestep x quantile DataFrame,
+        in the format of `experiments.notebook_helpers.get_quantile_bands(...)`"""
+        sketch = self.groups[(simulation, subset)][metric][1]
+        return pd.DataFrame(
+            sketch.quantile(quantiles).T,
+            index=pd.RangeIndex(self.timesteps, name="timestep"),
+            columns=list(quantiles),
+        )
+
+    def risk_table(
+        self,
+        metric,
+        timesteps=None,
+        quantiles=(0.01, 0.05, 0.5, 0.95, 0.99),
+        simulation=0,
+        subset=0,
+    ) -> pd.DataFrame:
+        """Distribution statistics of a metric across runs at `timesteps`, by default
+        the final timestep"""
+        timesteps = [self.timesteps - 1] if timesteps is None else list(timesteps)
+        moments = self.moments(metric, simulation, subset)
+        table = pd.DataFrame(
+            {
+                "runs": moments.count[timesteps].astype(int),
+                "mean": moments.mean[timesteps],
+                "std": moments.std[timesteps],
+                "min": moments.min[timesteps],
+                "max": moments.max[timesteps],
+            },
+            index=pd.Index(timesteps, name="timestep"),
+        )
+        bands = self.quantile_bands(metric, quantiles, simulation, subset)
+        bands = bands.loc[timesteps]
+        for quantile in quantiles:
+            table[f"q{quantile:g}"] = bands[quantile].to_numpy()
+        return table
+
+
+def _aggregate_run_files(args):
+    paths, metrics, compression = args
+    aggregator = StreamingAggregator(metrics, compression)
+    for path in paths:
+        with open(path, "rb") as f:
+            result, _exception, _trace = pickle.load(f)
+        aggregator.update_run(result)
+    return aggregator
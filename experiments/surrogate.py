@@ -0,0 +1,418 @@
+"""
+Surrogate model of KPIs across parameter space
+
+Fits a Gaussian process surrogate to stored sweep results (see `experiments.sweep`), to
+predict the mean and quantiles of buyer and seller PnL and the exercise rate at unseen
+parameter points, without re-running the Monte Carlo experiment. Uses NumPy and SciPy
+only.
+
+Each sweep point (a unique combination of the feature columns, e.g. market scenario `mu`
+and `sigma`, `strike_price`, `option_maturity` and `option_type`) is summarised across
+its Monte Carlo runs, and an independent Gaussian process with an anisotropic (ARD)
+squared exponential kernel is fitted to each target. Numeric features are scaled to the
+unit interval, and categorical features are one-hot encoded.
+
+Usage:
+```python
+from experiments.sweep import run_sweep
+from experiments.surrogate import KPISurrogate, validation_report
+
+results = run_sweep(
+    strikes=[1_600, 1_800, 2_000, 2_200, 2_400], maturities=[90, 180, 365]
+)
+results.to_pickle("sweep_results.pkl")
+
+surrogate = KPISurrogate.fit(results)
+point = {
+    "mu": 0.05,
+    "sigma": 0.3,
+    "strike_price": 1_900,
+    "option_maturity": 270,
+    "option_type": "put",
+}
+surrogate.predict(pd.DataFrame([point]))
+
+report = validation_report(results, output_dir="surrogate")
+```
+which writes the cross-validation metrics and predictions of each target to the
+`surrogate/` directory.
+"""
+
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.linalg import cho_factor, cho_solve
+from scipy.optimize import minimize
+
+
+FEATURES = ["mu", "sigma", "strike_price", "option_maturity", "option_type"]
+"""Default feature columns of the tidy sweep results table"""
+
+QUANTILES = (0.05, 0.5, 0.95)
+"""Default quantiles of the PnL distribution across Monte Carlo runs to predict"""
+
+
+def _quantile_name(q):
+    return f"q{round(q * 100):02d}"
+
+
+def summarise_sweep(
+    results: pd.DataFrame, features=FEATURES, quantiles=QUANTILES
+) -> pd.DataFrame:
+    """Summarise the tidy sweep results as one row per sweep point
+
+    For each unique combination of `features`, the targets are the mean and `quantiles`
+    across Monte Carlo runs of the mean buyer and seller PnL per agent, and the mean
+    exercise rate (options exercised per option bought). The standard error of each mean
+    target across runs is included as `{target}_se`, as a reference for the surrogate
+    error.
+    """
+    bought = results["options_bought"].where(results["options_bought"] > 0)
+    results = results.assign(exercise_rate=results["options_exercised"] / bought)
+
+    rows = []
+    for point, runs in results.groupby(list(features), sort=False):
+        row = dict(zip(features, point if isinstance(point, tuple) else (point,)))
+        row["runs"] = len(runs)
+        for column, name in [
+            ("buyer_pnl_mean", "buyer_pnl"),
+            ("seller_pnl_mean", "seller_pnl"),
+            ("exercise_rate", "exercise_rate"),
+        ]:
+            values = runs[column].dropna().to_numpy()
+            row[f"{name}_mean"] = values.mean() if len(values) else np.nan
+            row[f"{name}_mean_se"] = (
+                values.std(ddof=1) / np.sqrt(len(values)) if len(values) > 1 else np.nan
+            )
+            if name == "exercise_rate":
+                continue
+            for q in quantiles:
+                row[f"{name}_{_quantile_name(q)}"] = (
+                    np.quantile(values, q) if len(values) else np.nan
+                )
+        rows.append(row)
+
+    return pd.DataFrame(rows)
+
+
+def default_targets(summary: pd.DataFrame):
+    """Return the target columns of a sweep summary, see `summarise_sweep(...)`"""
+    return [
+        column
+        for column in summary.columns
+        if column.startswith(("buyer_pnl_", "seller_pnl_", "exercise_rate_"))
+        and not column.endswith("_se")
+    ]
+
+
+class GaussianProcess:
+    """Single-output Gaussian process regression with an ARD squared exponential kernel
+
+    The kernel hyperparameters (a length scale per input dimension, the signal and noise
+    standard deviations) are fitted by maximising the log marginal likelihood of the
+    standardised targets, using L-BFGS-B with analytical gradients and `restarts` random
+    restarts.
+
+    Args:
+        restarts (int): Number of additional random initialisations of the
+            hyperparameter optimisation
+        seed (int): Seed of the random initialisations
+    """
+
+    # Bounds of the log hyperparameters, for inputs scaled to the unit interval and
+    # standardised targets
+    LENGTH_SCALE_BOUNDS = (np.log(1e-2), np.log(1e2))
+    SIGNAL_BOUNDS = (np.log(1e-2), np.log(1e1))
+    NOISE_BOUNDS = (np.log(1e-4), np.log(1e0))
+
+    def __init__(self, restarts=3, seed=1):
+        self.restarts = restarts
+        self.seed = seed
+
+    def _kernel(self, X1, X2, length_scales, signal):
+        scaled_differences = (X1[:, None, :] - X2[None, :, :]) / length_scales
+        scaled_distance = (scaled_differences**2).sum(axis=-1)
+        return signal**2 * np.exp(-0.5 * scaled_distance)
+
+    def _negative_log_marginal_likelihood(self, theta, X, y, squared_differences):
+        n, d = X.shape
+        length_scales = np.exp(theta[:d])
+        signal, noise = np.exp(theta[d]), np.exp(theta[d + 1])
+
+        scaled_differences = squared_differences / length_scales**2
+        K_signal = signal**2 * np.exp(-0.5 * scaled_differences.sum(axis=-1))
+        K = K_signal + (noise**2 + 1e-10) * np.eye(n)
+        try:
+            factor = cho_factor(K, lower=True)
+        except np.linalg.LinAlgError:
+            return np.inf, np.zeros_like(theta)
+        alpha = cho_solve(factor, y)
+        value = (
+            0.5 * y @ alpha
+            + np.log(np.diag(factor[0])).sum()
+            + 0.5 * n * np.log(2 * np.pi)
+        )
+
+        # d(-log p(y))/d(theta) = -1/2 tr((alpha alpha^T - K^-1) dK/d(theta))
+        W = np.outer(alpha, alpha) - cho_solve(factor, np.eye(n))
+        W_K = W * K_signal
+        gradient = np.empty_like(theta)
+        gradient[:d] = -0.5 * (W_K[:, :, None] * scaled_differences).sum(axis=(0, 1))
+        gradient[d] = -np.sum(W_K)
+        gradient[d + 1] = -(noise**2) * np.trace(W)
+        return value, gradient
+
+    def fit(self, X, y):
+        """Fit the Gaussian process to inputs `X` of shape (n, d) and targets `y` of
+        shape (n,)"""
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        n, d = X.shape
+
+        self.y_mean = y.mean()
+        self.y_std = y.std() if y.std() > 0 else 1.0
+        z = (y - self.y_mean) / self.y_std
+        squared_differences = (X[:, None, :] - X[None, :, :]) ** 2
+
+        bounds = [self.LENGTH_SCALE_BOUNDS] * d
+        bounds += [self.SIGNAL_BOUNDS, self.NOISE_BOUNDS]
+        rng = np.random.default_rng(self.seed)
+        initial_values = [np.r_[np.zeros(d), 0.0, np.log(0.1)]] + [
+            np.array([rng.uniform(low, high) for low, high in bounds])
+            for _ in range(self.restarts)
+        ]
+
+        best = None
+        for theta in initial_values:
+            result = minimize(
+                self._negative_log_marginal_likelihood,
+                theta,
+                args=(X, z, squared_differences),
+                jac=True,
+                method="L-BFGS-B",
+                bounds=bounds,
+            )
+            if np.isfinite(result.fun) and (best is None or result.fun < best.fun):
+                best = result
+        if best is None:
+            raise ValueError("Gaussian process hyperparameter optimisation failed")
+
+        self.length_scales = np.exp(best.x[:d])
+        self.signal = np.exp(best.x[d])
+        self.noise = np.exp(best.x[d + 1])
+        self.log_marginal_likelihood = -best.fun
+
+        self.X = X
+        K = self._kernel(X, X, self.length_scales, self.signal)
+        K += (self.noise**2 + 1e-10) * np.eye(n)
+        self._factor = cho_factor(K, lower=True)
+        self._alpha = cho_solve(self._factor, z)
+        return self
+
+    def predict(self, X, return_std=False):
+        """Predict the mean, and optionally the predictive standard deviation including
+        observation noise, at inputs `X`"""
+        X = np.asarray(X, dtype=float)
+        K_star = self._kernel(X, self.X, self.length_scales, self.signal)
+        mean = self.y_mean + self.y_std * (K_star @ self._alpha)
+        if not return_std:
+            return mean
+        v = cho_solve(self._factor, K_star.T)
+        variance = (
+            np.maximum(self.signal**2 - np.sum(K_star * v.T, axis=1), 0.0)
+            + self.noise**2
+        )
+        return mean, self.y_std * np.sqrt(variance)
+
+
+class KPISurrogate:
+    """Surrogate model of sweep KPIs, with one `GaussianProcess` per target
+
+    Use `KPISurrogate.fit(...)` to construct a fitted surrogate from tidy sweep results.
+    """
+
+    def __init__(self, features, targets, restarts=3, seed=1):
+        self.features = list(features)
+        self.targets = list(targets)
+        self.restarts = restarts
+        self.seed = seed
+
+    @classmethod
+    def fit(
+        cls,
+        results: pd.DataFrame,
+        features=FEATURES,
+        targets=None,
+        quantiles=QUANTILES,
+        restarts=3,
+        seed=1,
+    ):
+        """Fit a surrogate to tidy sweep results, with one row per subset and run, see
+        `experiments.sweep.tidy_results(...)`"""
+        summary = summarise_sweep(results, features, quantiles)
+        return cls.fit_summary(summary, features, targets, restarts, seed)
+
+    @classmethod
+    def fit_summary(
+        cls, summary: pd.DataFrame, features=FEATURES, targets=None, restarts=3, seed=1
+    ):
+        """Fit a surrogate to a sweep summary, with one row per sweep point, see
+        `summarise_sweep(...)`"""
+        surrogate = cls(features, targets or default_targets(summary), restarts, seed)
+        surrogate._fit_encoding(summary)
+        X = surrogate.encode(summary)
+        surrogate.models = {}
+        for target in surrogate.targets:
+            y = summary[target].to_numpy(dtype=float)
+            known = np.isfinite(y)
+            # Targets without enough data, e.g. the exercise rate when no options were
+            # bought, are predicted as NaN
+            surrogate.models[target] = None
+            if known.sum() > 1:
+                model = GaussianProcess(restarts, seed)
+                surrogate.models[target] = model.fit(X[known], y[known])
+        return surrogate
+
+    def _fit_encoding(self, summary):
+        """Record the range of each numeric feature, and the categories of each
+        categorical feature"""
+        self.ranges = {}
+        self.categories = {}
+        for feature in self.features:
+            column = summary[feature]
+            if pd.api.types.is_numeric_dtype(column):
+                low, high = float(column.min()), float(column.max())
+                self.ranges[feature] = (low, high - low if high > low else 1.0)
+            else:
+                self.categories[feature] = sorted(column.unique())
+
+    def encode(self, points: pd.DataFrame) -> np.ndarray:
+        """Encode parameter points as surrogate inputs: numeric features scaled to the
+        unit interval, categorical features one-hot encoded"""
+        columns = []
+        for feature in self.features:
+            if feature in self.ranges:
+                low, width = self.ranges[feature]
+                columns.append((points[feature].to_numpy(dtype=float) - low) / width)
+            else:
+                unknown = set(points[feature]) - set(self.categories[feature])
+                if unknown:
+                    raise ValueError(
+                        f"Unknown categories {sorted(unknown)} of feature {feature}"
+                    )
+                columns.extend(
+                    (points[feature] == category).to_numpy(dtype=float)
+                    for category in self.categories[feature]
+                )
+        return np.column_stack(columns)
+
+    def predict(self, points: pd.DataFrame, return_std=False) -> pd.DataFrame:
+        """Predict each target at parameter `points`, with an optional `{target}_std`
+        predictive standard deviation"""
+        X = self.encode(points)
+        predictions = {}
+        for target, model in self.models.items():
+            if model is None:
+                predictions[target] = np.full(len(X), np.nan)
+                if return_std:
+                    predictions[f"{target}_std"] = np.full(len(X), np.nan)
+            elif return_std:
+                mean, std = model.predict(X, return_std=True)
+                predictions[target], predictions[f"{target}_std"] = mean, std
+            else:
+                predictions[target] = model.predict(X)
+        return pd.DataFrame(predictions, index=points.index)
+
+
+def cross_validate(
+    summary: pd.DataFrame, features=FEATURES, targets=None, folds=5, restarts=3, seed=1
+) -> pd.DataFrame:
+    """Return out-of-fold predictions of each target, using `folds`-fold
+    cross-validation over the sweep points"""
+    targets = targets or default_targets(summary)
+    fold = np.random.default_rng(seed).permutation(len(summary)) % folds
+
+    predictions = []
+    for k in range(folds):
+        test = fold == k
+        surrogate = KPISurrogate.fit_summary(
+            summary[~test], features, targets, restarts, seed
+        )
+        predictions.append(surrogate.predict(summary[test], return_std=True))
+    return pd.concat(predictions).loc[summary.index]
+
+
+def validation_metrics(
+    summary: pd.DataFrame, predictions: pd.DataFrame, targets
+) -> pd.DataFrame:
+    """Return cross-validation RMSE, MAE, R-squared and 95% predictive interval coverage
+    per target
+
+    For mean targets, `mean_mc_se` is the mean Monte Carlo standard error of the target
+    across runs: a surrogate RMSE of the same order is at the level of the Monte Carlo
+    noise of the training data.
+    """
+    rows = []
+    for target in targets:
+        actual = summary[target].to_numpy(dtype=float)
+        known = np.isfinite(actual) & np.isfinite(predictions[target].to_numpy())
+        actual = actual[known]
+        predicted = predictions[target].to_numpy()[known]
+        std = predictions[f"{target}_std"].to_numpy()[known]
+        error = predicted - actual
+        total = ((actual - actual.mean()) ** 2).sum()
+        se = summary.get(f"{target}_se")
+        rows.append(
+            {
+                "target": target,
+                "points": int(known.sum()),
+                "rmse": np.sqrt((error**2).mean()),
+                "mae": np.abs(error).mean(),
+                "r2": 1 - (error**2).sum() / total if total > 0 else np.nan,
+                "coverage_95": np.mean(np.abs(error) <= 1.96 * std),
+                "mean_mc_se": se.mean() if se is not None else np.nan,
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def validation_report(
+    results: pd.DataFrame,
+    output_dir="surrogate",
+    features=FEATURES,
+    targets=None,
+    quantiles=QUANTILES,
+    folds=5,
+    restarts=3,
+    seed=1,
+) -> pd.DataFrame:
+    """Cross-validate a surrogate of tidy sweep results, log the metrics per target, and
+    write `surrogate_validation.csv`, `surrogate_validation.json` and
+    `surrogate_predictions.csv` to `output_dir`
+    """
+    summary = summarise_sweep(results, features, quantiles)
+    targets = targets or default_targets(summary)
+    folds = min(folds, len(summary))
+    predictions = cross_validate(summary, features, targets, folds, restarts, seed)
+    metrics = validation_metrics(summary, predictions, targets)
+
+    os.makedirs(output_dir, exist_ok=True)
+    metrics.to_csv(os.path.join(output_dir, "surrogate_validation.csv"), index=False)
+    with open(os.path.join(output_dir, "surrogate_validation.json"), "w") as f:
+        report = {
+            "points": len(summary),
+            "folds": folds,
+            "metrics": metrics.to_dict(orient="records"),
+        }
+        json.dump(report, f, indent=2, default=float)
+    predicted = summary.join(predictions.add_prefix("predicted:"))
+    predicted.to_csv(os.path.join(output_dir, "surrogate_predictions.csv"), index=False)
+
+    logging.info(
+        f"Surrogate {folds}-fold cross-validation over {len(summary)} sweep points:\n"
+        f"{metrics.to_string(index=False)}"
+    )
+    return metrics
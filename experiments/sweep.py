@@ -0,0 +1,206 @@
+"""
+Scenario, option type, strike and maturity sweep engine
+
+Runs a single radCAD Simulation over the cartesian product of market scenarios (mu,
+sigma), option types, strikes and maturities, generating the set of price paths for each
+market scenario once, and sharing it across every subset that uses the scenario, and
+returns a single tidy results table with one row per subset and Monte Carlo run.
+
+Usage:
+```python
+from experiments.sweep import run_sweep
+
+df = run_sweep(
+    scenarios={
+        "Bull": {"mu": 0.1, "sigma": 0.25},
+        "Bear": {"mu": -0.15, "sigma": 0.25},
+    },
+    option_types=["call", "put", "straddle"],
+    strikes=[1_800, 2_000, 2_200],
+    maturities=[365],
+)
+pnl = df.groupby(["scenario", "option_type", "strike_price"])
+pnl[["buyer_pnl_mean", "seller_pnl_mean"]].mean()
+```
+"""
+
+import copy
+import itertools
+import logging
+
+import numpy as np
+import pandas as pd
+
+import experiments.default_experiment as default_experiment
+import experiments.simulation_configuration as simulation_configuration
+from experiments.run import run
+from model.stochastic_processes import ProcessSpec, SampledProcess
+from model.system_parameters import initial_price, market_conditions
+
+
+SUBSET_PARAMETERS = [
+    "scenario",
+    "mu",
+    "sigma",
+    "option_type",
+    "strike_price",
+    "option_maturity",
+]
+"""Columns identifying the parameters of each subset in the tidy results table"""
+
+
+def generate_price_processes(
+    scenarios,
+    runs=simulation_configuration.MONTE_CARLO_RUNS,
+    timesteps=simulation_configuration.TIMESTEPS,
+    dt=simulation_configuration.DELTA_TIME,
+    process="manual_gbm_process",
+    initial_price=initial_price,
+):
+    """Generate one shared `SampledProcess` of price paths per market scenario, stored
+    in shared memory, so that worker processes attach to a single copy of the price
+    paths
+
+    Args:
+        scenarios (dict): Mapping of scenario name to a dictionary with the `mu` and
+            `sigma` process parameters
+
+    Returns:
+        dict: Mapping of scenario name to `SampledProcess`
+    """
+    return {
+        name: SampledProcess(
+            spec=ProcessSpec(
+                process,
+                timesteps=timesteps,
+                dt=dt,
+                runs=runs,
+                parameters={
+                    "mu": conditions["mu"],
+                    "sigma": conditions["sigma"],
+                    "initial_price": initial_price,
+                },
+            ),
+            storage="shared_memory",
+        )
+        for name, conditions in scenarios.items()
+    }
+
+
+def create_sweep_simulation(
+    scenarios=market_conditions,
+    option_types=("call", "put", "straddle"),
+    strikes=(initial_price,),
+    maturities=(365,),
+    runs=simulation_configuration.MONTE_CARLO_RUNS,
+    timesteps=simulation_configuration.TIMESTEPS,
+    simulation=None,
+):
+    """Create a Simulation over the cartesian product of the sweep grids
+
+    Returns:
+        tuple: The radCAD Simulation, and a list with the parameters of each subset (see
+            `SUBSET_PARAMETERS`)
+    """
+    simulation = simulation or default_experiment.experiment.simulations[0]
+    simulation = copy.deepcopy(simulation)
+    simulation.runs = runs
+    simulation.timesteps = timesteps
+
+    processes = generate_price_processes(
+        scenarios,
+        runs=runs,
+        timesteps=timesteps,
+        dt=simulation.model.params["dt"][0],
+    )
+
+    subsets = [
+        {
+            "scenario": scenario,
+            "mu": scenarios[scenario]["mu"],
+            "sigma": scenarios[scenario]["sigma"],
+            "option_type": option_type,
+            "strike_price": strike,
+            "option_maturity": maturity,
+        }
+        for scenario, option_type, strike, maturity in itertools.product(
+            scenarios, option_types, strikes, maturities
+        )
+    ]
+
+    simulation.model.params.update(
+        {
+            "volatile_asset_price_process": [
+                processes[subset["scenario"]] for subset in subsets
+            ],
+            "option_type": [subset["option_type"] for subset in subsets],
+            "strike_price": [subset["strike_price"] for subset in subsets],
+            "option_maturity": [subset["option_maturity"] for subset in subsets],
+        }
+    )
+
+    return simulation, subsets
+
+
+def tidy_results(df: pd.DataFrame, subsets) -> pd.DataFrame:
+    """Summarise the final state of each subset and run as one row of a tidy results
+    table
+
+    Agent PnL is calculated as in `experiments.notebook_helpers.get_KPIs_for_run(...)`,
+    and summarised across all agents of a run.
+    """
+    final = df.groupby(["subset", "run"]).tail(1)
+    agent_columns = [column for column in df.columns if column.startswith("agent_")]
+
+    rows = []
+    for _, state in final.iterrows():
+        agents = [state[column] for column in agent_columns]
+        bought = [agent for agent in agents if agent.bought_from_Id is not None]
+        buyer_pnl = np.array(
+            [agent.discounted_payoff_received - agent.premium_paid for agent in agents]
+        )
+        seller_pnl = np.array(
+            [agent.premium_received - agent.discounted_payoff_paid for agent in agents]
+        )
+        rows.append(
+            {
+                **subsets[state["subset"]],
+                "subset": state["subset"],
+                "run": state["run"],
+                "final_va_price": state["volatile_asset_price"],
+                "discounted_payoff": state["discounted_payoff"],
+                "options_bought": len(bought),
+                "options_exercised": sum(agent.exercised for agent in bought),
+                "buyer_pnl_mean": buyer_pnl.mean(),
+                "buyer_pnl_sum": buyer_pnl.sum(),
+                "seller_pnl_mean": seller_pnl.mean(),
+                "seller_pnl_sum": seller_pnl.sum(),
+            }
+        )
+
+    return pd.DataFrame(rows)
+
+
+def run_sweep(
+    scenarios=market_conditions,
+    option_types=("call", "put", "straddle"),
+    strikes=(initial_price,),
+    maturities=(365,),
+    runs=simulation_configuration.MONTE_CARLO_RUNS,
+    timesteps=simulation_configuration.TIMESTEPS,
+    simulation=None,
+) -> pd.DataFrame:
+    """Run the sweep and return the tidy results table, see
+    `create_sweep_simulation(...)` and `tidy_results(...)`"""
+    simulation, subsets = create_sweep_simulation(
+        scenarios=scenarios,
+        option_types=option_types,
+        strikes=strikes,
+        maturities=maturities,
+        runs=runs,
+        timesteps=timesteps,
+        simulation=simulation,
+    )
+    logging.info(f"Running sweep of {len(subsets)} subsets x {runs} runs")
+    df, _exceptions = run(simulation)
+    return tidy_results(df, subsets)
@@ -4,10 +4,6 @@ import inspect
 import numpy as np
 import radcad
 
-from IPython.display import Code
-from pygments.formatters import HtmlFormatter
-from IPython.core.display import HTML
-
 
 def rng_generator(master_seed=1):
     """Generate a sequence of Numpy RNG seeds
@@ -52,6 +48,11 @@ def get_simulation_hash(sim: radcad.wrappers.Simulation):
 def display_code(code):
     """Inspect Python modules, functions and return the syntax highlighted code
     """
+    # Notebook display dependencies are imported on first use, rather than by headless simulation runs
+    from IPython.display import Code, display
+    from pygments.formatters import HtmlFormatter
+    from IPython.core.display import HTML
+
     formatter = HtmlFormatter()
     display(HTML(f'<style>{formatter.get_style_defs(".highlight")}</style>'))
 
@@ -0,0 +1,107 @@
+"""# Historical Prices
+Loading of historical price series from local CSV or Parquet files, used by the
+historical replay and block bootstrap price processes of `model.stochastic_processes`,
+without network access.
+
+A loaded price series is cached as a `.npy` file, keyed by the source file, its size and
+modification time, and the columns read, and memory-mapped on subsequent loads, so that
+runs and worker processes share a single copy of the series without parsing the source
+file again.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+
+CACHE_DIRECTORY = ".price_cache"
+"""Cache directory created next to the source file by default, see
+`load_price_series(...)`"""
+
+PRICE_COLUMNS = ("close", "Close", "price", "Price", "adj_close", "Adj Close")
+"""Column names tried in order when no price column is given"""
+
+
+def read_price_series(path, column=None, date_column=None) -> np.ndarray:
+    """Read a price series from a `.csv` or `.parquet` file
+
+    Args:
+        path (str): Path of the file, with one price per row, e.g. daily closing prices
+        column (str): Price column, by default the first of `PRICE_COLUMNS` in the file
+        date_column (str): Column the rows are sorted by, e.g. a date, or `None` to keep
+            the order of the file
+    Returns:
+        np.ndarray: The prices, with missing and non-numeric values dropped
+    Raises:
+        ValueError: If the file format is unsupported, or the prices aren't a series of
+            at least 2 positive prices
+    """
+    import pandas as pd
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        df = pd.read_csv(path)
+    elif extension in (".parquet", ".pq"):
+        # Requires one of the optional pyarrow or fastparquet Parquet engines
+        df = pd.read_parquet(path)
+    else:
+        raise ValueError(
+            f"Unsupported price series format {extension}, one of .csv or .parquet"
+        )
+
+    if column is None:
+        column = next((name for name in PRICE_COLUMNS if name in df.columns), None)
+        if column is None:
+            raise ValueError(
+                f"No price column given, and none of {list(PRICE_COLUMNS)} in {path}"
+            )
+    if date_column is not None:
+        df = df.sort_values(date_column, kind="stable")
+
+    prices = pd.to_numeric(df[column], errors="coerce").dropna().to_numpy(dtype=float)
+    if len(prices) < 2 or not (prices > 0).all() or not np.isfinite(prices).all():
+        raise ValueError(
+            f"Column {column} of {path} isn't a series of at least 2 positive prices"
+        )
+    return prices
+
+
+def _cache_path(path, column, date_column, cache_dir):
+    stat = os.stat(path)
+    key = (
+        f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}:"
+        f"{column}:{date_column}"
+    )
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(
+        cache_dir, f"{name}-{hashlib.sha1(key.encode()).hexdigest()[:16]}.npy"
+    )
+
+
+def load_price_series(
+    path, column=None, date_column=None, cache_dir=None
+) -> np.ndarray:
+    """Load a price series using `read_price_series(...)` through a memory-mapped cache
+
+    The series is read from the source file on first use, or when the file changes, and
+    written to `cache_dir`, by default a `CACHE_DIRECTORY` directory next to the source
+    file.
+
+    Returns:
+        np.memmap: The read-only, memory-mapped prices
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(
+            os.path.dirname(os.path.abspath(path)), CACHE_DIRECTORY
+        )
+    cache_path = _cache_path(path, column, date_column, cache_dir)
+    if not os.path.exists(cache_path):
+        prices = read_price_series(path, column, date_column)
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written to a temporary file and renamed, so that concurrent loads never read a
+        # partially written cache
+        temporary_path = f"{cache_path[:-len('.npy')]}-{os.getpid()}.npy"
+        np.save(temporary_path, prices)
+        os.replace(temporary_path, cache_path)
+    return np.load(cache_path, mmap_mode="r")
@@ -4,11 +4,14 @@
 
 import radcad as radcad
 import logging
-from dataclasses import make_dataclass
+import numpy as np
+from dataclasses import field, make_dataclass
 from model.state_variables import StateVariables
-from model.system_parameters import agent_keys
+from model.ledger import PositionLedger
+from model.loans import SUMMARY_STATE_VARIABLES, LoanBook, sample_loan_terms
 from model.types import (
     Agent,
+    validate_agents,
 )
 
 
@@ -18,6 +21,11 @@ def setup_initial_state(context: radcad.Context):
     that sets up the Initial State of the model from the relevant System Parameters before each simulation execution.
 
     This allows one to sweep the Initial State using System Parameters.
+
+    Also adds the random number generator of the run to its System Parameters, as `rng`,
+    seeded with the `seed` System Parameter and the simulation, subset and run indices,
+    which radCAD copies with the System Parameters of the run into the process executing
+    it, see `model.utils.run_rng(...)`.
     """
     logging.info("Setting up initial state")
 
@@ -25,12 +33,39 @@ def setup_initial_state(context: radcad.Context):
     run = context.run
     timestep = 0
 
+    # A legacy `RandomState`, with the same API as the global Numpy RNG used by policies
+    # executed outside of an experiment run
+    params["rng"] = np.random.RandomState(
+        [params["seed"], context.simulation, context.subset, run]
+    )
+
+    # Validate agent types at the experiment boundary, rather than on every construction
+    validate_agents(params["agents"].values())
+
     StateVariablesWithAgents = make_dataclass(
         "StateVariablesWithAgents",
         fields=(
-            [(key, Agent, params["agents"][key]) for key in agent_keys]
+            # `Agent` is unhashable, which dataclasses rejects as a mutable default on Python 3.11+
+            [(key, Agent, field(default_factory=lambda agent=agent: agent)) for key, agent in params["agents"].items()]
         ),
         bases=(StateVariables,),
     )
     context.initial_state.update(StateVariablesWithAgents().__dict__)
+    if "positions" in context.initial_state:
+        context.initial_state["positions"] = PositionLedger(n_agents=len(params["agents"]))
+
+    if "loans" in context.initial_state:
+        loans = LoanBook(n_agents=len(params["agents"]))
+        if params["loan_book"]:
+            # An initial population of active loans at different stages of their duration, drawn
+            # from the RNG of the run, so that resumed and sharded runs start from the same loans
+            rng = params["rng"]
+            terms = sample_loan_terms(
+                params["initial_loans"], loans.n_agents, context.initial_state["nft_floor_price"], rng
+            )
+            loans.originate(**terms, timestep=-rng.randint(0, terms["durations"]))
+            loans.accrue(context.initial_state["nft_floor_price"], timestep)
+        summary = loans.summary(context.initial_state["nft_floor_price"])
+        context.initial_state.update({key: summary[key] for key in SUMMARY_STATE_VARIABLES})
+        context.initial_state["loans"] = loans
     initial_state = context.initial_state
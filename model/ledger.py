@@ -0,0 +1,591 @@
+"""# Position Ledger
+A columnar ledger of option positions, supporting many concurrent and sequential
+positions per agent.
+
+Each position is a row across a set of Numpy column arrays, indexed by position ID, with
+the buyer and seller agents stored as integer agent indices. All operations are
+vectorized over positions, and per-agent aggregates use `np.bincount(...)`, so the cost
+of a timestep does not depend on a Python loop over agents or positions.
+
+The ledger follows the option lifecycle of the protocol (see the Option Architecture
+diagrams in `diagrams/`):
+1. Create Order: a seller lists an order, locking collateral, which can be filled until
+   the order expiry (`LISTED`)
+2. Fill Order: a buyer pays the premium, opening an option that expires `tenor`
+   timesteps later (`OPEN`)
+3. Cancel: the seller cancels an unfilled order, and the collateral is returned
+   (`CANCELLED`)
+4. Exercise: the buyer exercises an open option until its expiry, paid from the seller's
+   collateral, up to the collateral (`EXERCISED`)
+5. Expiry settlement: unfilled orders past their order expiry, and unexercised options
+   past their expiry, expire (`EXPIRED`)
+6. Withdraw: the seller withdraws the remaining collateral of an expired or exercised
+   option
+
+Order and option expiries are kept in a time-ordered heap, so that settling the expiries
+of a timestep only processes the orders and options due then, and the IDs of listed
+orders, open positions and positions with collateral to withdraw are kept in sorted
+index arrays, updated as positions change status, so that the queries of a timestep
+don't scan the whole ledger.
+
+Closed positions can be compacted out of the ledger into running totals, see
+`PositionLedger.compact()`, so that the size of the ledger, which radCAD copies into
+every row of the results, only grows with the number of live positions.
+"""
+
+import heapq
+
+import numpy as np
+
+from model.pricing import black_scholes_price
+
+
+OPTION_TYPE_CODES = {"call": 0, "put": 1, "straddle": 2}
+"""Integer codes of option types in the `option_type` column"""
+
+# Position status codes of the `status` column
+OPEN = 0
+EXERCISED = 1
+EXPIRED = 2
+LISTED = 3
+CANCELLED = 4
+
+NO_BUYER = -1
+"""Buyer agent index of an unfilled order"""
+
+COMPACTED_SUMMARY = (
+    "positions_bought",
+    "positions_sold",
+    "premium_paid",
+    "premium_received",
+    "collateral_withdrawn",
+    "discounted_payoff_received",
+    "discounted_payoff_paid",
+)
+"""Per-agent totals of `PositionLedger.agent_summary()` that closed positions contribute
+to, kept for the positions removed by `PositionLedger.compact()`"""
+
+
+def option_payoff(option_type, S, K):
+    """Vectorized option payoff at underlying price `S` for option type codes
+    `option_type` and strike prices `K`, equivalent to `model.types.Option.payoff()`"""
+    return np.select(
+        [
+            option_type == OPTION_TYPE_CODES["call"],
+            option_type == OPTION_TYPE_CODES["put"],
+            option_type == OPTION_TYPE_CODES["straddle"],
+        ],
+        [np.maximum(S - K, 0.0), np.maximum(K - S, 0.0), np.abs(S - K)],
+        default=0.0,
+    )
+
+
+class PositionLedger:
+    """## Position Ledger
+    A columnar, array-backed ledger of option positions between agents.
+
+    Columns, indexed by position ID:
+    * `buyer`, `seller`: Agent indices of the option buyer (`NO_BUYER` for an unfilled
+      order) and seller
+    * `option_type`: Option type code, see `OPTION_TYPE_CODES`
+    * `strike`: Strike price
+    * `created_at`, `order_expiry`: Timestep the order was created, and the last
+      timestep it can be filled
+    * `tenor`: Number of timesteps from filling the order to the expiry of the option
+    * `opened_at`, `expiry`: Timestep the order was filled, and the last timestep the
+      option can be exercised, or -1 while listed
+    * `premium`: Premium paid by the buyer to the seller
+    * `collateral`: Collateral locked by the seller, from which the payoff is paid
+    * `status`: `LISTED`, `OPEN`, `EXERCISED`, `EXPIRED` or `CANCELLED`
+    * `closed_at`: Timestep the position was exercised, expired or cancelled, or -1
+      while listed or open
+    * `payoff`, `discounted_payoff`: Payoff paid by the seller to the buyer on exercise,
+      at most the collateral, and its value discounted from expiry
+    * `value`: Latest mark-to-market value of open positions, see `mark_to_market(...)`
+    * `withdrawn`, `withdrawn_at`: Collateral returned to the seller, and the timestep
+      it was returned, or -1
+
+    Storage grows geometrically, and only the used part of each column is pickled, which
+    is how radCAD copies State Variables between substeps. Cancelled, expired and
+    exercised positions without collateral left to withdraw are removed by `compact()`,
+    keeping their counts and per-agent totals in `compacted`.
+
+    The IDs of listed orders, open positions and positions with collateral to withdraw
+    are indexed, see `listed_orders(...)`, `open_positions(...)` and
+    `withdrawable_positions()`.
+    """
+
+    columns = {
+        "buyer": np.int32,
+        "seller": np.int32,
+        "option_type": np.int8,
+        "strike": np.float64,
+        "created_at": np.int32,
+        "order_expiry": np.int32,
+        "tenor": np.int32,
+        "opened_at": np.int32,
+        "expiry": np.int32,
+        "premium": np.float64,
+        "collateral": np.float64,
+        "status": np.int8,
+        "closed_at": np.int32,
+        "payoff": np.float64,
+        "discounted_payoff": np.float64,
+        "value": np.float64,
+        "withdrawn": np.float64,
+        "withdrawn_at": np.int32,
+    }
+
+    def __init__(self, n_agents: int, capacity: int = 1024):
+        self.n_agents = n_agents
+        self.size = 0
+        self._data = {
+            name: np.zeros(capacity, dtype=dtype)
+            for name, dtype in self.columns.items()
+        }
+        # Heap of (timestep, position ID) of order and option expiries, see
+        # `expire(...)`
+        self._expiries = []
+        # Sorted IDs of listed orders, open positions, and expired or exercised
+        # positions with collateral to withdraw
+        self._listed = np.empty(0, dtype=np.intp)
+        self._open = np.empty(0, dtype=np.intp)
+        self._withdrawable = np.empty(0, dtype=np.intp)
+        # Totals of the closed positions removed from the ledger, see `compact()`
+        self.compacted = {
+            "positions_cancelled": 0,
+            "positions_expired": 0,
+            "positions_exercised": 0,
+            **{key: np.zeros(n_agents) for key in COMPACTED_SUMMARY},
+        }
+
+    def __len__(self):
+        return self.size
+
+    def __getattr__(self, name):
+        # Column views of the positions in the ledger, e.g. `ledger.strike`
+        if name in PositionLedger.columns and "_data" in self.__dict__:
+            return self.__dict__["_data"][name][: self.size]
+        raise AttributeError(name)
+
+    def __getstate__(self):
+        return {
+            "n_agents": self.n_agents,
+            "size": self.size,
+            "_data": {
+                name: values[: self.size].copy() for name, values in self._data.items()
+            },
+            "_expiries": list(self._expiries),
+            "_listed": self._listed,
+            "_open": self._open,
+            "_withdrawable": self._withdrawable,
+            "compacted": self.compacted,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def _reserve(self, size):
+        capacity = len(self._data["buyer"])
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 16)
+        for name, values in self._data.items():
+            grown = np.zeros(capacity, dtype=values.dtype)
+            grown[: self.size] = values[: self.size]
+            self._data[name] = grown
+
+    def _append(self, n, **columns) -> np.ndarray:
+        start = self.size
+        self._reserve(start + n)
+        new = slice(start, start + n)
+        for name, values in columns.items():
+            self._data[name][new] = values
+        self.size += n
+        return np.arange(start, start + n)
+
+    def _index(self, name, added=(), removed=()):
+        ids = getattr(self, name)
+        if len(removed):
+            ids = np.setdiff1d(ids, removed, assume_unique=True)
+        if len(added):
+            ids = np.union1d(ids, added)
+        setattr(self, name, ids.astype(np.intp, copy=False))
+
+    def _schedule(self, timesteps, ids):
+        for timestep, position in zip(
+            np.broadcast_to(timesteps, ids.shape).tolist(), ids.tolist()
+        ):
+            heapq.heappush(self._expiries, (timestep, position))
+
+    def create_orders(
+        self,
+        sellers,
+        option_type,
+        strikes,
+        tenors,
+        premiums,
+        collateral,
+        order_expiries,
+        timestep: int,
+    ) -> np.ndarray:
+        """Create a batch of orders, with arguments broadcast against the sellers, and
+        return their position IDs
+
+        Each order locks the seller's `collateral`, and can be filled until its order
+        expiry (inclusive).
+        """
+        sellers = np.asarray(sellers, dtype=np.int32)
+        if isinstance(option_type, str):
+            option_type = OPTION_TYPE_CODES[option_type]
+        ids = self._append(
+            len(sellers),
+            buyer=NO_BUYER,
+            seller=sellers,
+            option_type=option_type,
+            strike=strikes,
+            created_at=timestep,
+            order_expiry=order_expiries,
+            tenor=tenors,
+            opened_at=-1,
+            expiry=-1,
+            premium=premiums,
+            collateral=collateral,
+            status=LISTED,
+            closed_at=-1,
+            payoff=0.0,
+            discounted_payoff=0.0,
+            value=0.0,
+            withdrawn=0.0,
+            withdrawn_at=-1,
+        )
+        self._schedule(self.order_expiry[ids], ids)
+        self._index("_listed", added=ids)
+        return ids
+
+    def fill(self, ids, buyers, timestep: int) -> np.ndarray:
+        """Fill listed, unexpired orders `ids` by agent indices `buyers`, opening
+        options that expire `tenor` timesteps later, and return the IDs filled,
+        excluding orders of the buyer itself"""
+        ids = np.asarray(ids, dtype=np.intp)
+        buyers = np.broadcast_to(np.asarray(buyers, dtype=np.int32), ids.shape)
+        valid = (
+            (self.status[ids] == LISTED)
+            & (self.order_expiry[ids] >= timestep)
+            & (self.seller[ids] != buyers)
+        )
+        ids, buyers = ids[valid], buyers[valid]
+
+        expiries = timestep + self.tenor[ids]
+        self._data["buyer"][ids] = buyers
+        self._data["opened_at"][ids] = timestep
+        self._data["expiry"][ids] = expiries
+        self._data["status"][ids] = OPEN
+        self._data["value"][ids] = self.premium[ids]
+        self._schedule(expiries, ids)
+        self._index("_listed", removed=ids)
+        self._index("_open", added=ids)
+        return ids
+
+    def open(
+        self,
+        buyers,
+        sellers,
+        option_type,
+        strikes,
+        expiries,
+        premiums,
+        timestep: int,
+        collateral=0.0,
+    ) -> np.ndarray:
+        """Open a batch of positions, i.e. create and fill orders at once, with
+        arguments broadcast against the buyers, and return their position IDs
+
+        The payoff of a position is paid from its `collateral`, so a position opened
+        without collateral pays nothing on exercise.
+        """
+        buyers = np.asarray(buyers, dtype=np.int32)
+        expiries = np.broadcast_to(expiries, buyers.shape)
+        ids = self.create_orders(
+            sellers,
+            option_type,
+            strikes,
+            expiries - timestep,
+            premiums,
+            collateral,
+            timestep,
+            timestep,
+        )
+        return self.fill(ids, buyers, timestep)
+
+    def cancel(self, ids, timestep: int) -> np.ndarray:
+        """Cancel the listed orders among `ids`, returning their collateral to the
+        sellers, and return the IDs cancelled"""
+        ids = np.asarray(ids, dtype=np.intp)
+        ids = ids[self.status[ids] == LISTED]
+        self._data["status"][ids] = CANCELLED
+        self._data["closed_at"][ids] = timestep
+        self._data["withdrawn"][ids] = self.collateral[ids]
+        self._data["withdrawn_at"][ids] = timestep
+        self._index("_listed", removed=ids)
+        return ids
+
+    def listed_orders(self, timestep: int = None) -> np.ndarray:
+        """Return the IDs of listed orders, optionally only those that can still be
+        filled at `timestep`"""
+        ids = self._listed
+        if timestep is not None:
+            ids = ids[self.order_expiry[ids] >= timestep]
+        return ids
+
+    def open_positions(self, timestep: int = None) -> np.ndarray:
+        """Return the IDs of open positions, optionally only those that can still be
+        exercised at `timestep`"""
+        ids = self._open
+        if timestep is not None:
+            ids = ids[self.expiry[ids] >= timestep]
+        return ids
+
+    def exercise_value(self, ids, underlying_price) -> np.ndarray:
+        """Return the payoff of positions `ids` if exercised at `underlying_price`,
+        capped at the collateral of each position, from which the payoff is paid"""
+        return np.minimum(
+            option_payoff(self.option_type[ids], underlying_price, self.strike[ids]),
+            self.collateral[ids],
+        )
+
+    def exercise(
+        self, ids, underlying_price, timestep: int, risk_free_rate
+    ) -> np.ndarray:
+        """Exercise the open, unexpired positions among `ids` at `underlying_price`, and
+        return the IDs exercised
+
+        The payoff is discounted from expiry as in `model.types.Agent.exercise(...)`.
+        """
+        ids = np.asarray(ids, dtype=np.intp)
+        ids = ids[(self.status[ids] == OPEN) & (self.expiry[ids] >= timestep)]
+        payoff = self.exercise_value(ids, underlying_price)
+
+        self._data["payoff"][ids] = payoff
+        self._data["discounted_payoff"][ids] = payoff * np.exp(
+            -risk_free_rate * (self.expiry[ids] - timestep) / 365
+        )
+        self._data["status"][ids] = EXERCISED
+        self._data["closed_at"][ids] = timestep
+        self._data["value"][ids] = 0.0
+        self._index("_open", removed=ids)
+        self._index("_withdrawable", added=ids[self.collateral[ids] > payoff])
+        return ids
+
+    def expire(self, timestep: int) -> np.ndarray:
+        """Expire all listed orders past their order expiry, and open positions past
+        their expiry, at `timestep`, and return the IDs expired
+
+        Only the expiries due before `timestep` are popped from the expiry heap,
+        skipping those of orders and positions that have since been filled, cancelled or
+        exercised.
+        """
+        due = []
+        expiries = self._expiries
+        while expiries and expiries[0][0] < timestep:
+            due.append(heapq.heappop(expiries)[1])
+        # A filled order has both an order and an option expiry in the heap
+        ids = np.unique(np.array(due, dtype=np.intp))
+        status = self.status[ids]
+        ids = ids[
+            ((status == LISTED) & (self.order_expiry[ids] < timestep))
+            | ((status == OPEN) & (self.expiry[ids] < timestep))
+        ]
+        listed = self.status[ids] == LISTED
+        self._data["status"][ids] = EXPIRED
+        self._data["closed_at"][ids] = timestep
+        self._data["value"][ids] = 0.0
+        self._index("_listed", removed=ids[listed])
+        self._index("_open", removed=ids[~listed])
+        self._index("_withdrawable", added=ids[self.collateral[ids] > self.payoff[ids]])
+        return ids
+
+    def withdrawable(self, ids=None) -> np.ndarray:
+        """Return the collateral the sellers of positions `ids`, or of all positions,
+        can withdraw: the collateral remaining after the payoff of expired and exercised
+        positions not yet withdrawn, and 0 otherwise"""
+        ids = np.arange(self.size) if ids is None else np.asarray(ids, dtype=np.intp)
+        status = self.status[ids]
+        settled = ((status == EXPIRED) | (status == EXERCISED)) & (
+            self.withdrawn_at[ids] == -1
+        )
+        return np.where(
+            settled, np.maximum(self.collateral[ids] - self.payoff[ids], 0.0), 0.0
+        )
+
+    def withdrawable_positions(self) -> np.ndarray:
+        """Return the IDs of expired and exercised positions with collateral left to
+        withdraw, see `withdrawable(...)`"""
+        return self._withdrawable
+
+    def withdraw(self, ids, timestep: int) -> np.ndarray:
+        """Withdraw the collateral of the expired and exercised positions among `ids`
+        not yet withdrawn, and return the IDs withdrawn"""
+        ids = np.asarray(ids, dtype=np.intp)
+        status = self.status[ids]
+        ids = ids[
+            ((status == EXPIRED) | (status == EXERCISED))
+            & (self.withdrawn_at[ids] == -1)
+        ]
+        self._data["withdrawn"][ids] = self.withdrawable(ids)
+        self._data["withdrawn_at"][ids] = timestep
+        self._index("_withdrawable", removed=ids)
+        return ids
+
+    def compact(self) -> int:
+        """Remove cancelled, expired and exercised positions without collateral left to
+        withdraw from the ledger, adding their counts and per-agent totals to the
+        `compacted` totals, and return the number of positions removed
+
+        Position IDs are row indices, so the IDs of the remaining positions change.
+        """
+        status = self.status
+        closed = (status != LISTED) & (status != OPEN)
+        closed[self._withdrawable] = False
+        n_closed = int(closed.sum())
+        if not n_closed:
+            return 0
+
+        closed_summary = self._agent_totals(closed)
+        compacted = self.compacted
+        self.compacted = {
+            "positions_cancelled": compacted["positions_cancelled"]
+            + int((status[closed] == CANCELLED).sum()),
+            "positions_expired": compacted["positions_expired"]
+            + int((status[closed] == EXPIRED).sum()),
+            "positions_exercised": compacted["positions_exercised"]
+            + int((status[closed] == EXERCISED).sum()),
+            **{key: compacted[key] + closed_summary[key] for key in COMPACTED_SUMMARY},
+        }
+
+        # New IDs of the remaining positions, by old ID
+        remaining = np.flatnonzero(~closed)
+        new_ids = np.cumsum(~closed) - 1
+        for values in self._data.values():
+            values[: len(remaining)] = values[remaining]
+        self.size = len(remaining)
+        self._listed = new_ids[self._listed]
+        self._open = new_ids[self._open]
+        self._withdrawable = new_ids[self._withdrawable]
+        self._expiries = [
+            (timestep, int(new_ids[position]))
+            for timestep, position in self._expiries
+            if not closed[position]
+        ]
+        heapq.heapify(self._expiries)
+        return n_closed
+
+    def mark_to_market(
+        self, underlying_price, volatility, timestep: int, risk_free_rate
+    ) -> np.ndarray:
+        """Update the `value` of all open positions using the Black-Scholes-Merton
+        price, and return the IDs marked
+
+        The time to maturity is `(expiry - timestep + 1) / 365` years, as in
+        `model.types.Option.bsm_price(...)`.
+        """
+        ids = self.open_positions(timestep)
+        tau = (self.expiry[ids] - timestep + 1) / 365
+        codes = self.option_type[ids]
+        values = np.empty(len(ids))
+        for option_type, code in OPTION_TYPE_CODES.items():
+            is_type = codes == code
+            if is_type.any():
+                values[is_type] = black_scholes_price(
+                    option_type,
+                    underlying_price,
+                    self.strike[ids][is_type],
+                    tau[is_type],
+                    risk_free_rate,
+                    volatility,
+                )
+        self._data["value"][ids] = values
+        return ids
+
+    def positions_of(self, agent: int) -> np.ndarray:
+        """Return the IDs of all positions bought or sold by agent index `agent`"""
+        return np.flatnonzero((self.buyer == agent) | (self.seller == agent))
+
+    def per_agent(self, values, side="buyer") -> np.ndarray:
+        """Sum per-position `values` by the buyer or seller agent index, returning an
+        array of length `n_agents`, excluding unfilled orders from buyer sums"""
+        agents = self.buyer if side == "buyer" else self.seller
+        values = np.broadcast_to(values, agents.shape)
+        if side == "buyer":
+            filled = agents != NO_BUYER
+            agents, values = agents[filled], values[filled]
+        return np.bincount(agents, weights=values, minlength=self.n_agents)
+
+    def _agent_totals(self, selected=None) -> dict:
+        """Per-agent totals of `COMPACTED_SUMMARY` over the positions of the boolean
+        mask `selected`, by default all positions"""
+        weights = 1.0 if selected is None else selected.astype(float)
+        is_filled = (self.buyer != NO_BUYER).astype(float)
+        return {
+            "positions_bought": self.per_agent(weights, "buyer"),
+            "positions_sold": self.per_agent(is_filled * weights, "seller"),
+            "premium_paid": self.per_agent(self.premium * weights, "buyer"),
+            "premium_received": self.per_agent(
+                self.premium * is_filled * weights, "seller"
+            ),
+            "collateral_withdrawn": self.per_agent(self.withdrawn * weights, "seller"),
+            "discounted_payoff_received": self.per_agent(
+                self.discounted_payoff * weights, "buyer"
+            ),
+            "discounted_payoff_paid": self.per_agent(
+                self.discounted_payoff * weights, "seller"
+            ),
+        }
+
+    def agent_summary(self) -> dict:
+        """Per-agent position counts, cash flows and PnL, as arrays of length `n_agents`
+        indexed by agent index, including the positions removed by `compact()`
+
+        PnL is calculated as in `experiments.notebook_helpers.get_KPIs_for_run(...)`,
+        using the discounted payoff of exercised positions, plus the mark-to-market
+        value of open positions.
+        """
+        is_open = (self.status == OPEN).astype(float)
+        locked = np.where(
+            self.withdrawn_at == -1, np.maximum(self.collateral - self.payoff, 0.0), 0.0
+        )
+        totals = self._agent_totals()
+        summary = {
+            "positions_bought": totals["positions_bought"]
+            + self.compacted["positions_bought"],
+            "positions_sold": totals["positions_sold"]
+            + self.compacted["positions_sold"],
+            "orders_listed": self.per_agent(
+                (self.status == LISTED).astype(float), "seller"
+            ),
+            "open_long": self.per_agent(is_open, "buyer"),
+            "open_short": self.per_agent(is_open, "seller"),
+            "premium_paid": totals["premium_paid"] + self.compacted["premium_paid"],
+            "premium_received": totals["premium_received"]
+            + self.compacted["premium_received"],
+            "collateral_locked": self.per_agent(locked, "seller"),
+            "collateral_withdrawn": totals["collateral_withdrawn"]
+            + self.compacted["collateral_withdrawn"],
+            "discounted_payoff_received": totals["discounted_payoff_received"]
+            + self.compacted["discounted_payoff_received"],
+            "discounted_payoff_paid": totals["discounted_payoff_paid"]
+            + self.compacted["discounted_payoff_paid"],
+            "open_value_long": self.per_agent(self.value * is_open, "buyer"),
+            "open_value_short": self.per_agent(self.value * is_open, "seller"),
+        }
+        summary["buyer_pnl"] = (
+            summary["discounted_payoff_received"]
+            + summary["open_value_long"]
+            - summary["premium_paid"]
+        )
+        summary["seller_pnl"] = (
+            summary["premium_received"]
+            - summary["discounted_payoff_paid"]
+            - summary["open_value_short"]
+        )
+        return summary
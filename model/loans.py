@@ -0,0 +1,307 @@
+"""# Loan Book
+A columnar book of NFT-collateralized loans, following the NFTfi Loan Agreement and Loan
+Life Cycle (see `diagrams/`).
+
+A borrower escrows an NFT as collateral for a fixed-term loan of `principal` from a
+lender at an `apr`. Interest accrues pro-rata, and the borrower can repay the principal
+and the interest accrued so far at any time until maturity, after which an unpaid loan
+is in default, and the lender forecloses, taking the NFT. The value of the collateral is
+its number of `collateral_units` of the NFT floor price, e.g. 1.5 for an NFT valued at
+1.5 times the floor price of its collection.
+
+Each loan is a row across a set of Numpy column arrays, indexed by loan ID, with the
+borrower and lender agents stored as integer agent indices. Each timestep can accrue
+interest, evaluate loan-to-value, and process repayments and defaults for the whole book
+in one vectorized pass, so that books of tens of thousands of loans can be simulated.
+Closed loans can be compacted out of the book into running totals, see
+`LoanBook.compact()`, so that the book, which radCAD copies into every row of the
+results, only grows with the number of active loans.
+"""
+
+import numpy as np
+
+
+# Loan status codes of the `status` column
+ACTIVE = 0
+REPAID = 1
+FORECLOSED = 2
+
+LOAN_DURATIONS = (7, 14, 30, 60, 90)
+"""Loan durations offered by the protocol, in days, i.e. timesteps of the default `dt`
+"""
+
+SUMMARY_STATE_VARIABLES = (
+    "loans_active",
+    "loans_repaid",
+    "loans_foreclosed",
+    "principal_outstanding",
+    "owed_outstanding",
+    "mean_loan_to_value",
+    "underwater_loans",
+    "lender_pnl",
+)
+"""Metrics of `LoanBook.summary(...)` recorded as State Variables each timestep, see
+`model.parts.loans`"""
+
+
+class LoanBook:
+    """## Loan Book
+    A columnar, array-backed book of NFT-collateralized loans between agents.
+
+    Columns, indexed by loan ID:
+    * `borrower`, `lender`: Agent indices of the borrower and lender
+    * `principal`: Loan principal, in USD
+    * `apr`: Annual interest rate, accrued pro-rata
+    * `started_at`, `maturity`: Timestep the loan was originated, and the last timestep
+      it can be repaid
+    * `collateral_units`: Value of the NFT collateral, as a multiple of the NFT floor
+      price
+    * `status`: `ACTIVE`, `REPAID` or `FORECLOSED`
+    * `closed_at`: Timestep the loan was repaid or foreclosed, or -1 while active
+    * `owed`: Principal and interest owed as of the latest `accrue(...)`, or the amount
+      repaid
+    * `loan_to_value`: Amount owed as a fraction of the collateral value, as of the
+      latest `accrue(...)`
+    * `recovered`: Value of the collateral taken by the lender on foreclosure
+
+    Storage grows geometrically, and only the used part of each column is pickled, which
+    is how radCAD copies State Variables between substeps. Repaid and foreclosed loans
+    are removed by `compact()`, keeping their counts and lender PnL in `compacted`.
+    """
+
+    columns = {
+        "borrower": np.int32,
+        "lender": np.int32,
+        "principal": np.float64,
+        "apr": np.float64,
+        "started_at": np.int32,
+        "maturity": np.int32,
+        "collateral_units": np.float64,
+        "status": np.int8,
+        "closed_at": np.int32,
+        "owed": np.float64,
+        "loan_to_value": np.float64,
+        "recovered": np.float64,
+    }
+
+    def __init__(self, n_agents: int, capacity: int = 1024):
+        self.n_agents = n_agents
+        self.size = 0
+        self._data = {
+            name: np.zeros(capacity, dtype=dtype)
+            for name, dtype in self.columns.items()
+        }
+        # Totals of the closed loans removed from the book, see `compact()`
+        self.compacted = {
+            "loans_repaid": 0,
+            "loans_foreclosed": 0,
+            "lender_pnl_per_agent": np.zeros(n_agents),
+        }
+
+    def __len__(self):
+        return self.size
+
+    def __getattr__(self, name):
+        # Column views of the loans in the book, e.g. `book.principal`
+        if name in LoanBook.columns and "_data" in self.__dict__:
+            return self.__dict__["_data"][name][: self.size]
+        raise AttributeError(name)
+
+    def __getstate__(self):
+        return {
+            "n_agents": self.n_agents,
+            "size": self.size,
+            "_data": {
+                name: values[: self.size].copy() for name, values in self._data.items()
+            },
+            "compacted": self.compacted,
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def _reserve(self, size):
+        capacity = len(self._data["borrower"])
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 16)
+        for name, values in self._data.items():
+            grown = np.zeros(capacity, dtype=values.dtype)
+            grown[: self.size] = values[: self.size]
+            self._data[name] = grown
+
+    def originate(
+        self,
+        borrowers,
+        lenders,
+        principals,
+        aprs,
+        durations,
+        collateral_units,
+        timestep: int,
+    ) -> np.ndarray:
+        """Originate a batch of loans, with arguments broadcast against the borrowers,
+        and return their loan IDs
+
+        `timestep` can also be an array of origination timesteps, e.g. negative
+        timesteps for loans originated before the simulation.
+        """
+        borrowers = np.asarray(borrowers, dtype=np.int32)
+        n = len(borrowers)
+
+        start = self.size
+        self._reserve(start + n)
+        new = slice(start, start + n)
+        for name, values in [
+            ("borrower", borrowers),
+            ("lender", lenders),
+            ("principal", principals),
+            ("apr", aprs),
+            ("started_at", timestep),
+            ("maturity", timestep + np.asarray(durations)),
+            ("collateral_units", collateral_units),
+            ("status", ACTIVE),
+            ("closed_at", -1),
+            ("owed", principals),
+            ("loan_to_value", 0.0),
+            ("recovered", 0.0),
+        ]:
+            self._data[name][new] = values
+        self.size += n
+        return np.arange(start, start + n)
+
+    def active_loans(self) -> np.ndarray:
+        """Return the IDs of active loans"""
+        return np.flatnonzero(self.status == ACTIVE)
+
+    def collateral_value(self, floor_price, ids=None) -> np.ndarray:
+        """Return the value of the collateral of loans `ids`, or of all loans, at NFT
+        floor price `floor_price`"""
+        units = self.collateral_units if ids is None else self.collateral_units[ids]
+        return units * floor_price
+
+    def accrue(self, floor_price, timestep: int) -> np.ndarray:
+        """Accrue the interest of all active loans up to `timestep`, update their
+        loan-to-value at NFT floor price `floor_price`, and return the IDs of the active
+        loans"""
+        ids = self.active_loans()
+        elapsed = np.minimum(timestep, self.maturity[ids]) - self.started_at[ids]
+        owed = self.principal[ids] * (1 + self.apr[ids] * elapsed / 365)
+        self._data["owed"][ids] = owed
+        self._data["loan_to_value"][ids] = owed / self.collateral_value(
+            floor_price, ids
+        )
+        return ids
+
+    def repay(self, ids, timestep: int) -> np.ndarray:
+        """Repay the active, unmatured loans among `ids` at the amount owed, see
+        `accrue(...)`, and return the IDs repaid"""
+        ids = np.asarray(ids, dtype=np.intp)
+        ids = ids[(self.status[ids] == ACTIVE) & (self.maturity[ids] >= timestep)]
+        self._data["status"][ids] = REPAID
+        self._data["closed_at"][ids] = timestep
+        return ids
+
+    def foreclose(self, floor_price, timestep: int) -> np.ndarray:
+        """Foreclose all active loans past their maturity at `timestep`, transferring
+        the collateral to the lender at NFT floor price `floor_price`, and return the
+        IDs foreclosed"""
+        ids = np.flatnonzero((self.status == ACTIVE) & (self.maturity < timestep))
+        self._data["status"][ids] = FORECLOSED
+        self._data["closed_at"][ids] = timestep
+        self._data["recovered"][ids] = self.collateral_value(floor_price, ids)
+        return ids
+
+    def compact(self) -> int:
+        """Remove repaid and foreclosed loans from the book, adding their counts and
+        lender PnL to the `compacted` totals, and return the number of loans removed
+
+        Loan IDs are row indices, so the IDs of the remaining loans change.
+        """
+        closed = self.status != ACTIVE
+        n_closed = int(closed.sum())
+        if not n_closed:
+            return 0
+        compacted = self.compacted
+        self.compacted = {
+            "loans_repaid": compacted["loans_repaid"]
+            + int((self.status == REPAID).sum()),
+            "loans_foreclosed": compacted["loans_foreclosed"]
+            + int((self.status == FORECLOSED).sum()),
+            "lender_pnl_per_agent": compacted["lender_pnl_per_agent"]
+            + self.per_agent(self._lender_pnl(), "lender"),
+        }
+        active = np.flatnonzero(~closed)
+        for values in self._data.values():
+            values[: len(active)] = values[active]
+        self.size = len(active)
+        return n_closed
+
+    def _lender_pnl(self) -> np.ndarray:
+        # Interest received on repaid loans, plus the collateral recovered less the
+        # principal of foreclosed loans
+        return np.where(
+            self.status == REPAID, self.owed - self.principal, 0.0
+        ) + np.where(self.status == FORECLOSED, self.recovered - self.principal, 0.0)
+
+    def per_agent(self, values, side="lender") -> np.ndarray:
+        """Sum per-loan `values` by the borrower or lender agent index, returning an
+        array of length `n_agents`"""
+        agents = self.borrower if side == "borrower" else self.lender
+        return np.bincount(
+            agents,
+            weights=np.broadcast_to(values, agents.shape),
+            minlength=self.n_agents,
+        )
+
+    def summary(self, floor_price) -> dict:
+        """Loan book health at NFT floor price `floor_price`: loan counts, outstanding
+        amounts, loan-to-value and lender losses
+
+        Lender PnL is the interest received on repaid loans, plus the collateral
+        recovered less the principal of foreclosed loans, including the loans removed by
+        `compact()`.
+        """
+        active = self.status == ACTIVE
+        loan_to_value = self.loan_to_value[active]
+        mean_loan_to_value = loan_to_value.mean() if len(loan_to_value) else np.nan
+        lender_pnl_per_agent = self.compacted["lender_pnl_per_agent"] + self.per_agent(
+            self._lender_pnl(), "lender"
+        )
+        return {
+            "loans_active": int(active.sum()),
+            "loans_repaid": self.compacted["loans_repaid"]
+            + int((self.status == REPAID).sum()),
+            "loans_foreclosed": self.compacted["loans_foreclosed"]
+            + int((self.status == FORECLOSED).sum()),
+            "principal_outstanding": float(self.principal[active].sum()),
+            "owed_outstanding": float(self.owed[active].sum()),
+            "collateral_value": float(self.collateral_value(floor_price)[active].sum()),
+            "mean_loan_to_value": float(mean_loan_to_value),
+            "underwater_loans": int((loan_to_value > 1).sum()),
+            "lender_pnl": float(lender_pnl_per_agent.sum()),
+            "lender_pnl_per_agent": lender_pnl_per_agent,
+        }
+
+
+def sample_loan_terms(n_loans: int, n_agents: int, floor_price, rng=np.random) -> dict:
+    """Sample the terms of `n_loans` loans between random distinct borrowers and lenders
+    among `n_agents` agents, as keyword arguments of `LoanBook.originate(...)`
+
+    Collateral is valued at a lognormal multiple of the floor price of at least 1, loans
+    are originated at a loan-to-value of 30% to 60%, with lognormal APRs around 30%, and
+    durations drawn from `LOAN_DURATIONS`.
+    """
+    borrowers = rng.randint(0, n_agents, size=n_loans)
+    # A lender distinct from the borrower, if there is more than one agent
+    lenders = (borrowers + rng.randint(1, max(n_agents, 2), size=n_loans)) % n_agents
+    collateral_units = np.exp(np.abs(rng.normal(0.0, 0.5, size=n_loans)))
+    loan_to_value = rng.uniform(0.3, 0.6, size=n_loans)
+    return {
+        "borrowers": borrowers,
+        "lenders": lenders,
+        "principals": loan_to_value * collateral_units * floor_price,
+        "aprs": np.exp(rng.normal(np.log(0.3), 0.4, size=n_loans)),
+        "durations": rng.choice(LOAN_DURATIONS, size=n_loans),
+        "collateral_units": collateral_units,
+    }
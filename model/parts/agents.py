@@ -1,16 +1,74 @@
+import heapq
+
 import numpy as np
-from scipy.stats import norm
+from model.strategies import Market, run_population
 from model.types import Option
 
-import experiments.simulation_configuration as simulation
 
-n_agents = simulation.N_AGENTS
+class AgentColumns:
+    """## Agent Columns
+    The Agent fields that select the agents taking an action, stored as arrays by agent index,
+    so that the option holders and sellers of a timestep are found without iterating over every agent.
+
+    Built from the agent State Variables once per run, and updated with the agents changed by
+    `policy_agents(...)` each timestep, see `run_agent_columns(...)`.
+    """
+
+    def __init__(self, keys, agents):
+        self.keys = list(keys)
+        self.index = {key: index for index, key in enumerate(self.keys)}
+        # agents holding a bought option that isn't exercised
+        self.holding = np.zeros(len(self.keys), dtype=bool)
+        # agents accepting buy orders
+        self.accepting = np.zeros(len(self.keys), dtype=bool)
+        self.premium_paid = np.zeros(len(self.keys))
+        # timestep of the agent State Variables the columns are up to date with
+        self.timestep = None
+        self.update(agents)
+
+    def update(self, agents):
+        """Record the fields of `agents`"""
+        for agent in agents:
+            index = self.index[agent.key]
+            self.holding[index] = agent.option_side == "buy" and agent.has_counterparty and not agent.exercised
+            self.accepting[index] = agent.accepting_buy_order
+            self.premium_paid[index] = agent.premium_paid
+
+
+def run_agent_columns(params, previous_state) -> AgentColumns:
+    """Return the `AgentColumns` of the agents of the current run, cached in the System Parameters of the run
+    as `agent_columns`, and rebuilt from the agent State Variables when they aren't up to date with `previous_state`,
+    e.g. at the start of a run, or when a run is resumed from a checkpoint
+    """
+    columns = params.get("agent_columns")
+    if columns is None or columns.timestep != previous_state["timestep"]:
+        keys = params["agents"]
+        columns = params["agent_columns"] = AgentColumns(keys, [previous_state[key] for key in keys])
+        columns.timestep = previous_state["timestep"]
+    return columns
+
+
+def estimate_volatility(state_history, timestep, option_maturity):
+    """Estimate the BSM volatility from the history of volatile asset price returns"""
+    # make this not hacky for the first few timesteps
+    
+    sigma = 0.1
+    
+    if timestep > 2:
+        price_history = np.array([state[-1]["volatile_asset_price"] for state in state_history[0:timestep]])
+        returns_history = price_history[1:] / price_history[:-1] - 1
+        sigma = returns_history.std() * np.sqrt(option_maturity)
 
+    return sigma
 
 
 def policy_agents(params, substep, state_history, previous_state):
     """Update Agent Behavior
-    Update agent behavior
+    Update agent behavior, where each agent lists, buys and exercises at most one option according to its strategy,
+    see `model.strategies`
+
+    Only the agents that changed are returned, and the agents holding or listing an option are looked up in the
+    `AgentColumns` of the run, so that the cost of a timestep grows with the number of agents taking an action.
     """
 
     # Parameters
@@ -18,22 +76,15 @@ def policy_agents(params, substep, state_history, previous_state):
     strike_price = params["strike_price"]
     option_maturity = params["option_maturity"]
     option_type = params["option_type"]
+    option_pricing_surface = params["option_pricing_surface"]
 
     # State Variables
-    agents = [previous_state["agent_"+str(i)] for i in range(n_agents)]
     timestep = previous_state["timestep"]
     volatile_asset_price = previous_state["volatile_asset_price"]
     risk_free_rate = previous_state["risk_free_rate"]
     
     # BSM Volatility
-    # make this not hacky for the first few timesteps
-    
-    sigma = 0.1
-    
-    if timestep > 2:
-        price_history = np.array([state[-1]["volatile_asset_price"] for state in state_history[0:timestep]])
-        returns_history = price_history[1:] / price_history[:-1] - 1
-        sigma = returns_history.std() * np.sqrt(option_maturity)
+    sigma = estimate_volatility(state_history, timestep, option_maturity)
 
     option = Option(
         option_type=option_type,
@@ -44,68 +95,71 @@ def policy_agents(params, substep, state_history, previous_state):
         volatility=sigma,
     )
     
-    bsm_price = option.bsm_price(timestep)
+    if option_pricing_surface is not None:
+        bsm_price = option_pricing_surface.option_price(option, timestep)
+    else:
+        bsm_price = option.bsm_price(timestep)
     option_payoff = option.payoff()
     
-    # Agent Logic
+    # Agent Logic, with the decisions of all agents made at once by their strategies, see `model.strategies`
+    columns = run_agent_columns(params, previous_state)
+    population = run_population(params, len(columns.keys))
+    market = Market(timestep, volatile_asset_price, bsm_price, sigma)
+    payoff_value = option_payoff(volatile_asset_price, strike_price)
+
+    sell_option = population.sell(market)
+    buy_option = population.buy(market)
+    # agents holding a bought option at the start of the timestep exercise it according to their strategy
+    holders = np.flatnonzero(columns.holding)
+    exercise_option = np.zeros(len(columns.keys), dtype=bool)
+    exercise_option[holders] = population.exercise(market, holders, payoff_value, columns.premium_paid[holders])
+
+    # sellers accepting buy orders, by agent index, with agents that are no longer accepting removed when reached
+    sellers = np.flatnonzero(columns.accepting).tolist()
+    keys = columns.keys
+
+    # agents changed this timestep, by key
+    agent_dict = {}
+    # the columns are out of date until the changed agents are recorded
+    columns.timestep = None
+
+    # only agents taking an action are processed, in agent order
+    for index in np.flatnonzero(sell_option | buy_option | exercise_option):
+        agent = previous_state[keys[index]]
 
-    p_buy = 0.05
-    p_sell = 0.05
-    p_exercise = 0.05
-    
-    for agent in agents:
-        
-        buy_option = np.random.binomial(1, p_buy) # 0 or 1 w probability p
-        sell_option = np.random.binomial(1, p_sell) # 0 or 1 w probability p
-        exercise_option = np.random.binomial(1, p_exercise) # 0 or 1 w probability p
-        
         # restrict logic to have agents only buy/sell and exercise once throughout the simulation
         # can be extended
-        if agent.exercised == False:
-            
-            # agent puts an option on the market with probability p_sell
-            if (agent.option_side != "buy"
-                and agent.accepting_buy_order == False
-                and sell_option == 1
-               ):
-                
-                agent.accepting_buy_order = True
-        
-            # agents not in possession of an option buy one with probability p_buy
-            if agent.has_counterparty == False and buy_option == 1:
-                
-                # find an available seller amongst agents that are selling
-                for sell_agent in agents:
-                    
-                    # buy from first available seller
-                    if sell_agent.accepting_buy_order:
-                        
-                        # buy the option and exit seller search
-                        agent.buy_option(sell_agent, timestep, bsm_price)
-                        break
-                        
-            # check if in profit
-            payoff_value = option_payoff(volatile_asset_price, strike_price)
-            profit = payoff_value - agent.premium_paid
-            
-            is_in_profit = profit > 0
-
-            # get agents who own the option to exercise it
-            if (agent.option_side == "buy"
-                and agent.has_counterparty == True
-                and is_in_profit == True
-                and exercise_option == 1
-               ):
-                
-                # get the counterparty
-                sell_agent = previous_state["agent_"+str(agent.bought_from_Id)]
-                
-                # exercise
-                agent.exercise(sell_agent, option, volatile_asset_price, timestep)
-            
-        
-            
-    agent_keys = [agent.key for agent in agents]
-    agent_dict = dict(zip(agent_keys,agents))
-    
+        if agent.exercised:
+            continue
+
+        # agent puts an option on the market
+        if sell_option[index] and agent.option_side != "buy" and not agent.accepting_buy_order:
+            agent.accepting_buy_order = True
+            heapq.heappush(sellers, index)
+            agent_dict[agent.key] = agent
+
+        # agents not in possession of an option buy one
+        if buy_option[index] and not agent.has_counterparty:
+            # buy from the first available seller
+            while sellers and not previous_state[keys[sellers[0]]].accepting_buy_order:
+                heapq.heappop(sellers)
+            if sellers:
+                sell_agent = previous_state[keys[sellers[0]]]
+                agent.buy_option(sell_agent, timestep, bsm_price)
+                agent_dict[agent.key] = agent
+                agent_dict[sell_agent.key] = sell_agent
+
+        # get agents who own the option to exercise it
+        if exercise_option[index] and agent.option_side == "buy" and agent.has_counterparty:
+            # get the counterparty
+            sell_agent = previous_state["agent_" + str(agent.bought_from_Id)]
+
+            # exercise
+            agent.exercise(sell_agent, option, volatile_asset_price, timestep)
+            agent_dict[agent.key] = agent
+            agent_dict[sell_agent.key] = sell_agent
+
+    columns.update(agent_dict.values())
+    columns.timestep = timestep + 1
+
     return agent_dict
@@ -0,0 +1,75 @@
+import numpy as np
+
+from model.loans import SUMMARY_STATE_VARIABLES, LoanBook, sample_loan_terms
+from model.utils import run_rng
+
+
+def policy_loans(params, substep, state_history, previous_state):
+    """Update Loan Book
+    NFT-collateralized loan book, enabled using the `loan_book` System Parameter, see
+    `model.loans`.
+
+    Each timestep, in one vectorized pass over the loan book:
+    1. the NFT floor price moves with the volatile asset price, with a beta of
+       `nft_floor_beta`, plus idiosyncratic noise with an annualized volatility of
+       `nft_floor_volatility`
+    2. interest is accrued and the loan-to-value of active loans updated at the new
+       floor price
+    3. borrowers repay each loan worth repaying, i.e. with a loan-to-value below 1,
+       with probability `p_repay`, or at maturity, leaving underwater loans to default
+    4. loans past their maturity are foreclosed, and the lender takes the collateral
+    5. repaid and foreclosed loans are compacted out of the book, see
+       `model.loans.LoanBook.compact()`
+    6. `loan_origination_rate` new loans are originated on average, see
+       `model.loans.sample_loan_terms(...)`
+
+    Loan book health metrics, see `model.loans.SUMMARY_STATE_VARIABLES`, are recorded as
+    State Variables.
+    """
+
+    if not params["loan_book"]:
+        return {}
+
+    # Parameters
+    dt = params["dt"]
+    nft_floor_beta = params["nft_floor_beta"]
+    nft_floor_volatility = params["nft_floor_volatility"]
+    loan_origination_rate = params["loan_origination_rate"]
+    p_repay = params["p_repay"]
+    rng = run_rng(params)
+
+    # State Variables
+    book: LoanBook = previous_state["loans"]
+    timestep = previous_state["timestep"]
+    volatile_asset_price = previous_state["volatile_asset_price"]
+    previous_volatile_asset_price = state_history[-1][-1]["volatile_asset_price"]
+    nft_floor_price = previous_state["nft_floor_price"]
+
+    nft_floor_price *= np.exp(
+        nft_floor_beta * np.log(volatile_asset_price / previous_volatile_asset_price)
+        + nft_floor_volatility * np.sqrt(dt / 365) * rng.normal()
+    )
+
+    ids = book.accrue(nft_floor_price, timestep)
+    worth_repaying = book.loan_to_value[ids] < 1
+    repay = worth_repaying & (
+        (rng.random(len(ids)) < p_repay) | (book.maturity[ids] == timestep)
+    )
+    book.repay(ids[repay], timestep)
+
+    book.foreclose(nft_floor_price, timestep)
+    book.compact()
+
+    n_loans = rng.poisson(loan_origination_rate)
+    if n_loans:
+        book.originate(
+            **sample_loan_terms(n_loans, book.n_agents, nft_floor_price, rng),
+            timestep=timestep
+        )
+
+    summary = book.summary(nft_floor_price)
+    return {
+        "loans": book,
+        "nft_floor_price": nft_floor_price,
+        **{key: summary[key] for key in SUMMARY_STATE_VARIABLES},
+    }
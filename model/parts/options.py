@@ -1,6 +1,7 @@
 # +
 import numpy as np
 import typing
+import weakref
 
 from model.types import (
     USD,
@@ -34,27 +35,105 @@ def update_volatile_asset_price(
     return "volatile_asset_price", volatile_asset_price_sample
 
 
+PAYOFFS = {
+    "call": lambda S, K: np.maximum(S - K, 0.0),
+    "put": lambda S, K: np.maximum(K - S, 0.0),
+    "straddle": lambda S, K: np.abs(S - K),
+}
+"""Vectorized option payoffs by option type, equivalent to `model.types.Option.payoff()`;
+new option types are supported by adding their payoff"""
+
+
+def discounted_payoff_series(
+    volatile_asset_prices, option_type, strike_price, option_maturity, risk_free_rate, dt, first_timestep=0
+) -> np.ndarray:
+    """Discounted payoff series
+    Compute the discounted option payoff at every timestep of a run in one vectorized pass over its volatile asset price path,
+    where `volatile_asset_prices[t]` is the volatile asset price at timestep `first_timestep + t`.
+    """
+    if option_type not in PAYOFFS:
+        raise ValueError(f"No payoff defined for option type {option_type}, one of {list(PAYOFFS)}")
+    prices = np.asarray(volatile_asset_prices, dtype=float)
+    rf_daily = risk_free_rate / (timesteps * dt)
+    discount_factors = np.exp(-rf_daily * (option_maturity - first_timestep - np.arange(len(prices))))
+    return PAYOFFS[option_type](prices, strike_price) * discount_factors
+
+
+PAYOFF_SERIES_CACHE_SIZE = 256
+"""Number of discounted payoff series cached per volatile asset price process"""
+
+_payoff_series_cache = weakref.WeakKeyDictionary()
+"""Discounted payoff series by volatile asset price process, released with the process and its samples"""
+
+
+def _run_discounted_payoff_series(
+    volatile_asset_price_process, run, length, initial_price, option_type, strike_price, option_maturity, risk_free_rate, dt
+):
+    """The discounted payoff series of a run of a `SampledProcess`, from timestep 0 to `length - 1`"""
+    cache = _payoff_series_cache.setdefault(volatile_asset_price_process, {})
+    key = (run, length, initial_price, option_type, strike_price, option_maturity, risk_free_rate, dt)
+    if key in cache:
+        return cache[key]
+
+    # The volatile asset price at timestep t >= 1 is sampled at time (t - 1) * dt, see `update_volatile_asset_price(...)`,
+    # and the process is sliced directly, up to the end of its samples
+    path = volatile_asset_price_process.samples[run - 1, : (length - 1) * int(dt) : int(dt)]
+    prices = np.concatenate([[initial_price], path])
+    series = discounted_payoff_series(prices, option_type, strike_price, option_maturity, risk_free_rate, dt)
+    series.flags.writeable = False
+
+    if len(cache) >= PAYOFF_SERIES_CACHE_SIZE:
+        del cache[next(iter(cache))]
+    cache[key] = series
+    return series
+
+
 def update_discounted_payoff(
     params, substep, state_history, previous_state, policy_input
 ):
-    """Update Volatile Asset Price
-    Update the volatile asset price from the `volatile_asset_price_process`.
+    """Update Discounted Payoff
+    Update the discounted payoff of the `option_type` option from the volatile asset price.
+
+    For a `SampledProcess`, the payoff series of the whole run is computed once, in one vectorized pass,
+    and each timestep looks up its value. Other processes, e.g. functions of the run and time,
+    are only evaluated at the current timestep, as they may not be defined past the end of the simulation.
     """
 
     # Parameters
     dt = params["dt"]
     volatile_asset_price_process = params["volatile_asset_price_process"]
     option_maturity = params["option_maturity"]
+    option_type = params["option_type"]
     strike_price = params["strike_price"]
 
     # State Variables
     run = previous_state["run"]
     timestep = previous_state["timestep"]
-    
-    volatile_asset_price = previous_state["volatile_asset_price"]
     risk_free_rate = previous_state["risk_free_rate"]
+    initial_price = state_history[0][0]["volatile_asset_price"]
 
-    rf_daily = risk_free_rate / (timesteps * dt)
-    d_payoff = max(volatile_asset_price - strike_price, 0) * np.exp(-rf_daily* (option_maturity - timestep))
+    if getattr(volatile_asset_price_process, "samples", None) is None or not float(dt).is_integer():
+        price = initial_price if timestep == 0 else volatile_asset_price_process(run, (timestep - 1) * dt)
+        series = discounted_payoff_series(
+            [price], option_type, strike_price, option_maturity, risk_free_rate, dt, first_timestep=timestep
+        )
+        return "discounted_payoff", float(series[0])
+
+    # Series cover the configured number of timesteps, doubled for longer simulations
+    length = timesteps + 1
+    while length <= timestep:
+        length *= 2
+
+    series = _run_discounted_payoff_series(
+        volatile_asset_price_process,
+        run,
+        length,
+        initial_price,
+        option_type,
+        strike_price,
+        option_maturity,
+        risk_free_rate,
+        dt,
+    )
 
-    return "discounted_payoff", d_payoff
+    return "discounted_payoff", float(series[timestep])
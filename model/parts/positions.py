@@ -0,0 +1,123 @@
+import numpy as np
+
+from model.ledger import PositionLedger
+from model.parts.agents import estimate_volatility
+from model.pricing import black_scholes_price
+from model.strategies import Market, run_population
+from model.utils import run_rng
+
+
+def collateral_required(option_type, strike, underlying_price):
+    """Collateral a seller locks to cover an order, in USD at the time the order is
+    created: the strike price for a put, the underlying asset for a call, and both for a
+    straddle
+
+    The collateral isn't revalued with the underlying price, so the payoff of a call or
+    straddle exercised after the underlying price more than doubles is capped at the
+    collateral, see `PositionLedger.exercise_value(...)`.
+    """
+    return {
+        "call": underlying_price,
+        "put": strike,
+        "straddle": strike + underlying_price,
+    }[option_type]
+
+
+def policy_positions(params, substep, state_history, previous_state):
+    """Update Position Ledger
+    Multi-position option market, enabled using the `position_ledger` System Parameter.
+
+    Unlike `policy_agents(...)`, where each agent holds at most one option for the whole
+    simulation, agents can buy and sell any number of concurrent and sequential options,
+    recorded in the `positions` ledger, following the order and option lifecycle of
+    `model.ledger`. Agent decisions are made by the strategy of each agent, see
+    `model.strategies`, e.g. with probabilities `p_sell`, `p_buy` and `p_exercise` for
+    the default `random` strategy. Each timestep, in bulk:
+    1. orders past their order expiry, and positions past their expiry, are expired
+    2. agents listing an option create an order at the BSM price, with a strike of
+       `position_moneyness` times the spot price, locking collateral (see
+       `collateral_required(...)`), which can be filled for `position_order_lifetime`
+       timesteps
+    3. sellers cancel each of their listed orders with probability `p_cancel`
+    4. buying agents each fill a distinct listed order, opening an option that expires
+       `position_tenor` timesteps later
+    5. holders exercise positions according to their strategy
+    6. sellers withdraw the collateral of each of their expired or exercised positions
+       with probability `p_withdraw`
+    7. open positions are marked to market
+    8. closed positions without collateral left to withdraw are compacted out of the
+       ledger, see `PositionLedger.compact()`
+    """
+
+    if not params["position_ledger"]:
+        return {}
+
+    # Parameters
+    option_type = params["option_type"]
+    option_maturity = params["option_maturity"]
+    position_tenor = params["position_tenor"]
+    position_moneyness = params["position_moneyness"]
+    position_order_lifetime = params["position_order_lifetime"]
+    p_cancel = params["p_cancel"]
+    p_withdraw = params["p_withdraw"]
+    rng = run_rng(params)
+
+    # State Variables
+    ledger: PositionLedger = previous_state["positions"]
+    timestep = previous_state["timestep"]
+    volatile_asset_price = previous_state["volatile_asset_price"]
+    risk_free_rate = previous_state["risk_free_rate"]
+
+    sigma = estimate_volatility(state_history, timestep, option_maturity)
+
+    ledger.expire(timestep)
+
+    strike = position_moneyness * volatile_asset_price
+    premium = black_scholes_price(
+        option_type,
+        volatile_asset_price,
+        strike,
+        (position_tenor + 1) / 365,
+        risk_free_rate,
+        sigma,
+    )
+    population = run_population(params, ledger.n_agents)
+    market = Market(timestep, volatile_asset_price, premium, sigma)
+
+    sellers = np.flatnonzero(population.sell(market))
+    if len(sellers):
+        ledger.create_orders(
+            sellers,
+            option_type,
+            strike,
+            position_tenor,
+            premium,
+            collateral_required(option_type, strike, volatile_asset_price),
+            timestep + position_order_lifetime,
+            timestep,
+        )
+
+    orders = ledger.listed_orders(timestep)
+    ledger.cancel(orders[rng.random(len(orders)) < p_cancel], timestep)
+
+    # Match buyers to listed orders in random order, excluding agents buying their own
+    # order
+    orders = rng.permutation(ledger.listed_orders(timestep))
+    buyers = rng.permutation(np.flatnonzero(population.buy(market)))
+    matched = min(len(buyers), len(orders))
+    ledger.fill(orders[:matched], buyers[:matched], timestep)
+
+    ids = ledger.open_positions(timestep)
+    intrinsic_value = ledger.exercise_value(ids, volatile_asset_price)
+    exercise = population.exercise(
+        market, ledger.buyer[ids], intrinsic_value, ledger.premium[ids]
+    )
+    ledger.exercise(ids[exercise], volatile_asset_price, timestep, risk_free_rate)
+
+    ids = ledger.withdrawable_positions()
+    ledger.withdraw(ids[rng.random(len(ids)) < p_withdraw], timestep)
+
+    ledger.mark_to_market(volatile_asset_price, sigma, timestep, risk_free_rate)
+    ledger.compact()
+
+    return {"positions": ledger}
@@ -0,0 +1,325 @@
+"""# Option Pricing
+Vectorized Black-Scholes-Merton option pricing, and a precomputed option price surface
+with interpolated lookup.
+
+The closed-form prices match `model.types.Option.bsm_price(...)`, which uses a time to
+maturity of `(T - t + 1) / 365` years.
+"""
+
+import math
+
+import numpy as np
+from scipy.special import ndtr
+
+
+OPTION_TYPES = ("call", "put", "straddle")
+
+CHUNK_SIZE = 16_384
+"""Number of quotes of a vectorized surface lookup interpolated at once, see
+`OptionPriceSurface.price(...)`"""
+
+
+def black_scholes_price(option_type, S, K, tau, r, sigma):
+    """## Black-Scholes-Merton price
+    Vectorized closed-form price of a call, put or straddle option, for underlying price
+    `S`, strike price `K`, time to maturity `tau` in years, risk-free rate `r` and
+    volatility `sigma`. Arguments are broadcast against each other.
+    """
+    S, K, tau, sigma = np.broadcast_arrays(*map(np.asarray, (S, K, tau, sigma)))
+    sqrt_tau = np.sqrt(tau)
+    d1 = (np.log(S / K) + (r + sigma**2 / 2.0) * tau) / (sigma * sqrt_tau)
+    d2 = d1 - sigma * sqrt_tau
+    discounted_strike = K * np.exp(-r * tau)
+
+    call = S * ndtr(d1) - discounted_strike * ndtr(d2)
+    if option_type == "call":
+        return call
+    # Put-call parity
+    put = call - S + discounted_strike
+    if option_type == "put":
+        return put
+    if option_type == "straddle":
+        return call + put
+    return np.zeros_like(call, dtype=float)
+
+
+class OptionPriceSurface:
+    """## Option Price Surface
+    A precomputed grid of option prices, for each option type, over (log-moneyness,
+    square root of time to maturity, volatility), with vectorized trilinear
+    interpolation.
+
+    Option prices are homogeneous of degree one in the underlying and strike price, so
+    the surface is computed for a unit strike and scaled by the strike price, which
+    makes a single surface valid for all strikes. The square root of time to maturity is
+    used as an axis because option prices vary with `sqrt(tau)` close to expiry.
+
+    Lookups outside of the grid domain, or for a different risk-free rate, fall back to
+    the closed-form price.
+
+    Inside the grid domain `error_bound` estimates the maximum interpolation error per
+    unit of strike, using the classical bound for multilinear interpolation
+    `sum_i h_i**2 / 8 * max|d2f/dx_i2|`. It is an estimate rather than a guaranteed
+    bound: the maximum second derivatives are estimated from second differences on a
+    grid refined by `refinement` along each axis, which can miss their peaks.
+
+    Lookups are mostly worthwhile for scalar quotes, e.g. `option_price(...)` in
+    `model.parts.agents`, as vectorized lookups are only slightly faster than the
+    vectorized closed-form `black_scholes_price(...)`.
+    """
+
+    def __init__(
+        self,
+        option_types=OPTION_TYPES,
+        risk_free_rate=0.03,
+        log_moneyness=(-1.5, 1.5, 121),
+        time_to_maturity=(7 / 365, 366 / 365, 41),
+        volatility=(0.05, 1.0, 39),
+        refinement=2,
+    ):
+        """
+        Args:
+            option_types (tuple): Option types to precompute
+            risk_free_rate (float): Risk-free rate of the surface
+            log_moneyness (tuple): Grid (start, stop, number of points) for `log(S / K)`
+            time_to_maturity (tuple): Grid (start, stop, number of points) for the time
+                to maturity in years, with points spaced evenly in `sqrt(tau)`
+            volatility (tuple): Grid (start, stop, number of points) for the volatility
+            refinement (int): Refinement factor of the grid used to estimate the error
+                bound
+        """
+        self.option_types = tuple(option_types)
+        self.risk_free_rate = risk_free_rate
+        self.axes = (
+            np.linspace(*log_moneyness),
+            np.linspace(
+                np.sqrt(time_to_maturity[0]),
+                np.sqrt(time_to_maturity[1]),
+                time_to_maturity[2],
+            ),
+            np.linspace(*volatility),
+        )
+        self._start = np.array([axis[0] for axis in self.axes])
+        self._stop = np.array([axis[-1] for axis in self.axes])
+        self._step = np.array([axis[1] - axis[0] for axis in self.axes])
+        self._inverse_step = 1 / self._step
+        self._scalar_axes = (
+            tuple(self._start.tolist()),
+            tuple(self._inverse_step.tolist()),
+        )
+        # Grid coordinates of the end of each axis, and of the last cell along each axis
+        self._shape = tuple(len(axis) for axis in self.axes)
+        self._upper = tuple(float(n - 1) for n in self._shape)
+        self._max_index = tuple(n - 2 for n in self._shape)
+
+        self.grids = {
+            option_type: self._evaluate(option_type, self.axes)
+            for option_type in self.option_types
+        }
+        for grid in self.grids.values():
+            grid.flags.writeable = False
+        # Each grid point paired with its neighbour along the volatility axis, as the
+        # real and imaginary parts of a complex, so that the 8 corners of a cell are
+        # gathered in 4 lookups, at the precomputed flat offsets of `_strides`
+        self._pairs = {
+            option_type: (grid[:, :, :-1] + 1j * grid[:, :, 1:]).ravel()
+            for option_type, grid in self.grids.items()
+        }
+        self._strides = (self._shape[1] * (self._shape[2] - 1), self._shape[2] - 1)
+
+        self.error_bound = {
+            option_type: self._estimate_error_bound(option_type, refinement)
+            for option_type in self.option_types
+        }
+
+    def _evaluate(self, option_type, axes):
+        """Evaluate the closed-form price for a unit strike on the grid defined by
+        `axes`"""
+        x, s, sigma = np.meshgrid(*axes, indexing="ij")
+        return black_scholes_price(
+            option_type, np.exp(x), 1.0, s**2, self.risk_free_rate, sigma
+        )
+
+    def _estimate_error_bound(self, option_type, refinement):
+        """Estimate the maximum interpolation error per unit of strike over the grid
+        domain"""
+        fine_axes = [
+            np.linspace(axis[0], axis[-1], (len(axis) - 1) * refinement + 1)
+            for axis in self.axes
+        ]
+        fine_grid = self._evaluate(option_type, fine_axes)
+        bound = 0.0
+        for dimension, axis in enumerate(fine_axes):
+            h = axis[1] - axis[0]
+            second_difference = (
+                np.abs(np.diff(fine_grid, n=2, axis=dimension)).max() / h**2
+            )
+            bound += self._step[dimension] ** 2 / 8 * second_difference
+        return bound
+
+    def __deepcopy__(self, memo):
+        # The surface is read-only, so it is shared rather than copied when radCAD
+        # deep-copies System Parameters
+        return self
+
+    def price(self, option_type, S, K, tau, sigma, r=None):
+        """Vectorized option price lookup, for time to maturity `tau` in years, with
+        arguments broadcast against each other"""
+        if (
+            r is not None and r != self.risk_free_rate
+        ) or option_type not in self.grids:
+            return black_scholes_price(
+                option_type, S, K, tau, self.risk_free_rate if r is None else r, sigma
+            )
+        if np.ndim(S) == np.ndim(K) == np.ndim(tau) == np.ndim(sigma) == 0:
+            return self._price_scalar(
+                option_type, float(S), float(K), float(tau), float(sigma)
+            )
+
+        S, K, tau, sigma = np.broadcast_arrays(
+            *map(lambda a: np.asarray(a, dtype=float), (S, K, tau, sigma))
+        )
+        quotes = [a.ravel() for a in (S, K, tau, sigma)]
+        prices = np.empty(S.size)
+        # Chunks of quotes, so that the intermediate arrays of the interpolation stay in
+        # the CPU cache
+        for start in range(0, S.size, CHUNK_SIZE):
+            chunk = slice(start, start + CHUNK_SIZE)
+            prices[chunk] = self._price_chunk(option_type, *(a[chunk] for a in quotes))
+        return prices.reshape(S.shape)
+
+    def option_price(self, option, t):
+        """Option price lookup for a `model.types.Option` at timestep `t`, equivalent to
+        `option.bsm_price(t)`"""
+        tau = (option.maturity - t + 1) / 365
+        if (
+            option.risk_free_rate != self.risk_free_rate
+            or option.option_type not in self.grids
+        ):
+            return float(
+                black_scholes_price(
+                    option.option_type,
+                    option.underlying_price,
+                    option.strike_price,
+                    tau,
+                    option.risk_free_rate,
+                    option.volatility,
+                )
+            )
+        return self._price_scalar(
+            option.option_type,
+            option.underlying_price,
+            option.strike_price,
+            tau,
+            option.volatility,
+        )
+
+    def _price_scalar(self, option_type, S, K, tau, sigma):
+        """Option price lookup of a single quote, in plain Python arithmetic rather than
+        Numpy array operations"""
+        start, scale = self._scalar_axes
+        x_start, s_start, sigma_start = start
+        x_scale, s_scale, sigma_scale = scale
+        x_upper, s_upper, sigma_upper = self._upper
+        try:
+            x = (math.log(S / K) - x_start) * x_scale
+            s = (math.sqrt(tau) - s_start) * s_scale
+        except (ValueError, ZeroDivisionError):
+            x = s = -1.0
+        z = (sigma - sigma_start) * sigma_scale
+        if not (0 <= x <= x_upper and 0 <= s <= s_upper and 0 <= z <= sigma_upper):
+            return float(
+                black_scholes_price(option_type, S, K, tau, self.risk_free_rate, sigma)
+            )
+
+        x_max, s_max, z_max = self._max_index
+        x_stride, s_stride = self._strides
+        i, j, k = min(int(x), x_max), min(int(s), s_max), min(int(z), z_max)
+        x, s, z = x - i, s - j, z - k
+        index = i * x_stride + j * s_stride + k
+
+        pairs = self._pairs[option_type]
+        c00, c10 = pairs.item(index), pairs.item(index + x_stride)
+        c01, c11 = pairs.item(index + s_stride), pairs.item(index + x_stride + s_stride)
+        c0 = c00 + (c10 - c00) * x
+        c = c0 + (c01 + (c11 - c01) * x - c0) * s
+        return K * (c.real + (c.imag - c.real) * z)
+
+    def _price_chunk(self, option_type, S, K, tau, sigma):
+        """Vectorized option price lookup of 1-dimensional arrays of quotes"""
+        x = np.log(S / K)
+        x -= self._start[0]
+        x *= self._inverse_step[0]
+        s = np.sqrt(tau)
+        s -= self._start[1]
+        s *= self._inverse_step[1]
+        z = sigma - self._start[2]
+        z *= self._inverse_step[2]
+
+        x_upper, s_upper, sigma_upper = self._upper
+        inside = (
+            (x >= 0)
+            & (x <= x_upper)
+            & (s >= 0)
+            & (s <= s_upper)
+            & (z >= 0)
+            & (z <= sigma_upper)
+        )
+        outside = None if inside.all() else ~inside
+        if outside is not None:
+            # Any cell, replaced by the closed-form price below
+            for coordinate in (x, s, z):
+                coordinate[outside] = 0.0
+
+        # Flat index of the cell of each quote, and weights of the interpolation along
+        # each axis
+        x_stride, s_stride = self._strides
+        index = np.empty(len(x), dtype=np.intp)
+        for coordinate, max_index, stride in zip(
+            (x, s, z), self._max_index, (x_stride, s_stride, 1)
+        ):
+            cell = coordinate.astype(np.intp)
+            np.minimum(cell, max_index, out=cell)
+            coordinate -= cell
+            if stride == x_stride:
+                np.multiply(cell, stride, out=index)
+            else:
+                cell *= stride
+                index += cell
+
+        # Gather the pairs of corners of each cell, and interpolate along each axis in
+        # turn, in place
+        pairs = self._pairs[option_type]
+        c00 = pairs.take(index).view(float)
+        index += x_stride
+        c10 = pairs.take(index).view(float)
+        index += s_stride
+        c11 = pairs.take(index).view(float)
+        index -= x_stride
+        c01 = pairs.take(index).view(float)
+        c00, c10, c01, c11 = (c.reshape(-1, 2) for c in (c00, c10, c01, c11))
+        x = x[:, None]
+        c10 -= c00
+        c10 *= x
+        c00 += c10
+        c11 -= c01
+        c11 *= x
+        c01 += c11
+        c01 -= c00
+        c01 *= s[:, None]
+        c00 += c01
+        prices = c00[:, 1] - c00[:, 0]
+        prices *= z
+        prices += c00[:, 0]
+        prices *= K
+
+        if outside is not None:
+            prices[outside] = black_scholes_price(
+                option_type,
+                S[outside],
+                K[outside],
+                tau[outside],
+                self.risk_free_rate,
+                sigma[outside],
+            )
+        return prices
@@ -1,48 +1,90 @@
 import model.parts.options as options
 import model.parts.agents as agents
-import experiments.simulation_configuration as simulation
+import model.parts.positions as positions
+import model.parts.loans as loans
 
+from model.loans import SUMMARY_STATE_VARIABLES
+from model.system_parameters import agent_keys
 from model.utils import update_from_signal, update_timestamp
 
-n_agents = simulation.N_AGENTS
-
 enabled = "enabled"
 description = "description"
 policies = "policies"
 variables = "variables"
 
-state_update_blocks = [
-    # Run first
-    {
-        description: """
-            Update volatile asset price
-        """,
-        policies: {}, # Ignore for now
-        # State variables
-        variables: {
-            'volatile_asset_price': options.update_volatile_asset_price,
-        }
-    },
-    {
-        description: """
-            Update option payoff
-        """,
-        policies: {}, # Ignore for now
-        # State variables
-        variables: {
-            'discounted_payoff': options.update_discounted_payoff,
-        }
-    },
-    {
-        description: """
-            Agent shenanigans
-        """,
-        policies: {
-            "agent_actions": agents.policy_agents,
+
+def create_state_update_blocks(agent_keys=agent_keys, position_ledger=False, loan_book=False):
+    """Create the State Update Blocks for the agent State Variables `agent_keys`, e.g. `list(params["agents"][0])`
+
+    The blocks of the multi-position option market and loan book are only added if `position_ledger` and `loan_book` are enabled,
+    as radCAD deep-copies the State Variables for every block of every timestep,
+    see `model.state_variables.create_initial_state(...)` for the matching Initial State.
+    """
+    state_update_blocks = [
+        # Run first
+        {
+            description: """
+                Update volatile asset price
+            """,
+            policies: {}, # Ignore for now
+            # State variables
+            variables: {
+                'volatile_asset_price': options.update_volatile_asset_price,
+            }
         },
-        variables: {
-            key: update_from_signal(key)
-            for key in ["agent_"+str(i) for i in range(n_agents)]
+        {
+            description: """
+                Update option payoff
+            """,
+            policies: {}, # Ignore for now
+            # State variables
+            variables: {
+                'discounted_payoff': options.update_discounted_payoff,
+            }
         },
-    },
-]
+        {
+            description: """
+                Agent shenanigans
+            """,
+            policies: {
+                "agent_actions": agents.policy_agents,
+            },
+            variables: {
+                key: update_from_signal(key, optional_update=True)
+                for key in agent_keys
+            },
+        },
+    ]
+    if position_ledger:
+        state_update_blocks.append(
+            {
+                description: """
+                    Multi-position option market, enabled using the `position_ledger` System Parameter
+                """,
+                policies: {
+                    "positions": positions.policy_positions,
+                },
+                variables: {
+                    "positions": update_from_signal("positions", optional_update=True),
+                },
+            }
+        )
+    if loan_book:
+        state_update_blocks.append(
+            {
+                description: """
+                    NFT floor price and loan book, enabled using the `loan_book` System Parameter
+                """,
+                policies: {
+                    "loans": loans.policy_loans,
+                },
+                variables: {
+                    "nft_floor_price": update_from_signal("nft_floor_price", optional_update=True),
+                    "loans": update_from_signal("loans", optional_update=True),
+                    **{key: update_from_signal(key, optional_update=True) for key in SUMMARY_STATE_VARIABLES},
+                },
+            }
+        )
+    return state_update_blocks
+
+state_update_blocks = create_state_update_blocks()
@@ -12,6 +12,8 @@ from model.types import (
     StableAssetUnits,
 )
 from model.utils import default
+from model.ledger import PositionLedger
+from model.loans import LoanBook
 
 
 @dataclass
@@ -34,4 +36,56 @@ class StateVariables:
     """ rf"""
 
 
-initial_state = StateVariables().__dict__
+@dataclass
+class PositionLedgerStateVariables:
+    """## Multi-Position Market State Variables
+    State Variables of the multi-position option market, only added to the Initial State when enabled,
+    see `create_initial_state(...)`.
+    """
+
+    positions: PositionLedger = None
+    """The ledger of option positions of the multi-position market, set up in `model.initialization`, see `model.parts.positions`."""
+
+
+@dataclass
+class LoanBookStateVariables:
+    """## Loan Book State Variables
+    State Variables of the NFT-collateralized loan book, only added to the Initial State when enabled,
+    see `create_initial_state(...)`.
+    """
+
+    nft_floor_price: USD = 20_000
+    """The NFT floor price, the value of loan collateral, updated in `model.parts.loans`."""
+    loans: LoanBook = None
+    """The book of active NFT-collateralized loans, set up in `model.initialization`, see `model.parts.loans`."""
+    loans_active: int = 0
+    """Number of active loans in the loan book, updated in `model.parts.loans`."""
+    loans_repaid: int = 0
+    """Cumulative number of repaid loans."""
+    loans_foreclosed: int = 0
+    """Cumulative number of foreclosed loans."""
+    principal_outstanding: USD = 0
+    """Principal of the active loans."""
+    owed_outstanding: USD = 0
+    """Principal and accrued interest owed on the active loans."""
+    mean_loan_to_value: Percentage = np.nan
+    """Mean loan-to-value of the active loans, at the `nft_floor_price`."""
+    underwater_loans: int = 0
+    """Number of active loans owing more than the value of their collateral."""
+    lender_pnl: USD = 0
+    """Cumulative lender PnL of repaid and foreclosed loans, see `model.loans.LoanBook.summary(...)`."""
+
+
+def create_initial_state(position_ledger=False, loan_book=False) -> dict:
+    """Create the Initial State, including the State Variables of the multi-position option market and loan book
+    if `position_ledger` and `loan_book` are enabled,
+    matching the State Update Blocks of `model.state_update_blocks.create_state_update_blocks(...)`"""
+    initial_state = StateVariables().__dict__
+    if position_ledger:
+        initial_state.update(PositionLedgerStateVariables().__dict__)
+    if loan_book:
+        initial_state.update(LoanBookStateVariables().__dict__)
+    return initial_state
+
+
+initial_state = create_initial_state()
@@ -3,9 +3,12 @@ Helper functions to generate stochastic environmental processes
 that are then passed in as System Parameters used by for example the `model.parts.price_processes` module.
 """
 
+import sys
+import weakref
+from dataclasses import dataclass, field
+from typing import Optional
+
 import numpy as np
-import pandas as pd
-from stochastic import processes
 
 import experiments.simulation_configuration as simulation
 from experiments.utils import rng_generator
@@ -22,6 +25,8 @@ def geometric_brownian_motion_process(
 
     See https://stochastic.readthedocs.io/en/latest/continuous.html
     """
+    from stochastic import processes
+
     mu = kwargs.get("mu")
     sigma = kwargs.get("sigma")
     initial_price = kwargs.get("initial_price", 1) or 1
@@ -29,7 +34,8 @@ def geometric_brownian_motion_process(
     process = processes.continuous.GeometricBrownianMotion(
         drift=mu, volatility=sigma, t=simulation.DELTA_TIME, rng=rng,
     )
-    price_samples = process.sample(timesteps * dt + 1, initial=initial_price)
+    # The samples following the initial price, see `create_stochastic_process_realizations(...)`
+    price_samples = process.sample(timesteps * dt, initial=initial_price)[1:]
 
     return price_samples
 
@@ -39,14 +45,17 @@ def manual_gbm_process(
     dt=simulation.DELTA_TIME,
     rng=np.random.default_rng(1),
     run=0,
+    seed=None,
     **kwargs,
 ):
     """## Configure Geometric Brownian Motion process
     > A geometric Brownian motion S_t is the analytic solution to the stochastic differential equation with Wiener process...
     """
     
-    # NOTE: set separately from rng_generator
-    np.random.seed(run)
+    # NOTE: seeded separately from rng_generator, using a legacy RNG seeded with the run,
+    # which draws the same samples as `np.random.seed(run)` without reseeding the global RNG,
+    # or with the run and `seed` if given
+    random_state = np.random.RandomState(run if seed is None else [seed, run])
 
     T = timesteps / 365.0  # Business days in a year
     dt_ = T / timesteps  # 4.0 is needed as four prices per day are required
@@ -57,7 +66,7 @@ def manual_gbm_process(
 
     asset_path = np.exp(
         (mu - sigma**2 / 2) * dt_ +
-        sigma * np.random.normal(0, np.sqrt(dt_), size=(timesteps))
+        sigma * random_state.normal(0, np.sqrt(dt_), size=(timesteps))
     )
     
     price_samples = initial_price * asset_path.cumprod()
@@ -79,14 +88,17 @@ def brownian_motion_process(
 
     See https://stochastic.readthedocs.io/en/latest/continuous.html
     """
+    from stochastic import processes
+
     mu = kwargs.get("mu")
     sigma = kwargs.get("sigma")
     initial_price = kwargs.get("initial_price", 1) or 1
 
     process = processes.continuous.BrownianMotion(
-        drift=mu, scale=sigma, t=(timesteps * dt + 1), rng=rng
+        drift=mu, scale=sigma, t=(timesteps * dt), rng=rng
     )
-    price_samples = process.sample(timesteps * dt + 1)
+    # The samples following the initial price, see `create_stochastic_process_realizations(...)`
+    price_samples = process.sample(timesteps * dt)[1:]
     price_samples = [initial_price + z for z in price_samples]
 
     return price_samples
@@ -105,47 +117,518 @@ def gaussian_noise_process(
     See https://stochastic.readthedocs.io/en/latest/noise.html
     """
 
+    from stochastic import processes
+
     mu = kwargs.get("mu")
     sigma = kwargs.get("sigma")
 
     process = processes.noise.GaussianNoise(t=(timesteps * dt), rng=rng)
-    price_samples = process.sample(timesteps * dt + 1)
+    price_samples = process.sample(timesteps * dt)
     price_samples = [mu + sigma * z for z in price_samples]
 
     return price_samples
 
 
+def _run_generators(runs, seed=None):
+    """Independent RNGs for each of `runs` runs, seeded with the run, or with the run and `seed` if given,
+    so that the realization of a run doesn't depend on the number of runs generated"""
+    return [np.random.default_rng(run if seed is None else [seed, run]) for run in range(runs)]
+
+
+def _standard_normals(generators, shape):
+    """Standard normal samples of shape (runs, *shape), drawn from the RNG of each run"""
+    samples = np.empty((len(generators), *shape))
+    for run, rng in enumerate(generators):
+        rng.standard_normal(shape, out=samples[run])
+    return samples
+
+
+def _log_returns_to_prices(log_returns, initial_price):
+    """Price paths of shape (runs, samples), following `initial_price`, from log returns of shape (runs, samples)"""
+    return initial_price * np.exp(np.cumsum(log_returns, axis=1))
+
+
+def heston_process(
+    timesteps=simulation.TIMESTEPS,
+    dt=simulation.DELTA_TIME,
+    runs=1,
+    seed=None,
+    mu=0.0,
+    sigma=0.25,
+    kappa=2.0,
+    theta=None,
+    xi=0.5,
+    rho=-0.5,
+    initial_price=1,
+    **kwargs,
+):
+    """## Configure Heston stochastic volatility process
+    > A GBM whose variance v_t follows a mean-reverting square-root (CIR) process,
+    > dv_t = kappa (theta - v_t) dt + xi sqrt(v_t) dW_t, correlated with the price by `rho`,
+    > which produces volatility clustering, and with `rho` < 0 the leverage effect.
+
+    Starts from a volatility of `sigma`, reverting to a long-run variance `theta`, by default `sigma**2`.
+    Discretized daily with a full truncation Euler scheme for the variance, and a log-Euler scheme for the price.
+
+    Returns:
+        np.ndarray: Price paths of shape (runs, timesteps * dt), following `initial_price`, see `_run_generators(...)` for the seeding of each run
+    """
+    n = timesteps * dt
+    dt_ = 1 / 365
+    theta = sigma**2 if theta is None else theta
+    initial_price = initial_price or 1
+
+    # Shocks in time-major order, so that each step of the variance recursion updates all runs in contiguous memory
+    normals = _standard_normals(_run_generators(runs, seed), (2, n)).transpose(1, 2, 0).copy()
+    price_shocks = normals[0]
+    variance_shocks = rho * price_shocks + np.sqrt(1 - rho**2) * normals[1]
+
+    # Variance and volatility over each day, truncated at 0
+    variance = np.empty((n, runs))
+    volatility = np.empty((n, runs))
+    v = np.full(runs, sigma**2)
+    for t in range(n):
+        np.maximum(v, 0.0, out=variance[t])
+        np.sqrt(variance[t] * dt_, out=volatility[t])
+        v += kappa * (theta - variance[t]) * dt_ + xi * volatility[t] * variance_shocks[t]
+
+    log_returns = (mu - variance / 2) * dt_ + volatility * price_shocks
+    return _log_returns_to_prices(log_returns.T, initial_price)
+
+
+def merton_jump_diffusion_process(
+    timesteps=simulation.TIMESTEPS,
+    dt=simulation.DELTA_TIME,
+    runs=1,
+    seed=None,
+    mu=0.0,
+    sigma=0.25,
+    jump_intensity=10.0,
+    jump_mean=-0.05,
+    jump_std=0.1,
+    initial_price=1,
+    **kwargs,
+):
+    """## Configure Merton jump-diffusion process
+    > A GBM with jumps arriving as a Poisson process of `jump_intensity` jumps per year,
+    > each multiplying the price by a lognormal factor with log mean `jump_mean` and log standard deviation `jump_std`.
+
+    The drift is compensated for the expected jump, so that `mu` remains the expected rate of return.
+
+    Returns:
+        np.ndarray: Price paths of shape (runs, timesteps * dt), following `initial_price`, see `_run_generators(...)` for the seeding of each run
+    """
+    n = timesteps * dt
+    dt_ = 1 / 365
+    initial_price = initial_price or 1
+    compensator = jump_intensity * (np.exp(jump_mean + jump_std**2 / 2) - 1)
+
+    generators = _run_generators(runs, seed)
+    normals = _standard_normals(generators, (2, n))
+    jumps = np.stack([rng.poisson(jump_intensity * dt_, n) for rng in generators])
+
+    log_returns = (
+        (mu - sigma**2 / 2 - compensator) * dt_
+        + sigma * np.sqrt(dt_) * normals[:, 0]
+        # The sum of `jumps` normal log jump sizes
+        + jumps * jump_mean
+        + np.sqrt(jumps) * jump_std * normals[:, 1]
+    )
+    return _log_returns_to_prices(log_returns, initial_price)
+
+
+def regime_switching_gbm_process(
+    timesteps=simulation.TIMESTEPS,
+    dt=simulation.DELTA_TIME,
+    runs=1,
+    seed=None,
+    mu=(0.5, -0.5),
+    sigma=(0.5, 1.0),
+    transition_matrix=((0.98, 0.02), (0.05, 0.95)),
+    initial_regime=0,
+    initial_price=1,
+    **kwargs,
+):
+    """## Configure regime-switching Geometric Brownian Motion process
+    > A GBM whose drift `mu` and volatility `sigma` switch between market regimes, e.g. bull and bear markets,
+    > following a Markov chain with daily regime `transition_matrix` probabilities.
+
+    `mu` and `sigma` are the parameters of each regime, or a single value for all regimes.
+
+    Returns:
+        np.ndarray: Price paths of shape (runs, timesteps * dt), following `initial_price`, see `_run_generators(...)` for the seeding of each run
+    """
+    n = timesteps * dt
+    dt_ = 1 / 365
+    initial_price = initial_price or 1
+    cumulative_transitions = np.cumsum(np.asarray(transition_matrix, dtype=float), axis=1)
+    n_regimes = len(cumulative_transitions)
+    mu = np.broadcast_to(np.asarray(mu, dtype=float), n_regimes)
+    sigma = np.broadcast_to(np.asarray(sigma, dtype=float), n_regimes)
+
+    generators = _run_generators(runs, seed)
+    normals = _standard_normals(generators, (n,))
+    # Time-major, so that each step of the Markov chain updates all runs in contiguous memory
+    uniforms = np.stack([rng.random(n) for rng in generators], axis=1)
+
+    regimes = np.empty((n, runs), dtype=np.intp)
+    regime = np.full(runs, initial_regime, dtype=np.intp)
+    for t in range(n):
+        regimes[t] = regime
+        # The next regime, from the cumulative transition probabilities of the current regime
+        regime = np.minimum((uniforms[t, :, None] >= cumulative_transitions[regime]).sum(axis=1), n_regimes - 1)
+    regimes = regimes.T
+
+    log_returns = (mu[regimes] - sigma[regimes] ** 2 / 2) * dt_ + sigma[regimes] * np.sqrt(dt_) * normals
+    return _log_returns_to_prices(log_returns, initial_price)
+
+
+def _historical_prices(prices=None, path=None, column=None, date_column=None, cache_dir=None):
+    """The historical price series `prices`, or loaded from the file `path`, see `model.historical_prices`"""
+    if (prices is None) == (path is None):
+        raise ValueError("Exactly one of a historical price series or the path of a price series file is required")
+    if path is not None:
+        from model.historical_prices import load_price_series
+
+        # A plain array view of the memory-mapped cache
+        return np.asarray(load_price_series(path, column=column, date_column=date_column, cache_dir=cache_dir))
+    return np.asarray(prices, dtype=float)
+
+
+def historical_replay_process(
+    timesteps=simulation.TIMESTEPS,
+    dt=simulation.DELTA_TIME,
+    runs=1,
+    seed=None,
+    prices=None,
+    path=None,
+    column=None,
+    date_column=None,
+    cache_dir=None,
+    initial_price=None,
+    **kwargs,
+):
+    """## Configure historical price replay
+    > Replays a historical price series, e.g. daily closing prices, one price per sample.
+
+    The series is given as `prices`, or loaded from a CSV or Parquet file `path` through a memory-mapped cache,
+    see `model.historical_prices.load_price_series(...)`.
+    Each run replays a window of the series, with the windows of the runs evenly spaced over the series,
+    so that runs cover different market periods, and rescaled so that the first price of the window is `initial_price`, if given.
+
+    Returns:
+        np.ndarray: Price paths of shape (runs, timesteps * dt), following the first price of each window
+    """
+    history = _historical_prices(prices, path, column, date_column, cache_dir)
+    n = timesteps * dt + 1
+    if len(history) < n:
+        raise ValueError(f"The price series of {len(history)} prices is shorter than the {n} prices of a run")
+
+    starts = np.linspace(0, len(history) - n, runs).round().astype(int)
+    paths = history[starts[:, None] + np.arange(n)]
+    if initial_price:
+        paths *= initial_price / paths[:, :1]
+    return paths[:, 1:]
+
+
+def block_bootstrap_process(
+    timesteps=simulation.TIMESTEPS,
+    dt=simulation.DELTA_TIME,
+    runs=1,
+    seed=None,
+    prices=None,
+    path=None,
+    column=None,
+    date_column=None,
+    cache_dir=None,
+    block_length=20,
+    stationary=True,
+    initial_price=None,
+    **kwargs,
+):
+    """## Configure block bootstrap of historical returns
+    > Resamples blocks of consecutive historical log returns, preserving their distribution,
+    > including fat tails, and their short-range dependence, e.g. volatility clustering.
+
+    With `stationary=True`, the stationary bootstrap of Politis and Romano, with block lengths geometrically distributed
+    with a mean of `block_length` samples, otherwise the moving block bootstrap, with blocks of `block_length` samples,
+    with blocks wrapping around the end of the series.
+    The series is given as `prices`, or loaded from a file `path`, see `historical_replay_process(...)`,
+    and paths follow `initial_price`, by default the last historical price.
+
+    Returns:
+        np.ndarray: Price paths of shape (runs, timesteps * dt), following `initial_price`, see `_run_generators(...)` for the seeding of each run
+    """
+    history = _historical_prices(prices, path, column, date_column, cache_dir)
+    returns = np.diff(np.log(history))
+    n = timesteps * dt
+    steps = np.arange(n)
+
+    generators = _run_generators(runs, seed)
+    # The historical return each block starts from, drawn for every sample, and used for samples that start a block
+    block_starts = np.stack([rng.integers(0, len(returns), n) for rng in generators])
+    if stationary:
+        starts_block = np.stack([rng.random(n) for rng in generators]) < 1 / block_length
+        starts_block[:, 0] = True
+    else:
+        starts_block = np.broadcast_to(steps % block_length == 0, (runs, n))
+
+    # The sample starting the block of each sample, and the historical return of each sample
+    block_first = np.maximum.accumulate(np.where(starts_block, steps, 0), axis=1)
+    indices = (np.take_along_axis(block_starts, block_first, axis=1) + steps - block_first) % len(returns)
+    return _log_returns_to_prices(returns[indices], initial_price or history[-1])
+
+
+BATCHED_PROCESSES = {
+    "heston_process": heston_process,
+    "merton_jump_diffusion_process": merton_jump_diffusion_process,
+    "regime_switching_gbm_process": regime_switching_gbm_process,
+    "historical_replay_process": historical_replay_process,
+    "block_bootstrap_process": block_bootstrap_process,
+}
+"""Processes generating the realizations of all runs at once, as an array of shape (runs, samples)"""
+
+
+UNSEEDED_PROCESSES = ("geometric_brownian_motion_process", "brownian_motion_process", "gaussian_noise_process")
+"""Processes drawing from the global `experiments.utils.rng_generator()` sequence when no seed is given,
+so that their realizations depend on the processes previously generated"""
+
+
+@dataclass(frozen=True)
+class ProcessSpec:
+    """## Process specification
+    A picklable specification of the realizations of a stochastic process,
+    generated using `create_stochastic_process_realizations(...)`, e.g.
+    `ProcessSpec("manual_gbm_process", runs=10, parameters={"mu": 0.1, "sigma": 0.25, "initial_price": 2000})`.
+
+    The realizations are a deterministic function of the specification, so they can be regenerated anywhere from it,
+    unless the specification is of a process of `UNSEEDED_PROCESSES` without a `seed`, see `deterministic`.
+    """
+
+    process: str
+    """Process name, see `create_stochastic_process_realizations(...)`"""
+    timesteps: int = simulation.TIMESTEPS
+    """Number of timesteps"""
+    dt: int = simulation.DELTA_TIME
+    """Simulation timestep unit of time, in days"""
+    runs: int = 1
+    """Number of Monte Carlo runs, i.e. realizations"""
+    seed: Optional[int] = None
+    """Seed of the realizations, combined with the run, or `None` for the default seeding of each process"""
+    parameters: dict = field(default_factory=dict)
+    """Process parameters, e.g. `mu`, `sigma` and `initial_price`"""
+
+    @property
+    def deterministic(self) -> bool:
+        """Whether the realizations are a deterministic function of the specification"""
+        return self.seed is not None or self.process not in UNSEEDED_PROCESSES
+
+    def generate(self) -> np.ndarray:
+        """Generate the realizations, an array of shape (runs, samples)"""
+        return np.array(
+            create_stochastic_process_realizations(
+                self.process, timesteps=self.timesteps, dt=self.dt, runs=self.runs, seed=self.seed, **self.parameters
+            ),
+            dtype=float,
+        )
+
+
+STORAGES = (None, "shared_memory", "memmap")
+"""Storage of the samples of a `SampledProcess`: in process memory, in a shared memory block, or in a memory-mapped file"""
+
+
+def _attach_shared_memory(name):
+    """Attach to an existing shared memory block without registering it with the resource tracker,
+    which would otherwise unlink it when the attaching worker process exits, see https://bugs.python.org/issue38119"""
+    from multiprocessing import resource_tracker, shared_memory
+
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _release_shared_memory(shared_memory, unlink):
+    try:
+        shared_memory.close()
+    except BufferError:
+        # Views of the samples are still referenced, and the mapping is released when the process exits
+        pass
+    if unlink:
+        try:
+            shared_memory.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SampledProcess:
+    """## Sampled process
+    A process that returns pre-generated samples, e.g. from `create_stochastic_process_realizations(...)`,
+    for a given run and timestep, used as the `volatile_asset_price_process` System Parameter.
+
+    The samples are read-only, so the process is shared rather than copied when radCAD deep-copies the System Parameters
+    of each run and subset, which allows a single set of samples to be reused across a parameter sweep.
+
+    Rather than `samples`, a `generate` function or a `ProcessSpec` can be passed, to generate the samples on first use,
+    so that defining the process, e.g. in the default System Parameters, does no work at import time.
+
+    With `storage="shared_memory"`, or `storage="memmap"` and a `.npy` file `path`, the samples are stored once,
+    in a `multiprocessing.shared_memory` block or a memory-mapped file, and the process is pickled
+    (e.g. for each run sent to a worker process by a multiprocessing backend) as a handle to the samples
+    that workers attach to, rather than as a copy of the samples.
+    A shared memory block is unlinked when the process that created it is garbage collected or exits,
+    and a worker that can't attach to it, e.g. on another node, regenerates the samples from the `spec`,
+    if they are a deterministic function of it, see `ProcessSpec.deterministic`.
+    """
+
+    def __init__(self, samples=None, generate=None, spec: ProcessSpec = None, storage=None, path=None):
+        if sum(argument is not None for argument in (samples, generate, spec)) != 1:
+            raise ValueError("Exactly one of samples, a function to generate them, or a process specification is required")
+        if storage not in STORAGES:
+            raise ValueError(f"Unknown storage {storage}, one of {STORAGES}")
+        if (storage == "memmap") != (path is not None):
+            raise ValueError("A file path is required for, and only used by, memory-mapped storage")
+        self.spec = spec
+        self.storage = storage
+        self.path = path
+        self._shared_memory = None
+        self._samples = None if samples is None else self._read_only(samples)
+        self._generate = spec.generate if spec is not None else generate
+        self._stored = False
+
+    @staticmethod
+    def _read_only(samples):
+        samples = np.array(samples, dtype=float)
+        samples.flags.writeable = False
+        return samples
+
+    def _store(self):
+        """Move the samples to their shared storage"""
+        samples = self._samples
+        if self.storage == "shared_memory":
+            from multiprocessing import shared_memory
+
+            self._shared_memory = shared_memory.SharedMemory(create=True, size=max(samples.nbytes, 1))
+            weakref.finalize(self, _release_shared_memory, self._shared_memory, True)
+            stored = np.ndarray(samples.shape, dtype=samples.dtype, buffer=self._shared_memory.buf)
+            stored[...] = samples
+            stored.flags.writeable = False
+            self._samples = stored
+        else:
+            np.save(self.path, samples)
+            self._samples = np.load(self.path, mmap_mode="r")
+        self._stored = True
+
+    @property
+    def samples(self) -> np.ndarray:
+        """The read-only array of samples, generated on first access"""
+        if self._samples is None:
+            self._samples = self._read_only(self._generate())
+            self._generate = None
+        if self.storage and not self._stored:
+            self._store()
+        return self._samples
+
+    def __call__(self, run, timestep):
+        return self.samples[run - 1, timestep]
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __getstate__(self):
+        # Samples are generated and stored before being sent to worker processes, rather than once per worker
+        samples = self.samples
+        if self.storage is None:
+            return {"spec": self.spec, "_samples": samples}
+        return {
+            "spec": self.spec,
+            "storage": self.storage,
+            "path": self.path,
+            "name": self._shared_memory.name if self._shared_memory else None,
+            "shape": samples.shape,
+            "dtype": samples.dtype.str,
+        }
+
+    def __setstate__(self, state):
+        self.spec = state["spec"]
+        self.storage = state.get("storage")
+        self.path = state.get("path")
+        self._shared_memory = None
+        self._generate = None
+        self._stored = self.storage is not None
+        if self.storage is None:
+            self._samples = state["_samples"]
+            return
+        try:
+            if self.storage == "shared_memory":
+                self._shared_memory = _attach_shared_memory(state["name"])
+                weakref.finalize(self, _release_shared_memory, self._shared_memory, False)
+                self._samples = np.ndarray(state["shape"], dtype=state["dtype"], buffer=self._shared_memory.buf)
+                self._samples.flags.writeable = False
+            else:
+                self._samples = np.load(self.path, mmap_mode="r")
+        except FileNotFoundError:
+            if self.spec is None:
+                raise
+            if not self.spec.deterministic:
+                raise RuntimeError(
+                    f"Can't attach to the samples of {self.spec}, "
+                    "and regenerating them without a seed would produce different samples"
+                ) from None
+            self.storage, self.path, self._stored = None, None, False
+            self._samples = self._read_only(self.spec.generate())
+
+
 def create_stochastic_process_realizations(
     process: str,
     timesteps=simulation.TIMESTEPS,
     dt=simulation.DELTA_TIME,
     runs=1,
+    seed=None,
     **kwargs,
 ):
     """## Create stochastic process realizations
 
     Using the stochastic processes defined in `processes` module, create random number generator (RNG) seeds,
     and use RNG to pre-generate samples for number of simulation timesteps.
+
+    If a `seed` is given, the RNG of each run is seeded from the seed and the run,
+    so that the realizations don't depend on previously generated processes.
+
+    The realizations of every process are the `timesteps * dt` samples following the initial price,
+    i.e. sample `i` of a run is the price at time `i + 1`, as sampled by `model.parts.options.update_volatile_asset_price(...)`.
+
+    The processes of `BATCHED_PROCESSES`, e.g. `heston_process`, generate all runs at once, as an array of shape (runs, samples).
     """
-    if process == "geometric_brownian_motion_process":
+    def rng(run):
+        return rng_generator() if seed is None else np.random.default_rng([seed, run])
+
+    if process in BATCHED_PROCESSES:
+        return BATCHED_PROCESSES[process](timesteps=timesteps, dt=dt, runs=runs, seed=seed, **kwargs)
+    elif process == "geometric_brownian_motion_process":
         return [
             geometric_brownian_motion_process(
                 timesteps=timesteps,
                 dt=dt,
-                rng=rng_generator(),
+                rng=rng(run),
                 mu=kwargs.get("mu"),
                 sigma=kwargs.get("sigma"),
                 initial_price=kwargs.get("initial_price"),
             )
-            for _ in range(runs)
+            for run in range(runs)
         ]
     elif process == "manual_gbm_process":
         return [
             manual_gbm_process(
                 timesteps=timesteps,
                 dt=dt,
-                rng=rng_generator(),
+                rng=rng(run),
                 run=run, #NOTE: new param
+                seed=seed,
                 mu=kwargs.get("mu"),
                 sigma=kwargs.get("sigma"),
                 initial_price=kwargs.get("initial_price"),
@@ -157,34 +640,36 @@ def create_stochastic_process_realizations(
             brownian_motion_process(
                 timesteps=timesteps,
                 dt=dt,
-                rng=rng_generator(),
+                rng=rng(run),
                 mu=kwargs.get("mu"),
                 sigma=kwargs.get("sigma"),
                 initial_price=kwargs.get("initial_price"),
             )
-            for _ in range(runs)
+            for run in range(runs)
         ]
     elif process == "gaussian_noise_process":
         return [
             gaussian_noise_process(
                 timesteps=timesteps,
                 dt=dt,
-                rng=rng_generator(),
+                rng=rng(run),
                 mu=kwargs.get("mu"),
                 sigma=kwargs.get("sigma"),
             )
-            for _ in range(runs)
+            for run in range(runs)
         ]
     else:
         raise Exception("Invalid Process")
 
 
-def generate_volatile_asset_price_scenarios() -> pd.DataFrame:
+def generate_volatile_asset_price_scenarios() -> "pd.DataFrame":
     """## Generate Volatile Asset price scenarios
     This function generates a set of Volatile Asset price scenarios across: base, bearish, bullish, high and low volatility market conditions.
 
     NOTE This function is currently not being seeded correctly, which means results are not reproducible.
     """
+    import pandas as pd
+
     # Price trend scenarios
 
     base_price_trend = create_stochastic_process_realizations(
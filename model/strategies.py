@@ -0,0 +1,216 @@
+"""# Agent Strategies
+Heterogeneous agent behavior, where each agent follows one of the strategies of
+`STRATEGIES`, with the share of agents following each strategy set by the
+`agent_strategies` System Parameter, and the parameters of each strategy taken from
+System Parameters.
+
+Each decision of a strategy is a vectorized kernel, evaluated once per timestep for all
+agents (or positions) of the strategy, returning an action mask, so that the cost of a
+timestep doesn't depend on per-agent Python dispatch:
+* `sell(market, n)`: Which of `n` agents list an option for sale
+* `buy(market, n)`: Which of `n` agents buy an option
+* `exercise(market, intrinsic_value, premium)`: Which options, of the given intrinsic
+  values and premiums paid, are exercised
+
+Used in `model.parts.agents` and `model.parts.positions`, see `Population` and
+`run_population(...)`.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+from model.utils import run_rng
+
+
+class Market(NamedTuple):
+    """## Market
+    Market conditions observed by agent strategies at a timestep
+    """
+
+    timestep: int
+    underlying_price: float
+    option_price: float
+    """BSM price of a new option, i.e. the premium a buyer pays"""
+    volatility: float
+    """Estimated BSM volatility, see `model.parts.agents.estimate_volatility(...)`"""
+
+
+class RandomStrategy:
+    """## Random Strategy
+    The default agent behavior: each timestep an agent lists an option with probability
+    `p_sell`, buys an option with probability `p_buy`, and exercises an option in profit
+    with probability `p_exercise`.
+    """
+
+    def __init__(self, params):
+        self.p_buy = params["p_buy"]
+        self.p_sell = params["p_sell"]
+        self.p_exercise = params["p_exercise"]
+        self.rng = run_rng(params)
+
+    def sell(self, market: Market, n: int) -> np.ndarray:
+        """Return the mask of `n` agents listing an option for sale, each with
+        probability `p_sell`"""
+        return self.rng.random(n) < self.p_sell
+
+    def buy(self, market: Market, n: int) -> np.ndarray:
+        """Return the mask of `n` agents buying an option, each with probability
+        `p_buy`"""
+        return self.rng.random(n) < self.p_buy
+
+    def exercise(self, market: Market, intrinsic_value, premium) -> np.ndarray:
+        """Return the mask of options exercised, each option in profit with probability
+        `p_exercise`"""
+        return (intrinsic_value > premium) & (
+            self.rng.random(len(premium)) < self.p_exercise
+        )
+
+
+class ThresholdExerciser(RandomStrategy):
+    """## Threshold Exerciser
+    Lists and buys options at random, and exercises as soon as the intrinsic value of an
+    option exceeds the premium paid by a margin of `exercise_threshold`, e.g. 0.5 for a
+    50% return.
+    """
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.exercise_threshold = params["exercise_threshold"]
+
+    def exercise(self, market: Market, intrinsic_value, premium) -> np.ndarray:
+        return intrinsic_value > (1 + self.exercise_threshold) * premium
+
+
+class PremiumSensitiveBuyer(RandomStrategy):
+    """## Premium-Sensitive Buyer
+    Only buys options with probability `p_buy` while the premium is at most
+    `max_premium` of the underlying price, otherwise behaves like `RandomStrategy`.
+    """
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.max_premium = params["max_premium"]
+
+    def buy(self, market: Market, n: int) -> np.ndarray:
+        if market.option_price > self.max_premium * market.underlying_price:
+            return np.zeros(n, dtype=bool)
+        return super().buy(market, n)
+
+
+class VolatilitySeller(RandomStrategy):
+    """## Volatility Seller
+    Sells options, collecting their premium, with probability `p_sell` while the
+    estimated volatility is at least `volatility_threshold`, and never buys options.
+    """
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.volatility_threshold = params["volatility_threshold"]
+
+    def sell(self, market: Market, n: int) -> np.ndarray:
+        if market.volatility < self.volatility_threshold:
+            return np.zeros(n, dtype=bool)
+        return super().sell(market, n)
+
+    def buy(self, market: Market, n: int) -> np.ndarray:
+        return np.zeros(n, dtype=bool)
+
+
+STRATEGIES = {
+    "random": RandomStrategy,
+    "threshold_exerciser": ThresholdExerciser,
+    "premium_sensitive_buyer": PremiumSensitiveBuyer,
+    "volatility_seller": VolatilitySeller,
+}
+"""Agent strategies by name, as used in the `agent_strategies` System Parameter"""
+
+
+def assign_strategies(agent_strategies: dict, n_agents: int) -> np.ndarray:
+    """Assign each of `n_agents` agents a strategy, returning the index of the strategy
+    in `agent_strategies` of each agent
+
+    Strategies are assigned to contiguous ranges of agent indices in the order of
+    `agent_strategies`, a mapping of strategy names to the share of agents following
+    them, rounded to whole agents.
+    """
+    unknown = set(agent_strategies) - set(STRATEGIES)
+    if unknown:
+        raise ValueError(
+            f"Unknown agent strategies {sorted(unknown)}, one of {list(STRATEGIES)}"
+        )
+    shares = np.array(list(agent_strategies.values()), dtype=float)
+    if len(shares) == 0 or (shares < 0).any() or shares.sum() <= 0:
+        raise ValueError(
+            "Agent strategy shares must be non-negative, with a positive total"
+        )
+    bounds = np.round(np.cumsum(shares) / shares.sum() * n_agents).astype(int)
+    return np.repeat(np.arange(len(shares)), np.diff(bounds, prepend=0)).astype(np.int8)
+
+
+class Population:
+    """## Population
+    The agents of a simulation grouped by strategy, see `assign_strategies(...)`.
+
+    Each method evaluates the kernel of every strategy once for all of its agents (or
+    positions), and returns a combined action mask. A population of a single strategy
+    draws the same random numbers as a single vectorized draw for all agents.
+    """
+
+    def __init__(self, agent_strategies: dict, params: dict, n_agents: int):
+        self.strategies = [STRATEGIES[name](params) for name in agent_strategies]
+        self.strategy_of = assign_strategies(agent_strategies, n_agents)
+        self.n_agents = n_agents
+        self._groups = [
+            np.flatnonzero(self.strategy_of == index)
+            for index in range(len(self.strategies))
+        ]
+
+    @classmethod
+    def from_params(cls, params: dict, n_agents: int):
+        """Create the population of `n_agents` agents from the `agent_strategies` and
+        strategy System Parameters"""
+        return cls(params["agent_strategies"], params, n_agents)
+
+    def sell(self, market: Market) -> np.ndarray:
+        """Return the mask of agents listing an option for sale"""
+        mask = np.zeros(self.n_agents, dtype=bool)
+        for strategy, agents in zip(self.strategies, self._groups):
+            mask[agents] = strategy.sell(market, len(agents))
+        return mask
+
+    def buy(self, market: Market) -> np.ndarray:
+        """Return the mask of agents buying an option"""
+        mask = np.zeros(self.n_agents, dtype=bool)
+        for strategy, agents in zip(self.strategies, self._groups):
+            mask[agents] = strategy.buy(market, len(agents))
+        return mask
+
+    def exercise(self, market: Market, holders, intrinsic_value, premium) -> np.ndarray:
+        """Return the mask of options exercised, given the agent index of the holder,
+        intrinsic value and premium paid of each"""
+        holders = np.asarray(holders)
+        intrinsic_value = np.broadcast_to(intrinsic_value, holders.shape)
+        premium = np.broadcast_to(premium, holders.shape)
+        mask = np.zeros(len(holders), dtype=bool)
+        if len(self.strategies) == 1:
+            mask[:] = self.strategies[0].exercise(market, intrinsic_value, premium)
+            return mask
+        strategy_of = self.strategy_of[holders]
+        for index, strategy in enumerate(self.strategies):
+            rows = np.flatnonzero(strategy_of == index)
+            if len(rows):
+                mask[rows] = strategy.exercise(
+                    market, intrinsic_value[rows], premium[rows]
+                )
+        return mask
+
+
+def run_population(params: dict, n_agents: int) -> Population:
+    """Return the population of `n_agents` agents of the current run, created on first
+    use and cached in the System Parameters of the run as `population`, like its random
+    number generator, see `model.utils.run_rng(...)`"""
+    population = params.get("population")
+    if population is None or population.n_agents != n_agents:
+        population = params["population"] = Population.from_params(params, n_agents)
+    return population
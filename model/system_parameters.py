@@ -1,5 +1,5 @@
 # +
-from typing import Dict, List
+from typing import Dict, List, Optional
 import experiments.simulation_configuration as simulation
 
 import numpy as np
@@ -17,7 +17,8 @@ from model.types import (
     APR,
     Agent,
 )
-from model.stochastic_processes import create_stochastic_process_realizations
+from model.stochastic_processes import ProcessSpec, SampledProcess
+from model.pricing import OptionPriceSurface
 # -
 
 timesteps = simulation.TIMESTEPS
@@ -49,25 +50,53 @@ mu = market_conditions[scenario]['mu']
 sigma = market_conditions[scenario]['sigma']
 # -
 
-volatile_asset_price_samples = create_stochastic_process_realizations(
-    "manual_gbm_process",#"geometric_brownian_motion_process",
+def create_volatile_asset_price_process(
+    scenario=scenario,
     timesteps=timesteps,
+    runs=monte_carlo_runs,
     dt=dt,
-    mu=mu,
-    sigma=sigma,
     initial_price=initial_price,
-    runs=monte_carlo_runs,
-)
+    process="manual_gbm_process",
+    **process_parameters,
+) -> SampledProcess:
+    """Create the volatile asset price process of a market `scenario`, one of `market_conditions`,
+    with price paths for `runs` Monte Carlo runs of `timesteps` timesteps, generated on first use rather than when created,
+    and stored in shared memory, so that worker processes attach to a single copy of the price paths
+
+    `process` is any process of `model.stochastic_processes.create_stochastic_process_realizations(...)`,
+    e.g. `heston_process`, with `process_parameters` in addition to the `mu` and `sigma` of the scenario,
+    e.g. `create_volatile_asset_price_process("Bear", process="merton_jump_diffusion_process", jump_intensity=20)`.
+    """
+    if scenario not in market_conditions:
+        raise ValueError(f"Unknown market scenario {scenario}, one of {list(market_conditions)}")
+    return SampledProcess(
+        spec=ProcessSpec(
+            process,
+            timesteps=timesteps,
+            dt=dt,
+            runs=runs,
+            parameters={
+                "mu": market_conditions[scenario]['mu'],
+                "sigma": market_conditions[scenario]['sigma'],
+                "initial_price": initial_price,
+                **process_parameters,
+            },
+        ),
+        storage="shared_memory",
+    )
+
+
+def create_agents(n_agents=n_agents) -> Dict[str, Agent]:
+    """Create a distribution of `n_agents` default agents, keyed by their `agent_{id}` State Variable key"""
+    agents = [Agent(agent_id=str(i)) for i in range(n_agents)]
+    return {agent.key: agent for agent in agents}
 
-# +
-agent_sweep = [
-    [Agent(agent_id=str(i)) for i in range(n_agents)],
-]
 
-# Generate Agent Deposit IDs
+volatile_asset_price_process = create_volatile_asset_price_process()
+
+# +
 agent_sweep = [
-    {agent.key: agent for agent in distribution}
-    for distribution in agent_sweep
+    create_agents(n_agents),
 ]
 agent_keys = list(agent_sweep[0].keys())
 
@@ -106,8 +135,17 @@ class Parameters:
     Used by `model.utils` `update_timestamp(...)` State Update Function.
     """
 
+    seed: List[int] = default([1])
+    """
+    Seed of the random number generator of each run, from which the generator is seeded
+    together with the simulation, subset and run indices, so that the results of a run
+    don't depend on the process or order it is executed in.
+
+    Used in `model.initialization.setup_initial_state(...)`, see `model.utils.run_rng(...)`.
+    """
+
     volatile_asset_price_process: List[Callable[[Run, Timestep], USD]] = default(
-        [lambda run, timestep: volatile_asset_price_samples[run - 1][timestep]]
+        [volatile_asset_price_process]
     )
     """
     A process that returns the volatile asset spot price at each timestep.
@@ -131,7 +169,134 @@ class Parameters:
     """
     Option Type, put, call or straddle
     """
+
+    option_pricing_surface: List[Optional[OptionPriceSurface]] = default([None])
+    """
+    An optional precomputed option price surface, used to look up option prices by interpolation
+    instead of evaluating the closed-form Black-Scholes-Merton price every timestep.
+
+    By default set to `None`, using the closed-form price.
+
+    Used in `model.parts.agents`, see `model.pricing.OptionPriceSurface`.
+    """
     
+    agent_strategies: List[Dict[str, Percentage]] = default([{"random": 1.0}])
+    """
+    The share of agents following each agent strategy, by strategy name,
+    e.g. `{"random": 0.5, "threshold_exerciser": 0.25, "volatility_seller": 0.25}`.
+
+    Used in `model.parts.agents` and `model.parts.positions`, see `model.strategies.STRATEGIES`.
+    """
+
+    p_buy: List[Percentage] = default([0.05])
+    """
+    Probability of an agent buying an option each timestep
+    """
+
+    p_sell: List[Percentage] = default([0.05])
+    """
+    Probability of an agent listing an option for sale each timestep
+    """
+
+    p_exercise: List[Percentage] = default([0.05])
+    """
+    Probability of an agent exercising an option in profit each timestep
+    """
+
+    exercise_threshold: List[Percentage] = default([0.5])
+    """
+    Return on the premium paid at which agents of the `threshold_exerciser` strategy exercise an option
+    """
+
+    max_premium: List[Percentage] = default([0.05])
+    """
+    Maximum premium, as a fraction of the underlying price, that agents of the `premium_sensitive_buyer` strategy pay
+    """
+
+    volatility_threshold: List[Percentage] = default([0.5])
+    """
+    Minimum estimated volatility at which agents of the `volatility_seller` strategy sell options
+    """
+
+    position_ledger: List[bool] = default([False])
+    """
+    Enable the multi-position option market, where agents can hold many concurrent and sequential options,
+    recorded in the `positions` State Variable ledger.
+    The State Update Block and State Variable of the market are only part of the model when enabled
+    at the time the model is built, see `experiments.default_experiment.configure_model(...)`.
+
+    Used in `model.parts.positions`.
+    """
+
+    position_tenor: List[Timestep] = default([30])
+    """
+    Number of timesteps from filling the order of a position to its expiry in the multi-position option market
+    """
+
+    position_moneyness: List[Percentage] = default([1.0])
+    """
+    Strike price of positions in the multi-position option market, as a multiple of the spot price at opening
+    """
+
+    position_order_lifetime: List[Timestep] = default([7])
+    """
+    Number of timesteps an order of the multi-position option market can be filled for after it is created,
+    after which it expires unfilled and the seller's collateral can be withdrawn
+    """
+
+    p_cancel: List[Percentage] = default([0.01])
+    """
+    Probability of a seller cancelling each of their listed orders each timestep in the multi-position option market
+    """
+
+    p_withdraw: List[Percentage] = default([0.05])
+    """
+    Probability of a seller withdrawing the collateral of each of their expired or exercised positions each timestep
+    in the multi-position option market
+    """
+
+    loan_book: List[bool] = default([False])
+    """
+    Enable the NFT-collateralized loan book, recorded in the `loans` State Variable,
+    with NFT collateral valued at the `nft_floor_price` State Variable,
+    and loan book health metrics recorded in the State Variables of `model.loans.SUMMARY_STATE_VARIABLES`.
+
+    The State Update Block and State Variables of the loan book are only part of the model when enabled
+    at the time the model is built, see `experiments.default_experiment.configure_model(...)`.
+
+    radCAD copies the `loans` State Variable into every row of the results, at 69 bytes per active loan,
+    e.g. about 250 MB per run of 365 timesteps with 10,000 active loans.
+    Closed loans are compacted out of the book each timestep, so the cost only grows with the number of active loans,
+    about `initial_loans` plus `loan_origination_rate` times the mean loan duration.
+
+    Used in `model.parts.loans`, see `model.loans.LoanBook`.
+    """
+
+    initial_loans: List[int] = default([10_000])
+    """
+    Number of active loans in the loan book at the start of the simulation, originated up to a loan duration before it
+    """
+
+    loan_origination_rate: List[float] = default([100.0])
+    """
+    Average number of loans originated per timestep
+    """
+
+    p_repay: List[Percentage] = default([0.05])
+    """
+    Probability of a borrower repaying a loan worth repaying, i.e. with a loan-to-value below 1, each timestep before its maturity
+    """
+
+    nft_floor_beta: List[float] = default([1.2])
+    """
+    Sensitivity (beta) of NFT floor price returns to volatile asset price returns
+    """
+
+    nft_floor_volatility: List[Percentage] = default([0.5])
+    """
+    Annualized volatility of the idiosyncratic NFT floor price returns, in addition to those due to the volatile asset price
+    """
+
     # Agents configuration
     agents: List[Dict[str, Agent]] = default(agent_sweep)
     """
@@ -3,16 +3,18 @@
 Various Python types used in the model
 """
 
+import os
 import numpy as np
 import sys
+from operator import attrgetter
 
 # See https://docs.python.org/3/library/dataclasses.html
 from dataclasses import dataclass
 from enforce_typing import enforce_types
-from typing import Union, List, Dict
+from typing import Union, List, Dict, Optional
 from abc import ABCMeta, abstractmethod
 from datetime import datetime
-from scipy.stats import norm
+from scipy.special import ndtr
 
 # If Python version is greater than equal to 3.8, import from typing module
 # Else also import from typing_extensions module
@@ -39,116 +41,153 @@ VolatileAssetUnits = Union[int, float]
 StableAssetUnits = Union[int, float]
 
 
-@enforce_types
-@dataclass(frozen=False)
-class Agent(metaclass=ABCMeta):
-    """## Generic Deposit
+DEBUG = os.environ.get("MODEL_DEBUG", "").lower() in ("1", "true", "yes")
+"""
+Enable debug mode, e.g. using the `MODEL_DEBUG=1` environment variable.
+In debug mode the types of `Agent` fields are validated on construction,
+otherwise validation is only performed at experiment boundaries, see `Agent.validate()`.
+"""
+
+
+class Agent:
+    """## Agent
     A generic option agent
+
+    A low-overhead representation of an agent, using `__slots__` and direct attribute storage,
+    without per-construction type enforcement outside of debug mode (see `DEBUG`).
+
+    Fields are stored using their public names, e.g. `agent.premium_paid`.
+    The underscore-prefixed names of the original dataclass fields, e.g. `agent._premium_paid`,
+    and the `agent.__dict__` mapping of those names to values, remain available for analysis code.
     """
-    
-    # base
 
-    agent_id: str
-    """Agent ID"""
-    
-    _option_side: str = None
-    """Option side"""
-    
-    _has_counterparty: bool = False
-    """Agent is currently engaged in option"""
-    
-    _underwrittenAt: int = None
-    """Timestep when option was underwritten between buyer and seller"""
-    
-    _time_held: int = 0
-    """Time difference between bought and exercised"""
-    
-    # buy side
-    
-    _bought_from_Id: str = None
-    """Id of option seller"""
-    
-    _option_bought_at: int = None
-    """Time at which buyer bought"""
-    
-    _premium_paid: float = 0.0
-    """Premium buyer paid"""
-    
-    _exercised: bool = False
-    """If option is exercised"""
-    
-    _exercisedAt: int = None
-    """Timestep of option exercise"""
-    
-    _payoff_received: USD = 0.0
-    """Current value of payoff for option"""
-    
-    _discounted_payoff_received: USD = 0.0
-    """Present (T0) value of payoff for option"""
-    
-    # sell side
-    
-    _sold_to_Id: str = None
-    """Id of option buyer"""
-    
-    _option_sold_at: int = None
-    """Time at which seller sold"""
-    
-    _accepting_buy_order: bool = False
-    """Agent is currently short an option"""
-    
-    _premium_received: float = 0.0
-    """Premium seller received"""
-    
-    _payoff_paid: USD = 0.0
-    """Current value of payoff for option"""
-    
-    _discounted_payoff_paid: USD = 0.0
-    """Present (T0) value of payoff for option"""
+    fields = {
+        # base
+        "agent_id": str,  # Agent ID
+        "option_side": Optional[str],  # Option side
+        "has_counterparty": bool,  # Agent is currently engaged in option
+        "underwrittenAt": Optional[int],  # Timestep when option was underwritten between buyer and seller
+        "time_held": int,  # Time difference between bought and exercised
+        # buy side
+        "bought_from_Id": Optional[str],  # Id of option seller
+        "option_bought_at": Optional[int],  # Time at which buyer bought
+        "premium_paid": float,  # Premium buyer paid
+        "exercised": bool,  # If option is exercised
+        "exercisedAt": Optional[int],  # Timestep of option exercise
+        "payoff_received": USD,  # Current value of payoff for option
+        "discounted_payoff_received": USD,  # Present (T0) value of payoff for option
+        # sell side
+        "sold_to_Id": Optional[str],  # Id of option buyer
+        "option_sold_at": Optional[int],  # Time at which seller sold
+        "accepting_buy_order": bool,  # Agent is currently short an option
+        "premium_received": float,  # Premium seller received
+        "payoff_paid": USD,  # Current value of payoff for option
+        "discounted_payoff_paid": USD,  # Present (T0) value of payoff for option
+    }
+    """Agent field names and types"""
+
+    __slots__ = tuple(fields)
+
+    def __init__(
+        self,
+        agent_id: str,
+        option_side: str = None,
+        has_counterparty: bool = False,
+        underwrittenAt: int = None,
+        time_held: int = 0,
+        bought_from_Id: str = None,
+        option_bought_at: int = None,
+        premium_paid: float = 0.0,
+        exercised: bool = False,
+        exercisedAt: int = None,
+        payoff_received: USD = 0.0,
+        discounted_payoff_received: USD = 0.0,
+        sold_to_Id: str = None,
+        option_sold_at: int = None,
+        accepting_buy_order: bool = False,
+        premium_received: float = 0.0,
+        payoff_paid: USD = 0.0,
+        discounted_payoff_paid: USD = 0.0,
+        **kwargs,
+    ):
+        self.agent_id = agent_id
+        self.option_side = option_side
+        self.has_counterparty = has_counterparty
+        self.underwrittenAt = underwrittenAt
+        self.time_held = time_held
+        self.bought_from_Id = bought_from_Id
+        self.option_bought_at = option_bought_at
+        self.premium_paid = premium_paid
+        self.exercised = exercised
+        self.exercisedAt = exercisedAt
+        self.payoff_received = payoff_received
+        self.discounted_payoff_received = discounted_payoff_received
+        self.sold_to_Id = sold_to_Id
+        self.option_sold_at = option_sold_at
+        self.accepting_buy_order = accepting_buy_order
+        self.premium_received = premium_received
+        self.payoff_paid = payoff_paid
+        self.discounted_payoff_paid = discounted_payoff_paid
+
+        # Support the underscore-prefixed field names of the original dataclass, e.g. `_premium_paid=...`
+        for key, value in kwargs.items():
+            if key[1:] not in self.fields or not key.startswith("_"):
+                raise TypeError(f"Agent() got an unexpected keyword argument '{key}'")
+            setattr(self, key[1:], value)
+
+        if DEBUG:
+            self.validate()
+
+    def validate(self):
+        """Validate the types of all fields, raising a `TypeError` on mismatch"""
+        for name, allowed_types in _agent_field_types.items():
+            value = getattr(self, name)
+            if not _is_instance(value, allowed_types):
+                raise TypeError(f"Agent field {name} expected type {self.fields[name]}, got {type(value)} ({value!r})")
+        return self
 
-    
     def buy_option(self, sell_agent, timestep, premium):
         """
         Buy option
         """
-        
+
         # buy and sell side recording
         self.option_side = "buy"
         sell_agent.option_side = "sell"
-        
-        self.bought_from_Id = sell_agent.agent_ID
-        sell_agent.sold_to_Id = self.agent_ID
-        
+
+        self.bought_from_Id = sell_agent.agent_id
+        sell_agent.sold_to_Id = self.agent_id
+
         # buy side
         self.has_counterparty = True
         self.underwrittenAt = timestep
         self.option_bought_at = timestep
         self.premium_paid = premium
-        
-        #sell side
+
+        # sell side
         sell_agent.has_counterparty = True
         sell_agent.underwrittenAt = timestep
         sell_agent.option_sold_at = timestep
         sell_agent.premium_received = premium
-        
+
         sell_agent.accepting_buy_order = False
 
         return self
-    
+
     def exercise(self, sell_agent, option, asset_price: USD, timestep: int):
         """
         Exercise an owned option
         """
-        
-        assert timestep <= option.maturity, 'exercising expired option'
-        assert sell_agent.agent_ID == self.bought_from_Id, 'buyer and seller mismatch'
-        
+
+        assert timestep <= option.maturity, "exercising expired option"
+        assert sell_agent.agent_id == self.bought_from_Id, "buyer and seller mismatch"
+
         # instantiate payoff function
         option_payoff = option.payoff()
-        
+
         # get discount factor
-        discount_factor = np.exp(-option.risk_free_rate*((option.maturity-timestep)/365))
-        
+        discount_factor = np.exp(-option.risk_free_rate * ((option.maturity - timestep) / 365))
+
         # buy side
         self.payoff_received = option_payoff(asset_price, option.strike_price)
         self.discounted_payoff_received = discount_factor * self.payoff_received
@@ -158,12 +197,12 @@ class Agent(metaclass=ABCMeta):
         self.time_held = timestep - self.underwrittenAt
         self.option_side = None
         self.has_counterparty = False
-        
+
         # sell side
         sell_agent.payoff_paid = option_payoff(asset_price, option.strike_price)
         sell_agent.discounted_payoff_paid = discount_factor * sell_agent.payoff_paid
         # mark seller also as exercised to exclude from further interactions
-        sell_agent.exercised = True 
+        sell_agent.exercised = True
         sell_agent.exercisedAt = timestep
         sell_agent.time_held = timestep - self.underwrittenAt
         sell_agent.option_side = None
@@ -171,168 +210,100 @@ class Agent(metaclass=ABCMeta):
 
         return self
 
-
     @property
     def key(self) -> str:
-        return "_".join(["agent", self.agent_id])
-    
+        return "agent_" + self.agent_id
+
     @property
     def agent_ID(self):
         """Agent ID"""
         return self.agent_id
 
     @property
-    def has_counterparty(self):
-        """Option is owned"""
-        return self._has_counterparty
-    
-    @has_counterparty.setter
-    def has_counterparty(self, v: bool) -> None:
-        self._has_counterparty = v
-    
-    @property
-    def exercised(self):
-        """Option has been exercised"""
-        return self._exercised
-    
-    @exercised.setter
-    def exercised(self, v: bool) -> None:
-        self._exercised = v
-        
-    @property
-    def exercisedAt(self):
-        """Option has been exercised"""
-        return self._exercisedAt
-    
-    @exercised.setter
-    def exercisedAt(self, v: int) -> None:
-        self._exercisedAt = v
-        
-    @property
-    def underwrittenAt(self):
-        """Option has been activated"""
-        return self._underwrittenAt
-    
-    @exercised.setter
-    def underwrittenAt(self, v: int) -> None:
-        self._underwrittenAt = v
-    
-    @property
-    def time_held(self):
-        """Time exercised option was held"""
-        return self._time_held
-    
-    @time_held.setter
-    def time_held(self, v: int) -> None:
-        self._time_held = v
+    def __dict__(self):
+        """Mapping of the original dataclass field names to values, e.g. `{"agent_id": "0", "_option_side": None, ...}`"""
+        return {_field_name(name): getattr(self, name) for name in self.__slots__}
 
-    @property
-    def payoff_received(self):
-        """Current value of payoff for option"""
-        return self._payoff_received
-    
-    @payoff_received.setter
-    def payoff_received(self, v: USD) -> None:
-        self._payoff_received = v
+    def __getstate__(self):
+        return _agent_state(self)
 
-    @property
-    def discounted_payoff_received(self):
-        """Present (T0) value of payoff for option"""
-        return self._discounted_payoff_received
-    
-    @discounted_payoff_received.setter
-    def discounted_payoff_received(self, v: USD) -> None:
-        self._discounted_payoff_received = v
-        
-    @property
-    def payoff_paid(self):
-        """Current value of payoff for option"""
-        return self._payoff_paid
-    
-    @payoff_paid.setter
-    def payoff_paid(self, v: USD) -> None:
-        self._payoff_paid = v
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
 
-    @property
-    def discounted_payoff_paid(self):
-        """Present (T0) value of payoff for option"""
-        return self._discounted_payoff_paid
-    
-    @discounted_payoff_paid.setter
-    def discounted_payoff_paid(self, v: USD) -> None:
-        self._discounted_payoff_paid = v
-    
-    @property
-    def premium_paid(self):
-        """Premium paid by buyer"""
-        return self._premium_paid
-    
-    @premium_paid.setter
-    def premium_paid(self, v: USD) -> None:
-        self._premium_paid = v
-        
-    @property
-    def premium_received(self):
-        """Premium recieved by seller"""
-        return self._premium_received
-    
-    @premium_received.setter
-    def premium_received(self, v: USD) -> None:
-        self._premium_received = v
-        
-    @property
-    def accepting_buy_order(self):
-        """Option is owned"""
-        return self._accepting_buy_order
-    
-    @accepting_buy_order.setter
-    def accepting_buy_order(self, v: bool) -> None:
-        self._accepting_buy_order = v
-        
-    @property
-    def option_side(self):
-        """Option side"""
-        return self._option_side
-    
-    @option_side.setter
-    def option_side(self, v: str) -> None:
-        self._option_side = v
-        
-    @property
-    def option_bought_at(self):
-        """Option bought at"""
-        return self._option_bought_at
-    
-    @option_bought_at.setter
-    def option_bought_at(self, v: int) -> None:
-        self._option_bought_at = v
-        
-    @property
-    def option_sold_at(self):
-        """Option sold at"""
-        return self._option_sold_at
-    
-    @option_sold_at.setter
-    def option_sold_at(self, v: int) -> None:
-        self._option_sold_at = v
-        
-    @property
-    def bought_from_Id(self):
-        """Id of seller"""
-        return self._bought_from_Id
-    
-    @bought_from_Id.setter
-    def bought_from_Id(self, v: str) -> None:
-        self._bought_from_Id = v
-        
-    @property
-    def sold_to_Id(self):
-        """Id of buyer"""
-        return self._sold_to_Id
-    
-    @sold_to_Id.setter
-    def sold_to_Id(self, v: str) -> None:
-        self._sold_to_Id = v
+    def __copy__(self):
+        agent = Agent.__new__(Agent)
+        agent.__setstate__(self.__getstate__())
+        return agent
+
+    def __deepcopy__(self, memo):
+        # All fields are immutable, so a shallow copy is also a deep copy
+        return self.__copy__()
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.__getstate__() == other.__getstate__()
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"Agent({fields})"
+
+
+def _field_name(name):
+    """Return the original dataclass field name of an `Agent` field, e.g. `premium_paid` -> `_premium_paid`"""
+    return name if name == "agent_id" else "_" + name
+
+
+def _alias(name):
+    """Create a property aliasing the original dataclass field name of an `Agent` field to its attribute"""
+
+    def get(self):
+        return getattr(self, name)
+
+    def set(self, value):
+        setattr(self, name, value)
+
+    return property(get, set, doc=f"Alias of `{name}`")
+
+
+for _name in Agent.__slots__:
+    if _field_name(_name) != _name:
+        setattr(Agent, _field_name(_name), _alias(_name))
+del _name
+
+_agent_state = attrgetter(*Agent.__slots__)
+
+
+def _allowed_types(_type) -> tuple:
+    """Return the tuple of types accepted for a type annotation, supporting `Union`/`Optional`,
+    and accepting Numpy scalars and integers for floats"""
+    if getattr(_type, "__origin__", None) is Union:
+        return sum((_allowed_types(arg) for arg in _type.__args__), ())
+    if _type is float:
+        return (int, float, np.integer, np.floating)
+    if _type is int:
+        return (int, np.integer)
+    return (_type,)
+
+
+def _is_instance(value, allowed_types) -> bool:
+    """Check a value against a tuple of allowed types, where booleans are only valid if `bool` is allowed"""
+    if isinstance(value, bool) and bool not in allowed_types:
+        return False
+    return isinstance(value, allowed_types)
+
+
+_agent_field_types = {name: _allowed_types(_type) for name, _type in Agent.fields.items()}
+
+
+def validate_agents(agents):
+    """Validate the field types of a collection of agents, e.g. at experiment boundaries, see `Agent.validate()`"""
+    for agent in agents:
+        agent.validate()
+    return agents
 
 
 # -
@@ -382,16 +353,16 @@ class Option(metaclass=ABCMeta):
         sigma = self.volatility 
 
         if self.option_type == "call":
-            return (S*norm.cdf(self.d1(S,K,T,r,sigma,t))-
-                    K*np.exp(-r*((T-t+1)/365))*norm.cdf(self.d2(S,K,T,r,sigma,t)))
+            return (S*ndtr(self.d1(S,K,T,r,sigma,t))-
+                    K*np.exp(-r*((T-t+1)/365))*ndtr(self.d2(S,K,T,r,sigma,t)))
         
         if self.option_type == "put":
-            return (K*np.exp(-r*((T-t+1)/365))*norm.cdf(-self.d2(S,K,T,r,sigma,t))-
-                    S*norm.cdf(-self.d1(S,K,T,r,sigma,t)))
+            return (K*np.exp(-r*((T-t+1)/365))*ndtr(-self.d2(S,K,T,r,sigma,t))-
+                    S*ndtr(-self.d1(S,K,T,r,sigma,t)))
         
         if self.option_type == "straddle":
-            return (S*(norm.cdf(self.d1(S,K,T,r,sigma,t)) - norm.cdf(-self.d1(S,K,T,r,sigma,t))) -
-                   K*np.exp(-r*((T-t+1)/365))*(norm.cdf(self.d2(S,K,T,r,sigma,t)) - norm.cdf(-self.d2(S,K,T,r,sigma,t))))
+            return (S*(ndtr(self.d1(S,K,T,r,sigma,t)) - ndtr(-self.d1(S,K,T,r,sigma,t))) -
+                   K*np.exp(-r*((T-t+1)/365))*(ndtr(self.d2(S,K,T,r,sigma,t)) - ndtr(-self.d2(S,K,T,r,sigma,t))))
         
         return 0
     
@@ -10,6 +10,8 @@ import datetime
 from dataclasses import field
 from functools import partial
 
+import numpy as np
+
 
 def _update_from_signal(
     state_variable,
@@ -91,6 +93,13 @@ def local_variables(_locals):
     return {key: _locals[key] for key in [_key for _key in _locals.keys() if "__" not in _key]}
 
 
+def run_rng(params):
+    """Return the random number generator of a run, created from the `seed` System
+    Parameter by `model.initialization.setup_initial_state(...)`, or the global Numpy
+    RNG for policies executed outside of an experiment run, e.g. in tests."""
+    return params.get("rng", np.random)
+
+
 def default(obj):
     """Used and necessary when setting the default value of a dataclass field to a list."""
     return field(default_factory=lambda: copy.copy(obj))
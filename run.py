@@ -2,11 +2,12 @@
 Run file in the root of project directory for execution of simulation with VS Code Python debugger attached.
 
 Create a VS Code launch.json file from the template and place in .vscode/ directory to configure debugger.
+
+Accepts the same flags as the command line interface, see `experiments/cli.py`, e.g. `python run.py --runs 4 --agents 10`.
 """
 
-from experiments.run import run
+from experiments.cli import main
 
 
 if __name__ == '__main__':
-    df, _exceptions = run()
-    print(df)
+    main()
@@ -0,0 +1,57 @@
+"""# Test Configuration
+Shared fixtures for the model tests and the `pytest-benchmark` suite.
+
+Benchmarks are seeded so that every round of a benchmark exercises the same workload,
+and results can be compared against saved baselines, e.g. `make benchmark-compare`.
+"""
+
+import copy
+
+import numpy as np
+import pandas as pd
+import pytest
+from radcad import Backend
+
+import experiments.default_experiment as default_experiment
+from experiments.post_processing import post_process
+
+
+SEED = 1
+"""Fixed seed used for all tests and benchmarks"""
+
+BENCHMARK_TIMESTEPS = 30
+"""Number of timesteps of the small experiment used by the post-processing and KPI benchmarks"""
+
+BENCHMARK_RUNS = 4
+"""Number of Monte Carlo runs of the small experiment used by the post-processing and KPI benchmarks"""
+
+
+@pytest.fixture(autouse=True)
+def seed():
+    """Seed the global Numpy RNG before every test"""
+    np.random.seed(SEED)
+    return SEED
+
+
+@pytest.fixture(scope="session")
+def simulation():
+    """A copy of the default simulation, scaled down for tests and benchmarks"""
+    simulation = copy.deepcopy(default_experiment.experiment.simulations[0])
+    simulation.timesteps = BENCHMARK_TIMESTEPS
+    simulation.runs = BENCHMARK_RUNS
+    simulation.engine.backend = Backend.SINGLE_PROCESS
+    return simulation
+
+
+@pytest.fixture(scope="session")
+def raw_results(simulation):
+    """Raw (not post-processed) results of the scaled-down simulation"""
+    np.random.seed(SEED)
+    simulation.run()
+    return pd.DataFrame(simulation.results)
+
+
+@pytest.fixture(scope="session")
+def results(simulation, raw_results):
+    """Post-processed results of the scaled-down simulation"""
+    return post_process(raw_results.copy(), parameters=simulation.model.params)
@@ -0,0 +1,44 @@
+import copy
+
+import numpy as np
+
+from model.parts.agents import AgentColumns, policy_agents, run_agent_columns
+from model.state_variables import initial_state
+from model.system_parameters import create_agents, parameters
+
+
+PARAMS = {key: value[0] for key, value in parameters.items()}
+
+
+def _assert_columns_equal(columns, state, keys):
+    expected = AgentColumns(keys, [state[key] for key in keys])
+    np.testing.assert_array_equal(columns.holding, expected.holding)
+    np.testing.assert_array_equal(columns.accepting, expected.accepting)
+    np.testing.assert_array_equal(columns.premium_paid, expected.premium_paid)
+
+
+def test_policy_agents_changed_agents():
+    params = {**PARAMS, "agents": create_agents(50), "p_buy": 0.3, "p_sell": 0.3, "p_exercise": 0.5}
+    params.update({"option_type": "straddle", "strike_price": 1_900})
+    keys = list(params["agents"])
+    prices = 2_000 * np.cumprod(1 + np.random.default_rng(1).normal(0, 0.03, 100))
+    state = {**initial_state, **copy.deepcopy(params["agents"]), "timestep": 0, "volatile_asset_price": prices[0]}
+    state_history = [[state]]
+
+    # Each timestep, as in radCAD, the policy receives a copy of the state, and only the agents returned are updated
+    for timestep in range(1, len(prices)):
+        previous_state = copy.deepcopy(state)
+        before = {key: previous_state[key].__getstate__() for key in keys}
+        agent_dict = policy_agents(params, 0, state_history, previous_state)
+        assert set(agent_dict) == {key for key in keys if previous_state[key].__getstate__() != before[key]}
+
+        state = {**state, **agent_dict, "timestep": timestep, "volatile_asset_price": prices[timestep]}
+        state_history.append([state])
+        assert params["agent_columns"].timestep == timestep
+        _assert_columns_equal(params["agent_columns"], state, keys)
+
+    assert any(state[key].exercised for key in keys)
+
+    # Columns that aren't up to date with the state, e.g. of a run resumed from a checkpoint, are rebuilt
+    resumed = state_history[50][-1]
+    _assert_columns_equal(run_agent_columns(params, resumed), resumed, keys)
@@ -0,0 +1,300 @@
+"""# Model Benchmarks
+`pytest-benchmark` suite covering the model hot paths.
+
+Run the benchmarks and save a baseline with `make benchmark`,
+and compare against the latest saved baseline with `make benchmark-compare`.
+"""
+
+import copy
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from radcad.wrappers import Context
+
+import experiments.notebook_helpers as notebook_helpers
+import model.parts.agents as agents
+import model.parts.loans as loans
+import model.parts.positions as positions
+from experiments.post_processing import post_process
+from model.initialization import setup_initial_state
+from model.ledger import PositionLedger
+from model.loans import LoanBook, sample_loan_terms
+from model.pricing import OptionPriceSurface, black_scholes_price
+from model.state_variables import initial_state
+from model.stochastic_processes import create_stochastic_process_realizations
+from model.strategies import run_population
+from model.system_parameters import create_agents, parameters
+from model.types import Agent, Option
+
+
+HEAVY_MODULES = ["IPython", "pygments", "plotly", "statsmodels", "tqdm", "scipy.stats", "stochastic"]
+"""Notebook, plotting and statistics dependencies that the simulation path shouldn't import"""
+
+KPI_LIST = [
+    "_time_held",
+    "_discounted_payoff_received",
+    "_premium_paid",
+    "_discounted_payoff_paid",
+    "_premium_received",
+]
+
+
+@pytest.mark.parametrize("option_type", ["call", "put", "straddle"])
+def test_bsm_price(benchmark, option_type):
+    option = Option(
+        option_type=option_type,
+        underlying_price=2_100.0,
+        strike_price=2_000.0,
+        maturity=365,
+        risk_free_rate=0.03,
+        volatility=0.25,
+    )
+
+    price = benchmark(option.bsm_price, 100)
+
+    assert price > 0
+
+
+@pytest.fixture(scope="module")
+def surface():
+    return OptionPriceSurface()
+
+
+@pytest.mark.parametrize("option_type", ["call", "put", "straddle"])
+def test_surface_option_price(benchmark, surface, option_type):
+    option = Option(
+        option_type=option_type,
+        underlying_price=2_100.0,
+        strike_price=2_000.0,
+        maturity=365,
+        risk_free_rate=0.03,
+        volatility=0.25,
+    )
+
+    price = benchmark(surface.option_price, option, 100)
+
+    assert price == pytest.approx(option.bsm_price(100), abs=2_000 * surface.error_bound[option_type])
+
+
+@pytest.mark.parametrize("pricing", ["closed_form", "surface"])
+def test_vectorized_option_prices(benchmark, surface, pricing):
+    rng = np.random.default_rng(1)
+    n = 1_000_000
+    K = rng.uniform(500, 5_000, n)
+    S = K * np.exp(rng.uniform(-1, 1, n))
+    tau = rng.uniform(0.1, 1, n)
+    sigma = rng.uniform(0.1, 0.9, n)
+
+    if pricing == "surface":
+        prices = benchmark(surface.price, "call", S, K, tau, sigma)
+    else:
+        prices = benchmark(black_scholes_price, "call", S, K, tau, surface.risk_free_rate, sigma)
+
+    assert prices.shape == (n,)
+
+
+def _policy_agents_arguments(n_agents, timestep=100, seed=1):
+    """Create the arguments of a single `policy_agents` call for `n_agents` agents at `timestep`"""
+    rng = np.random.default_rng(seed)
+    price_path = 2_000 * np.cumprod(1 + rng.normal(0, 0.01, timestep + 1))
+
+    params = {key: value[0] for key, value in parameters.items()}
+    params["agents"] = create_agents(n_agents)
+    state_history = [[{"volatile_asset_price": price}] for price in price_path]
+    previous_state = {
+        **initial_state,
+        **{f"agent_{i}": Agent(agent_id=str(i)) for i in range(n_agents)},
+        "timestep": timestep,
+        "volatile_asset_price": price_path[-1],
+    }
+
+    return (params, 0, state_history, previous_state), {}
+
+
+@pytest.mark.parametrize("n_agents", [10, 100, 1_000])
+def test_policy_agents(benchmark, n_agents):
+    def setup():
+        np.random.seed(1)
+        (params, substep, state_history, previous_state), kwargs = _policy_agents_arguments(n_agents)
+        # The agent columns and population are cached for every timestep of a run after the first
+        agents.run_agent_columns(params, previous_state)
+        run_population(params, n_agents)
+        return (params, substep, state_history, previous_state), kwargs
+
+    agent_dict = benchmark.pedantic(agents.policy_agents, setup=setup, rounds=10)
+
+    # Only the agents taking an action are returned
+    assert 0 < len(agent_dict) < n_agents
+    assert all(key.startswith("agent_") for key in agent_dict)
+
+
+@pytest.mark.parametrize("n_agents", [1_000, 100_000])
+def test_policy_positions(benchmark, n_agents):
+    params = {key: value[0] for key, value in parameters.items()}
+    params["position_ledger"] = True
+    # A mixed population of agent strategies, see `model.strategies`
+    params["agent_strategies"] = {
+        "random": 0.4,
+        "threshold_exerciser": 0.2,
+        "premium_sensitive_buyer": 0.2,
+        "volatility_seller": 0.2,
+    }
+    params["volatility_threshold"] = 0.0
+
+    def setup():
+        np.random.seed(1)
+        (_, _, state_history, previous_state), _ = _policy_agents_arguments(0)
+        ledger = PositionLedger(n_agents=n_agents)
+        sellers = np.arange(n_agents // 2)
+        orders = ledger.create_orders(sellers, "call", 2_000.0, 30, 50.0, 2_000.0, 100, timestep=90)
+        ledger.fill(orders, (sellers + 1) % n_agents, timestep=90)
+        return (params, 0, state_history, {**previous_state, "positions": ledger}), {}
+
+    signals = benchmark.pedantic(positions.policy_positions, setup=setup, rounds=10)
+
+    assert len(signals["positions"]) > n_agents // 2
+
+
+@pytest.mark.parametrize("n_loans", [1_000, 50_000])
+def test_policy_loans(benchmark, n_loans):
+    params = {key: value[0] for key, value in parameters.items()}
+    params["loan_book"] = True
+
+    def setup():
+        np.random.seed(1)
+        book = LoanBook(n_agents=1_000)
+        terms = sample_loan_terms(n_loans, book.n_agents, 20_000)
+        book.originate(**terms, timestep=-np.random.randint(0, terms["durations"]))
+        state_history = [[{"volatile_asset_price": 2_000}]]
+        previous_state = {"timestep": 1, "volatile_asset_price": 2_010, "nft_floor_price": 20_000, "loans": book}
+        return (params, 0, state_history, previous_state), {}
+
+    signals = benchmark.pedantic(loans.policy_loans, setup=setup, rounds=10)
+
+    assert signals["loans_active"] + signals["loans_repaid"] + signals["loans_foreclosed"] >= n_loans
+
+
+@pytest.mark.parametrize(
+    "process",
+    [
+        "geometric_brownian_motion_process",
+        "manual_gbm_process",
+        "brownian_motion_process",
+        "gaussian_noise_process",
+        "heston_process",
+        "merton_jump_diffusion_process",
+        "regime_switching_gbm_process",
+    ],
+)
+def test_create_stochastic_process_realizations(benchmark, process):
+    samples = benchmark(
+        create_stochastic_process_realizations,
+        process,
+        timesteps=365,
+        dt=1,
+        runs=10,
+        mu=0.1,
+        sigma=0.25,
+        initial_price=2_000,
+    )
+
+    assert len(samples) == 10
+
+
+@pytest.mark.parametrize(
+    "process",
+    ["heston_process", "merton_jump_diffusion_process", "regime_switching_gbm_process"],
+)
+def test_batched_process_paths(benchmark, process):
+    # 10,000 one-year daily price paths, generated at once by a process of `BATCHED_PROCESSES`
+    samples = benchmark.pedantic(
+        create_stochastic_process_realizations,
+        args=(process,),
+        kwargs=dict(timesteps=365, dt=1, runs=10_000, seed=1, mu=0.1, sigma=0.25, initial_price=2_000),
+        rounds=3,
+    )
+
+    assert samples.shape == (10_000, 365)
+
+
+def test_setup_initial_state(benchmark):
+    params = {key: value[0] for key, value in parameters.items()}
+
+    def setup():
+        context = Context(0, 0, 0, 365, copy.copy(initial_state), params)
+        return (context,), {}
+
+    benchmark.pedantic(setup_initial_state, setup=setup, rounds=100)
+
+
+def test_post_process(benchmark, simulation, raw_results):
+    def setup():
+        return (raw_results.copy(),), {"parameters": simulation.model.params}
+
+    df = benchmark.pedantic(post_process, setup=setup, rounds=10)
+
+    assert (df["timestep"] > 0).all()
+
+
+def test_get_KPIs_for_simulation(benchmark, simulation, results):
+    n_agents = len(simulation.model.params["agents"][0])
+
+    L = benchmark.pedantic(
+        notebook_helpers.get_KPIs_for_simulation, args=(results, n_agents, KPI_LIST), rounds=3
+    )
+
+    assert len(L) == simulation.runs
+
+
+def test_get_summary_stat_for_KPIs(benchmark, simulation, results):
+    n_agents = len(simulation.model.params["agents"][0])
+    L = notebook_helpers.get_KPIs_for_simulation(results, n_agents, KPI_LIST)
+
+    KPI_df = benchmark(notebook_helpers.get_summary_stat_for_KPIs, L, "mean")
+
+    assert len(KPI_df) == simulation.runs
+
+
+def test_get_regression_df(benchmark, simulation, results):
+    n_agents = len(simulation.model.params["agents"][0])
+    L = notebook_helpers.get_KPIs_for_simulation(results, n_agents, KPI_LIST)
+    KPI_df = notebook_helpers.get_summary_stat_for_KPIs(L, "mean")
+
+    benchmark(notebook_helpers.get_regression_df, KPI_df, ["buyer_pnl", "seller_pnl"])
+
+
+def test_get_option_payoff(benchmark, simulation, results):
+    payoffs = benchmark(notebook_helpers.get_option_payoff, results)
+
+    assert len(payoffs) == simulation.runs
+
+
+def test_check_agent_counterparty_for_simulation(benchmark, simulation, results):
+    n_agents = len(simulation.model.params["agents"][0])
+
+    benchmark.pedantic(
+        notebook_helpers.check_agent_counterparty_for_simulation, args=(results, n_agents), rounds=3
+    )
+
+
+@pytest.mark.parametrize("module", ["model", "experiments.run"])
+def test_import_time(benchmark, module):
+    """Startup cost of a fresh process importing the simulation path, e.g. a job array task"""
+    command = [
+        sys.executable,
+        "-c",
+        f"import sys, {module}; print([name for name in {HEAVY_MODULES} if name in sys.modules])",
+    ]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    result = benchmark.pedantic(
+        subprocess.run,
+        args=(command,),
+        kwargs={"capture_output": True, "text": True, "check": True, "cwd": root},
+        rounds=5,
+    )
+
+    assert result.stdout.strip() == "[]"
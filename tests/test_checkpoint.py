@@ -0,0 +1,101 @@
+import copy
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+import radcad.core as core
+
+from experiments.checkpoint import Checkpointer, parameters_hash
+from experiments.default_experiment import configure_model
+
+
+class Interrupt(Exception):
+    pass
+
+
+@pytest.fixture
+def small_simulation(simulation):
+    simulation = copy.deepcopy(simulation)
+    simulation.runs = 3
+    simulation.timesteps = 30
+    return simulation
+
+
+def _comparable(results):
+    """Results as a DataFrame, with the loan book of each row compared by its loans"""
+    df = pd.DataFrame(results)
+    if "loans" in df:
+        df["loans"] = [tuple(map(tuple, loans.__getstate__()["_data"].values())) for loans in df["loans"]]
+    return df
+
+
+@pytest.mark.parametrize("loan_book", [False, True])
+def test_checkpoint_resume_identical(small_simulation, tmp_path, loan_book):
+    if loan_book:
+        small_simulation.model.params.update({"loan_book": [True], "initial_loans": [500]})
+        configure_model(small_simulation)
+    Checkpointer(tmp_path / "uninterrupted", every=10).run(small_simulation)
+    expected = _comparable(small_simulation.results)
+    assert len(expected) == 3 * 31
+
+    # Interrupt the second run at timestep 25, after its checkpoint at timestep 20
+    state_update_blocks = small_simulation.model.state_update_blocks
+    update_price = state_update_blocks[0]["variables"]["volatile_asset_price"]
+
+    def interrupted_update_price(params, substep, state_history, previous_state, policy_input):
+        if previous_state["run"] == 2 and previous_state["timestep"] == 25:
+            raise Interrupt()
+        return update_price(params, substep, state_history, previous_state, policy_input)
+
+    interrupted_blocks = copy.copy(state_update_blocks)
+    interrupted_blocks[0] = dict(state_update_blocks[0], variables={"volatile_asset_price": interrupted_update_price})
+    small_simulation.model.state_update_blocks = interrupted_blocks
+
+    checkpointer = Checkpointer(tmp_path / "interrupted", every=10)
+    with pytest.raises(Interrupt):
+        checkpointer.run(small_simulation)
+    assert checkpointer.completed() == {"0-0-0.pkl"}
+    assert os.path.exists(tmp_path / "interrupted" / "in_flight" / "0-0-1.pkl")
+    completed_run = tmp_path / "interrupted" / "runs" / "0-0-0.pkl"
+    modified = os.path.getmtime(completed_run)
+
+    small_simulation.model.state_update_blocks = state_update_blocks
+    checkpointer.run(small_simulation, resume=True)
+
+    pd.testing.assert_frame_equal(_comparable(small_simulation.results), expected)
+    assert os.path.getmtime(completed_run) == modified
+    assert not os.listdir(tmp_path / "interrupted" / "in_flight")
+
+
+def test_resume_rejects_different_configuration(small_simulation, tmp_path):
+    (tmp_path / "notes.txt").write_text("not part of the checkpoint")
+    Checkpointer(tmp_path, every=10).run(small_simulation)
+    small_simulation.runs = 4
+    with pytest.raises(ValueError):
+        Checkpointer(tmp_path, every=10).run(small_simulation, resume=True)
+    small_simulation.runs = 3
+    small_simulation.model.params.update({"option_type": ["put"]})
+    with pytest.raises(ValueError):
+        Checkpointer(tmp_path, every=10).run(small_simulation, resume=True)
+    small_simulation.runs = 4
+
+    # Starting from scratch only removes the previous checkpoint
+    Checkpointer(tmp_path, every=10).run(small_simulation)
+    assert Checkpointer(tmp_path).completed() == {f"0-0-{run}.pkl" for run in range(4)}
+    assert (tmp_path / "notes.txt").exists()
+
+
+def test_parameters_hash_stable_across_processes(simulation):
+    # Shards and resumed runs are executed in other processes, e.g. on other nodes
+    code = (
+        "import radcad.core as core; import experiments.default_experiment as default_experiment; "
+        "from experiments.checkpoint import parameters_hash; "
+        "params = default_experiment.experiment.simulations[0].model.params; "
+        "print(parameters_hash(core.generate_parameter_sweep(params)[0]))"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == parameters_hash(core.generate_parameter_sweep(simulation.model.params)[0])
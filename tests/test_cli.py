@@ -0,0 +1,81 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from experiments.cli import main, parse_config
+from experiments.default_experiment import create_experiment
+
+
+def test_parse_config(tmp_path):
+    config_path = tmp_path / "job.json"
+    config_path.write_text(json.dumps({"agents": 500, "option_type": "put", "runs": 10}))
+
+    config = parse_config(["--config", str(config_path), "--runs", "4"])
+    assert config["agents"] == 500
+    assert config["option_type"] == "put"
+    # Flags override the config file
+    assert config["runs"] == 4
+    assert config["timesteps"] == 365
+
+    config_path.write_text(json.dumps({"n_agents": 500}))
+    with pytest.raises(SystemExit):
+        parse_config(["--config", str(config_path)])
+
+
+def test_create_experiment_sizes():
+    experiment = create_experiment(timesteps=5, runs=2, n_agents=7)
+    simulation = experiment.simulations[0]
+
+    agent_keys = [f"agent_{i}" for i in range(7)]
+    assert list(simulation.model.params["agents"][0]) == agent_keys
+    assert list(simulation.model.state_update_blocks[2]["variables"]) == agent_keys
+    with pytest.raises(ValueError):
+        create_experiment(option_type="binary")
+    with pytest.raises(ValueError):
+        create_experiment(scenario="Crab")
+
+
+def test_cli(tmp_path):
+    output = tmp_path / "results.pkl"
+    main(
+        [
+            "--timesteps", "5",
+            "--runs", "2",
+            "--agents", "7",
+            "--option-type", "straddle",
+            "--backend", "SINGLE_PROCESS",
+            "--output", str(output),
+        ]
+    )
+
+    df = pd.read_pickle(output)
+    assert sorted(column for column in df.columns if column.startswith("agent_")) == sorted(f"agent_{i}" for i in range(7))
+    assert df["run"].nunique() == 2
+    assert df["timestep"].max() == 5
+
+    main(["--timesteps", "5", "--runs", "2", "--agents", "3", "--backend", "SINGLE_PROCESS", "--output", str(tmp_path / "results.csv")])
+    df = pd.read_csv(tmp_path / "results.csv")
+    assert "volatile_asset_price" in df.columns
+    assert not any(column.startswith("agent_") for column in df.columns)
+
+
+def test_cli_price_history(tmp_path):
+    prices = tmp_path / "prices.csv"
+    pd.DataFrame({"close": [2_000.0, 2_100.0, 1_900.0, 2_050.0]}).to_csv(prices, index=False)
+    df, _ = main(
+        [
+            "--timesteps", "5",
+            "--runs", "2",
+            "--agents", "3",
+            "--backend", "SINGLE_PROCESS",
+            "--process", "block_bootstrap_process",
+            "--price-history", str(prices),
+        ]
+    )
+
+    # Bootstrapped paths follow the initial price of the scenario by a historical return
+    returns = df.query("timestep == 1")["volatile_asset_price"] / 2_000
+    assert np.isclose(returns.values[:, None], [2_100 / 2_000, 1_900 / 2_100, 2_050 / 1_900]).any(axis=1).all()
+    assert df["volatile_asset_price"].nunique() > 1
@@ -0,0 +1,80 @@
+import copy
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from experiments.event_driven import estimate_volatilities, run_event_driven
+from model.parts.agents import estimate_volatility
+from model.system_parameters import create_volatile_asset_price_process
+
+
+def options_bought(df):
+    final = df[df["timestep"] == df["timestep"].max()]
+    agent_columns = [column for column in df.columns if column.startswith("agent_")]
+    return np.array(
+        [sum(state[column].bought_from_Id is not None for column in agent_columns) for _, state in final.iterrows()]
+    )
+
+
+def test_estimate_volatilities():
+    prices = 2_000 * np.exp(np.cumsum(np.random.normal(0, 0.02, 50)))
+    state_history = [[{"volatile_asset_price": price}] for price in prices]
+
+    expected = [estimate_volatility(state_history, timestep, 365) for timestep in range(len(prices))]
+    np.testing.assert_allclose(estimate_volatilities(prices, 365), expected)
+
+
+def test_event_driven_results_format(simulation, raw_results):
+    df = run_event_driven(simulation)
+
+    assert list(df.columns) == list(raw_results.columns)
+    assert len(df) == len(raw_results)
+    for column in ["volatile_asset_price", "discounted_payoff", "run", "timestep", "substep"]:
+        np.testing.assert_allclose(df[column].astype(float), raw_results[column].astype(float))
+
+    # Unchanged agents are shared across timesteps rather than copied
+    agents = df.query("run == 1")["agent_0"]
+    assert agents.map(id).nunique() < len(agents) // 2
+
+
+def test_event_driven_statistically_equivalent(simulation):
+    simulation = copy.deepcopy(simulation)
+    simulation.runs = 40
+    step = options_bought(pd.DataFrame(simulation.run()))
+    simulation.runs = 200
+    event_driven = options_bought(run_event_driven(simulation))
+
+    standard_error = np.sqrt(event_driven.var() / len(event_driven) + step.var(ddof=1) / len(step))
+    assert abs(event_driven.mean() - step.mean()) < 4 * standard_error
+
+
+def test_event_driven_exercise_after_buy_timestep(simulation):
+    # Deep in-the-money puts are worth exercising as soon as they are held, as their BSM price is below their payoff
+    simulation = copy.deepcopy(simulation)
+    simulation.runs = 20
+    simulation.timesteps = 60
+    simulation.model.params.update(
+        {
+            "option_type": ["put"],
+            "p_buy": [0.5],
+            "p_sell": [0.5],
+            "p_exercise": [1.0],
+            "volatile_asset_price_process": [create_volatile_asset_price_process("Bear", runs=20)],
+        }
+    )
+    df = run_event_driven(simulation)
+
+    # As in the step-by-step policy, only agents holding an option at the start of a timestep exercise it
+    final = df[df["timestep"] == df["timestep"].max()]
+    agents = [agent for column in df.columns if column.startswith("agent_") for agent in final[column]]
+    bought = [agent for agent in agents if agent.exercised and agent.bought_from_Id is not None]
+    assert len(bought) > 0
+    assert all(agent.exercisedAt > agent.option_bought_at for agent in bought)
+
+
+def test_event_driven_rejects_position_ledger(simulation):
+    simulation = copy.deepcopy(simulation)
+    simulation.model.params.update({"position_ledger": [True]})
+    with pytest.raises(ValueError):
+        run_event_driven(simulation)
@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from model.historical_prices import load_price_series
+from model.stochastic_processes import ProcessSpec, SampledProcess, create_stochastic_process_realizations
+
+
+@pytest.fixture
+def price_file(tmp_path):
+    prices = 2_000 * np.exp(np.cumsum(np.random.normal(0, 0.03, 1_000)))
+    df = pd.DataFrame({"date": pd.date_range("2020-01-01", periods=len(prices)).astype(str), "close": prices})
+    path = str(tmp_path / "prices.csv")
+    # Rows out of order, with a missing price
+    df.iloc[::-1].assign(close=lambda df: df["close"].where(df.index != 500)).to_csv(path, index=False)
+    return path, np.delete(prices, 500)
+
+
+def test_load_price_series(price_file, tmp_path):
+    path, prices = price_file
+    cache_dir = str(tmp_path / "cache")
+    loaded = load_price_series(path, date_column="date", cache_dir=cache_dir)
+    assert isinstance(loaded, np.memmap)
+    np.testing.assert_allclose(loaded, prices)
+
+    # Loaded from the cache, until the source file changes
+    assert len(os.listdir(cache_dir)) == 1
+    np.testing.assert_array_equal(load_price_series(path, date_column="date", cache_dir=cache_dir), loaded)
+    pd.DataFrame({"close": [1.0, 2.0]}).to_csv(path, index=False)
+    os.utime(path, ns=(0, 0))
+    np.testing.assert_array_equal(load_price_series(path, cache_dir=cache_dir), [1.0, 2.0])
+
+    with pytest.raises(ValueError):
+        pd.DataFrame({"close": [1.0, -2.0]}).to_csv(path, index=False)
+        load_price_series(path, cache_dir=str(tmp_path / "other"))
+
+
+def test_parquet_price_series(price_file, tmp_path):
+    pytest.importorskip("pyarrow")
+    path, prices = price_file
+    parquet_path = str(tmp_path / "prices.parquet")
+    pd.DataFrame({"price": prices}).to_parquet(parquet_path)
+    np.testing.assert_allclose(load_price_series(parquet_path), prices)
+
+
+def test_historical_replay(price_file):
+    path, prices = price_file
+    spec = ProcessSpec(
+        "historical_replay_process", timesteps=100, runs=4, parameters={"path": path, "date_column": "date"}
+    )
+    process = SampledProcess(spec=spec)
+    # Runs replay evenly spaced windows of the price series
+    np.testing.assert_allclose(process.samples[0], prices[1:101])
+    np.testing.assert_allclose(process.samples[-1], prices[-100:])
+    assert process(2, 10) == pytest.approx(prices[(len(prices) - 101) // 3 + 11])
+
+    rescaled = create_stochastic_process_realizations(
+        "historical_replay_process", timesteps=100, runs=4, prices=prices, initial_price=2_000
+    )
+    starts = prices[np.linspace(0, len(prices) - 101, 4).round().astype(int)]
+    np.testing.assert_allclose(rescaled, process.samples * 2_000 / starts[:, None])
+    with pytest.raises(ValueError):
+        create_stochastic_process_realizations("historical_replay_process", timesteps=1_000, prices=prices)
+
+
+@pytest.mark.parametrize("stationary", [True, False])
+def test_block_bootstrap(stationary):
+    # Historical returns identifying their index, i * 1e-4 for return i
+    prices = 2_000 * np.exp(np.cumsum(np.arange(500) * 1e-4))
+    samples = create_stochastic_process_realizations(
+        "block_bootstrap_process", timesteps=365, runs=1_000, seed=3, prices=prices, block_length=10, stationary=stationary
+    )
+    assert samples.shape == (1_000, 365)
+    fewer_runs = create_stochastic_process_realizations(
+        "block_bootstrap_process", timesteps=365, runs=3, seed=3, prices=prices, block_length=10, stationary=stationary
+    )
+    np.testing.assert_array_equal(fewer_runs, samples[:3])
+
+    # Every sampled return is a historical return, followed by the next historical return within its block
+    indices = np.round(np.diff(np.log(samples), axis=1, prepend=np.log(prices[-1])) / 1e-4) - 1
+    assert indices.min() >= 0 and indices.max() <= 498
+    continued = np.diff(indices, axis=1) % 499 == 1
+    if stationary:
+        assert continued.mean() == pytest.approx(0.9, abs=0.01)
+    else:
+        np.testing.assert_array_equal(continued.all(axis=0), np.arange(1, 365) % 10 != 0)
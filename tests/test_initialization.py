@@ -0,0 +1,27 @@
+import copy
+
+import numpy as np
+import pandas as pd
+from radcad import Backend
+
+
+def test_simulation_reproducible(simulation):
+    simulation = copy.deepcopy(simulation)
+    simulation.runs = 3
+    simulation.timesteps = 30
+    expected = pd.DataFrame(simulation.run())
+    agents = [column for column in expected.columns if column.startswith("agent_")]
+    assert any(agent.has_counterparty for agent in expected.iloc[-1][agents])
+
+    # Each run draws from its own RNG, independently of the global RNG and of the process it is executed in
+    np.random.seed(2)
+    pd.testing.assert_frame_equal(pd.DataFrame(simulation.run()), expected)
+    simulation.engine.backend = Backend.PATHOS
+    simulation.engine.processes = 2
+    pd.testing.assert_frame_equal(pd.DataFrame(simulation.run()), expected)
+
+    # Experiments of different seeds draw different random numbers
+    simulation.engine.backend = Backend.SINGLE_PROCESS
+    simulation.model.params.update({"seed": [2]})
+    df = pd.DataFrame(simulation.run())
+    assert not df[agents].equals(expected[agents])
@@ -0,0 +1,186 @@
+import copy
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from model.ledger import CANCELLED, EXERCISED, EXPIRED, LISTED, NO_BUYER, OPEN, OPTION_TYPE_CODES, PositionLedger
+from experiments.default_experiment import configure_model
+from model.types import Option
+
+
+def test_ledger_lifecycle():
+    ledger = PositionLedger(n_agents=3, capacity=2)
+    ledger.open(
+        [0, 0, 1], [1, 2, 2], "call", [2_000.0, 2_100.0, 1_900.0], [10, 20, 5], [50.0, 40.0, 60.0], timestep=1, collateral=2_000.0
+    )
+    ledger.open([2], [0], "put", 2_000.0, 30, 70.0, timestep=2, collateral=2_000.0)
+
+    assert len(ledger) == 4
+    np.testing.assert_array_equal(ledger.positions_of(0), [0, 1, 3])
+    assert ledger.option_type[3] == OPTION_TYPE_CODES["put"]
+
+    exercised = ledger.exercise([0, 3], 2_200.0, timestep=6, risk_free_rate=0.03)
+    np.testing.assert_array_equal(exercised, [0, 3])
+    assert ledger.payoff[0] == 200.0 and ledger.payoff[3] == 0.0
+    assert ledger.discounted_payoff[0] == pytest.approx(200.0 * np.exp(-0.03 * 4 / 365))
+
+    np.testing.assert_array_equal(ledger.expire(timestep=6), [2])
+    np.testing.assert_array_equal(ledger.status, [EXERCISED, OPEN, EXPIRED, EXERCISED])
+    # Positions can't be exercised twice or after expiry
+    assert len(ledger.exercise([0, 2], 2_500.0, timestep=7, risk_free_rate=0.03)) == 0
+
+    summary = ledger.agent_summary()
+    np.testing.assert_array_equal(summary["positions_bought"], [2, 1, 1])
+    np.testing.assert_array_equal(summary["open_short"], [0, 0, 1])
+    assert summary["buyer_pnl"].sum() + summary["seller_pnl"].sum() == pytest.approx(0.0)
+
+
+def test_order_lifecycle():
+    ledger = PositionLedger(n_agents=4)
+    # Orders of sellers 0, 1 and 2, which can be filled until timesteps 5, 5 and 3, opening options with a tenor of 10
+    orders = ledger.create_orders([0, 1, 2], "put", 2_000.0, 10, 50.0, 2_000.0, [5, 5, 3], timestep=1)
+    np.testing.assert_array_equal(ledger.status, [LISTED] * 3)
+    np.testing.assert_array_equal(ledger.buyer, [NO_BUYER] * 3)
+
+    # Orders can't be filled by their seller, or after they are cancelled
+    np.testing.assert_array_equal(ledger.cancel(orders[1:2], timestep=2), [1])
+    np.testing.assert_array_equal(ledger.fill(orders, [0, 3, 3], timestep=2), [2])
+    assert ledger.cancel([2], timestep=2).size == 0
+    assert ledger.expiry[2] == 12 and ledger.opened_at[2] == 2
+
+    # The unfilled order lapses after its order expiry, and the option after its expiry, each settled once
+    assert ledger.expire(timestep=5).size == 0
+    np.testing.assert_array_equal(ledger.expire(timestep=6), [0])
+    assert ledger.expire(timestep=12).size == 0
+    np.testing.assert_array_equal(ledger.expire(timestep=13), [2])
+    assert not ledger._expiries
+    np.testing.assert_array_equal(ledger.status, [EXPIRED, CANCELLED, EXPIRED])
+
+    # Collateral of cancelled orders is returned on cancellation, and of expired positions on withdrawal
+    np.testing.assert_array_equal(ledger.withdrawable(), [2_000.0, 0.0, 2_000.0])
+    np.testing.assert_array_equal(ledger.withdrawable_positions(), [0, 2])
+    np.testing.assert_array_equal(ledger.withdraw([0, 1, 2], timestep=14), [0, 2])
+    assert ledger.withdraw([0], timestep=15).size == 0
+    summary = ledger.agent_summary()
+    np.testing.assert_array_equal(summary["collateral_withdrawn"], [2_000.0, 2_000.0, 2_000.0, 0.0])
+    np.testing.assert_array_equal(summary["collateral_locked"], [0.0] * 4)
+    np.testing.assert_array_equal(summary["positions_sold"], [0, 0, 1, 0])
+    np.testing.assert_array_equal(summary["premium_received"], [0.0, 0.0, 50.0, 0.0])
+
+
+def test_exercised_collateral():
+    ledger = PositionLedger(n_agents=2)
+    ledger.open([0], [1], "put", 2_000.0, 10, 50.0, timestep=0, collateral=2_000.0)
+    ledger.exercise([0], 1_800.0, timestep=4, risk_free_rate=0.03)
+    assert ledger.agent_summary()["collateral_locked"][1] == 1_800.0
+    np.testing.assert_array_equal(ledger.withdraw([0], timestep=5), [0])
+    assert ledger.withdrawn[0] == 1_800.0
+    # The exercised option is not expired
+    assert ledger.expire(timestep=11).size == 0
+
+
+def test_payoff_capped_at_collateral():
+    ledger = PositionLedger(n_agents=2)
+    ledger.open([0, 0], [1, 1], "call", 2_000.0, 10, 50.0, timestep=0, collateral=[2_000.0, 0.0])
+    ledger.exercise([0, 1], 5_000.0, timestep=1, risk_free_rate=0.0)
+    # The seller pays at most the collateral locked, and has nothing left to withdraw
+    np.testing.assert_array_equal(ledger.payoff, [2_000.0, 0.0])
+    np.testing.assert_array_equal(ledger.withdrawable(), [0.0, 0.0])
+    assert ledger.withdrawable_positions().size == 0
+
+
+def test_ledger_mark_to_market_and_copy():
+    ledger = PositionLedger(n_agents=2)
+    ledger.open([0], [1], "straddle", 2_000.0, 100, 0.0, timestep=0)
+    ledger.mark_to_market(2_100.0, 0.5, timestep=10, risk_free_rate=0.03)
+
+    option = Option(
+        option_type="straddle", underlying_price=2_100.0, strike_price=2_000, maturity=100, risk_free_rate=0.03, volatility=0.5
+    )
+    assert ledger.value[0] == pytest.approx(option.bsm_price(10))
+
+    copied = pickle.loads(pickle.dumps(ledger, -1))
+    copied.open([1], [0], "call", 2_000.0, 100, 10.0, timestep=11)
+    assert len(copied) == 2 and len(ledger) == 1
+    assert len(copy.deepcopy(ledger)) == 1
+
+
+def test_compact():
+    rng = np.random.default_rng(1)
+    ledger, compacted = PositionLedger(n_agents=5), PositionLedger(n_agents=5)
+    for timestep in range(60):
+        price = 2_000.0 * np.exp(rng.normal(0, 0.05))
+        sellers = rng.choice(5, 3, replace=False)
+        for book in (ledger, compacted):
+            book.expire(timestep)
+            book.create_orders(sellers, "call", 2_000.0, 5, 50.0, 1_000.0, timestep + 2, timestep)
+            orders = book.listed_orders(timestep)
+            book.cancel(orders[:1], timestep)
+            book.fill(book.listed_orders(timestep)[:1], (sellers[0] + 1) % 5, timestep)
+            book.exercise(book.open_positions(timestep)[:1], price, timestep, 0.03)
+            book.withdraw(book.withdrawable_positions()[:2], timestep)
+        removed = compacted.compact()
+
+        live = (ledger.status == LISTED) | (ledger.status == OPEN) | (ledger.withdrawable() > 0)
+        assert removed <= len(ledger) - live.sum() and len(compacted) == live.sum()
+        for key, values in ledger.agent_summary().items():
+            np.testing.assert_allclose(compacted.agent_summary()[key], values, err_msg=key)
+        np.testing.assert_array_equal(compacted.strike, ledger.strike[live])
+        np.testing.assert_array_equal(compacted.listed_orders(), np.flatnonzero(compacted.status == LISTED))
+        np.testing.assert_array_equal(compacted.open_positions(), np.flatnonzero(compacted.status == OPEN))
+        np.testing.assert_array_equal(compacted.withdrawable_positions(), np.flatnonzero(compacted.withdrawable() > 0))
+
+    closed = ledger.status[~live]
+    assert compacted.compacted["positions_cancelled"] == (closed == CANCELLED).sum() > 0
+    assert compacted.compacted["positions_expired"] == (closed == EXPIRED).sum() > 0
+    assert compacted.compacted["positions_exercised"] == (closed == EXERCISED).sum() > 0
+    assert pickle.loads(pickle.dumps(compacted)).compacted["positions_expired"] == compacted.compacted["positions_expired"]
+
+
+def test_position_ledger_disabled(raw_results, simulation):
+    # The market's State Update Block and State Variable are only part of the model when enabled
+    assert "positions" not in raw_results.columns
+    assert len(simulation.model.state_update_blocks) == 3
+
+
+def test_position_ledger_simulation(simulation):
+    simulation = copy.deepcopy(simulation)
+    simulation.runs = 1
+    simulation.model.params.update({"position_ledger": [True], "position_tenor": [5], "p_sell": [0.2]})
+    configure_model(simulation)
+    df = pd.DataFrame(simulation.run())
+
+    ledger = df.iloc[-1]["positions"]
+    assert len(ledger) > 0
+    # Agents hold several sequential and concurrent positions, and positions expire after their tenor
+    assert ledger.agent_summary()["positions_bought"].max() > 1
+    assert ledger.compacted["positions_expired"] > 0
+    opened = ledger.opened_at >= 0
+    assert (ledger.expiry[opened] - ledger.opened_at[opened] == 5).all()
+    # Orders are cancelled, expire unfilled, and collateral is withdrawn
+    assert ledger.compacted["positions_cancelled"] > 0
+    assert ((ledger.status == EXPIRED) & (ledger.buyer == NO_BUYER)).any()
+    assert ledger.agent_summary()["collateral_withdrawn"].sum() > 0
+    # Closed positions are compacted out of the ledger, leaving the live positions
+    assert ((ledger.status == LISTED) | (ledger.status == OPEN) | (ledger.withdrawable() > 0)).all()
+    # The indexed listed, open and withdrawable positions match a scan of the ledger
+    np.testing.assert_array_equal(ledger.listed_orders(), np.flatnonzero(ledger.status == LISTED))
+    np.testing.assert_array_equal(ledger.open_positions(), np.flatnonzero(ledger.status == OPEN))
+    np.testing.assert_array_equal(ledger.withdrawable_positions(), np.flatnonzero(ledger.withdrawable() > 0))
+
+
+def test_position_ledger_cancel_and_withdraw_parameters(simulation):
+    simulation = copy.deepcopy(simulation)
+    simulation.runs = 1
+    simulation.model.params.update(
+        {"position_ledger": [True], "position_tenor": [5], "p_sell": [0.2], "p_cancel": [0.0], "p_withdraw": [0.0]}
+    )
+    configure_model(simulation)
+    df = pd.DataFrame(simulation.run())
+
+    # Without cancellation and withdrawals, orders only close by expiring or being filled, and collateral stays locked
+    ledger = df.iloc[-1]["positions"]
+    assert ledger.compacted["positions_cancelled"] == 0
+    assert ledger.agent_summary()["collateral_withdrawn"].sum() == 0
@@ -0,0 +1,79 @@
+import copy
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from experiments.default_experiment import configure_model
+from model.loans import ACTIVE, FORECLOSED, REPAID, LoanBook, sample_loan_terms
+
+
+def test_loan_lifecycle():
+    book = LoanBook(n_agents=3, capacity=2)
+    book.originate([0, 1, 2], [1, 2, 0], [1_000.0, 2_000.0, 500.0], 0.365, [10, 30, 5], [0.1, 0.1, 0.01], timestep=0)
+
+    np.testing.assert_array_equal(book.accrue(20_000.0, timestep=4), [0, 1, 2])
+    np.testing.assert_allclose(book.owed, [1_004.0, 2_008.0, 502.0])
+    np.testing.assert_allclose(book.loan_to_value, [1_004.0 / 2_000.0, 2_008.0 / 2_000.0, 502.0 / 200.0])
+
+    # Loans can't be repaid twice, or after maturity
+    np.testing.assert_array_equal(book.repay([0, 2], timestep=4), [0, 2])
+    assert book.repay([0], timestep=5).size == 0
+    assert book.repay([1], timestep=31).size == 0
+
+    book.accrue(10_000.0, timestep=40)
+    assert book.owed[1] == pytest.approx(2_060.0)
+    np.testing.assert_array_equal(book.foreclose(10_000.0, timestep=30), [])
+    np.testing.assert_array_equal(book.foreclose(10_000.0, timestep=31), [1])
+    np.testing.assert_array_equal(book.status, [REPAID, FORECLOSED, REPAID])
+
+    summary = book.summary(10_000.0)
+    assert summary["loans_active"] == 0 and summary["loans_foreclosed"] == 1
+    # Lender 2 recovered collateral worth 1,000 of a 2,000 loan
+    np.testing.assert_allclose(summary["lender_pnl_per_agent"], [2.0, 4.0, -1_000.0])
+
+    # Compacting closed loans out of the book keeps their counts and lender PnL in the summary
+    book.originate([0], [1], 1_000.0, 0.365, 10, 0.1, timestep=40)
+    assert book.compact() == 3 and book.compact() == 0
+    assert len(book) == 1 and book.principal[0] == 1_000.0
+    compacted = book.summary(10_000.0)
+    assert compacted["loans_active"] == 1 and compacted["loans_repaid"] == 2 and compacted["loans_foreclosed"] == 1
+    np.testing.assert_allclose(compacted["lender_pnl_per_agent"], summary["lender_pnl_per_agent"])
+
+
+def test_sample_loan_terms():
+    np.random.seed(1)
+    terms = sample_loan_terms(10_000, 100, 20_000.0)
+    assert (terms["borrowers"] != terms["lenders"]).all()
+    loan_to_value = terms["principals"] / (terms["collateral_units"] * 20_000.0)
+    assert loan_to_value.min() >= 0.3 and loan_to_value.max() <= 0.6
+    assert terms["collateral_units"].min() >= 1.0
+
+
+def test_loan_book_disabled(raw_results):
+    # The loan book's State Update Block and State Variables are only part of the model when enabled
+    assert not {"nft_floor_price", "loans", "loans_active"} & set(raw_results.columns)
+
+
+def test_loan_book_simulation(simulation):
+    simulation = copy.deepcopy(simulation)
+    simulation.runs = 1
+    simulation.timesteps = 60
+    simulation.model.params.update(
+        {"loan_book": [True], "initial_loans": [5_000], "loan_origination_rate": [50.0]}
+    )
+    configure_model(simulation)
+    df = pd.DataFrame(simulation.run())
+
+    assert df["nft_floor_price"].nunique() > 1
+    assert df["loans_repaid"].iloc[-1] > 0 and df["loans_repaid"].is_monotonic_increasing
+    assert df["loans_active"].iloc[0] == 5_000
+
+    # Closed loans are compacted out of the book, and every loan past its maturity is closed
+    final = df.iloc[-1]
+    book = final["loans"]
+    assert len(book) == final["loans_active"]
+    assert (book.status == ACTIVE).all()
+    assert (book.maturity >= 60).all()
+    summary = book.summary(final["nft_floor_price"])
+    assert summary["loans_repaid"] == final["loans_repaid"] and summary["lender_pnl"] == final["lender_pnl"]
@@ -0,0 +1,23 @@
+import copy
+
+from experiments.memory import MemoryTracker, variable_group
+
+
+def test_variable_group():
+    assert variable_group("agent_42") == "agent_*"
+    assert variable_group("volatile_asset_price") == "volatile_asset_price"
+
+
+def test_memory_tracker(simulation, tmp_path):
+    simulation = copy.deepcopy(simulation)
+    tracker = MemoryTracker(tmp_path, every=10)
+
+    tracker.instrument(simulation)
+    simulation.run()
+    tracker.restore(simulation)
+    summary = tracker.report()
+
+    samples = tracker.samples()
+    assert len(samples) == simulation.runs * len(range(0, simulation.timesteps, 10))
+    assert summary["variables"][0]["variable"] == "agent_*"
+    assert (tmp_path / "memory_runs.csv").exists()
@@ -0,0 +1,30 @@
+import numpy as np
+
+from experiments.notebook_helpers import get_quantile_bands, lttb, plot_fan_chart
+
+
+def test_lttb():
+    x = np.arange(1_000)
+    y = np.sin(x / 50)
+    indices = lttb(x, y, 100)
+
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == len(x) - 1
+    assert np.all(np.diff(indices) > 0)
+    # Peaks and troughs are kept
+    assert np.abs(y[indices]).max() > 0.99
+    np.testing.assert_array_equal(lttb(x[:50], y[:50], 100), np.arange(50))
+
+
+def test_fan_chart(raw_results):
+    bands = get_quantile_bands(raw_results, "volatile_asset_price")
+    assert list(bands.columns) == [0.05, 0.25, 0.5, 0.75, 0.95]
+    assert (bands.diff(axis=1).iloc[:, 1:] >= 0).all().all()
+    np.testing.assert_allclose(
+        bands[0.5], raw_results.groupby("timestep")["volatile_asset_price"].median().to_numpy()
+    )
+
+    fig = plot_fan_chart(raw_results, "volatile_asset_price", sample_paths=2, max_points=10)
+    # Two traces per band, the median, and the sampled paths, independent of the number of runs
+    assert len(fig.data) == 2 * 2 + 1 + 2
+    assert all(len(trace.x) <= 10 for trace in fig.data)
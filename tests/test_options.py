@@ -0,0 +1,104 @@
+import copy
+import gc
+import weakref
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from model.parts.options import _payoff_series_cache, discounted_payoff_series
+from model.stochastic_processes import ProcessSpec, SampledProcess
+from model.system_parameters import create_volatile_asset_price_process
+from model.types import Option
+
+
+@pytest.mark.parametrize("option_type", ["call", "put", "straddle"])
+def test_discounted_payoff_series(option_type):
+    prices = 2_000 * np.exp(np.cumsum(np.random.normal(0, 0.02, 100)))
+    series = discounted_payoff_series(prices, option_type, 2_000, 365, 0.03, 1)
+
+    payoff = Option(option_type=option_type).payoff()
+    expected = [payoff(price, 2_000) * np.exp(-0.03 / 365 * (365 - t)) for t, price in enumerate(prices)]
+    np.testing.assert_allclose(series, expected)
+
+    with pytest.raises(ValueError):
+        discounted_payoff_series(prices, "binary", 2_000, 365, 0.03, 1)
+
+
+def test_simulation_discounted_payoff_option_type(simulation):
+    simulation = copy.deepcopy(simulation)
+    simulation.runs = 2
+    simulation.model.params.update({"option_type": ["put"]})
+    df = pd.DataFrame(simulation.run())
+
+    df = df[df["timestep"] > 0]
+    strike_price = simulation.model.params["strike_price"][0]
+    expected = np.maximum(strike_price - df["volatile_asset_price"], 0) * np.exp(
+        -df["risk_free_rate"] / 365 * (simulation.model.params["option_maturity"][0] - df["timestep"])
+    )
+    np.testing.assert_allclose(df["discounted_payoff"], expected)
+    assert (df["discounted_payoff"] > 0).any()
+
+
+@pytest.mark.parametrize(
+    "process",
+    [
+        "geometric_brownian_motion_process",
+        "manual_gbm_process",
+        "brownian_motion_process",
+        "gaussian_noise_process",
+        "heston_process",
+        "merton_jump_diffusion_process",
+        "regime_switching_gbm_process",
+        "historical_replay_process",
+        "block_bootstrap_process",
+    ],
+)
+def test_simulation_price_process_layout(simulation, process):
+    # Every process is sampled from the first price following the initial price, up to its last sample
+    parameters = {
+        "gaussian_noise_process": {"mu": 2_000},
+        "historical_replay_process": {"prices": 1_000 * np.exp(np.cumsum(np.random.normal(0, 0.02, 500)))},
+        "block_bootstrap_process": {"prices": 1_000 * np.exp(np.cumsum(np.random.normal(0, 0.02, 500)))},
+    }.get(process, {})
+    simulation = copy.deepcopy(simulation)
+    simulation.runs = 1
+    simulation.timesteps = 10
+    volatile_asset_price_process = create_volatile_asset_price_process(timesteps=10, runs=1, process=process, **parameters)
+    simulation.model.params.update({"volatile_asset_price_process": [volatile_asset_price_process]})
+    df = pd.DataFrame(simulation.run())
+
+    prices = df.groupby("timestep")["volatile_asset_price"].last()
+    assert prices[1] != prices[0]
+    np.testing.assert_array_equal(prices[1:], volatile_asset_price_process.samples[0])
+
+
+def test_simulation_discounted_payoff_callable_process(simulation):
+    # A function of the run and time, only defined over the timesteps of the simulation
+    samples = 2_000 * np.exp(np.cumsum(np.random.normal(0, 0.02, (2, 10)), axis=1))
+    simulation = copy.deepcopy(simulation)
+    simulation.runs = 2
+    simulation.timesteps = 10
+    simulation.model.params.update({"volatile_asset_price_process": [lambda run, t: samples[run - 1][t]]})
+    df = pd.DataFrame(simulation.run())
+
+    df = df[df["timestep"] > 0]
+    expected = np.maximum(df["volatile_asset_price"] - simulation.model.params["strike_price"][0], 0) * np.exp(
+        -df["risk_free_rate"] / 365 * (simulation.model.params["option_maturity"][0] - df["timestep"])
+    )
+    np.testing.assert_allclose(df["discounted_payoff"], expected)
+
+
+def test_payoff_series_cache_releases_processes(simulation):
+    simulation = copy.deepcopy(simulation)
+    simulation.runs = 1
+    spec = ProcessSpec("manual_gbm_process", runs=1, seed=1, parameters={"mu": 0.1, "sigma": 0.25})
+    process = SampledProcess(spec=spec, storage="shared_memory")
+    simulation.model.params.update({"volatile_asset_price_process": [process]})
+    simulation.run()
+    assert process in _payoff_series_cache
+
+    released = weakref.ref(process)
+    del simulation, process
+    gc.collect()
+    assert released() is None
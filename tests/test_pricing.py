@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from model.pricing import OPTION_TYPES, OptionPriceSurface, black_scholes_price
+from model.types import Option
+
+
+@pytest.fixture(scope="module")
+def surface():
+    return OptionPriceSurface()
+
+
+@pytest.mark.parametrize("option_type", OPTION_TYPES)
+def test_black_scholes_price_matches_option(option_type):
+    option = Option(
+        option_type=option_type,
+        underlying_price=2_100.0,
+        strike_price=2_000,
+        maturity=365,
+        risk_free_rate=0.03,
+        volatility=0.6,
+    )
+    t = 100
+    price = black_scholes_price(option_type, 2_100.0, 2_000, (365 - t + 1) / 365, 0.03, 0.6)
+    assert price == pytest.approx(option.bsm_price(t), rel=1e-10)
+
+
+@pytest.mark.parametrize("option_type", OPTION_TYPES)
+def test_surface_error_within_bound(surface, option_type):
+    rng = np.random.default_rng(1)
+    n = 100_000
+    (x_start, s_start, sigma_start), (x_stop, s_stop, sigma_stop) = surface._start, surface._stop
+    # Random off-grid quotes over the grid domain, and near the money at short maturities and low volatilities,
+    # where the second derivatives of the price are largest
+    x_step, s_step, sigma_step = surface._step
+    K = rng.uniform(500, 5_000, 2 * n)
+    S = K * np.exp(np.r_[rng.uniform(x_start, x_stop, n), rng.uniform(-2 * x_step, 2 * x_step, n)])
+    tau = np.r_[rng.uniform(s_start, s_stop, n), rng.uniform(s_start, s_start + 2 * s_step, n)] ** 2
+    sigma = np.r_[rng.uniform(sigma_start, sigma_stop, n), rng.uniform(sigma_start, sigma_start + 2 * sigma_step, n)]
+
+    expected = black_scholes_price(option_type, S, K, tau, surface.risk_free_rate, sigma)
+    error = np.abs(surface.price(option_type, S, K, tau, sigma) - expected) / K
+    assert error.max() <= surface.error_bound[option_type]
+
+
+def test_surface_falls_back_outside_domain(surface):
+    S = np.array([2_000.0, 2_000.0, 100_000.0])
+    K = np.array([2_000.0, 2_000.0, 2_000.0])
+    tau = np.array([0.5, 1 / 365, 0.5])
+    sigma = np.array([0.5, 0.5, 3.0])
+
+    expected = black_scholes_price("put", S, K, tau, surface.risk_free_rate, sigma)
+    prices = surface.price("put", S, K, tau, sigma)
+    assert prices[0] == pytest.approx(expected[0], abs=K[0] * surface.error_bound["put"])
+    np.testing.assert_allclose(prices[1:], expected[1:])
+    # A different risk-free rate uses the closed-form price
+    assert surface.price("put", S, K, tau, sigma, r=0.05) == pytest.approx(
+        black_scholes_price("put", S, K, tau, 0.05, sigma)
+    )
+
+
+def test_surface_option_price(surface):
+    option = Option(
+        option_type="straddle",
+        underlying_price=1_900.0,
+        strike_price=2_000,
+        maturity=365,
+        risk_free_rate=surface.risk_free_rate,
+        volatility=0.4,
+    )
+    assert surface.option_price(option, 50) == pytest.approx(
+        option.bsm_price(50), abs=option.strike_price * surface.error_bound["straddle"]
+    )
+
+
+@pytest.mark.parametrize("option_type", OPTION_TYPES)
+def test_surface_scalar_lookup_matches_vectorized(surface, option_type):
+    rng = np.random.default_rng(2)
+    K = rng.uniform(500, 5_000, 100)
+    S = K * np.exp(rng.uniform(-2, 2, 100))
+    tau = rng.uniform(0, 1.2, 100)
+    sigma = rng.uniform(0, 1.2, 100)
+
+    prices = surface.price(option_type, S, K, tau, sigma)
+    scalar_prices = [surface.price(option_type, *quote) for quote in zip(S, K, tau, sigma)]
+    np.testing.assert_allclose(scalar_prices, prices, rtol=1e-12)
@@ -0,0 +1,23 @@
+import copy
+
+import pandas as pd
+
+from experiments.profiling import Profiler
+
+
+def test_profiler(simulation, tmp_path):
+    simulation = copy.deepcopy(simulation)
+    state_update_blocks = simulation.model.state_update_blocks
+    profiler = Profiler(tmp_path, allocations=True)
+
+    profiler.instrument(simulation)
+    simulation.run()
+    profiler.restore(simulation)
+    df = profiler.report()
+
+    assert simulation.model.state_update_blocks is state_update_blocks
+    policy = df.query('function == "agent_actions:model.parts.agents.policy_agents"').iloc[0]
+    assert policy["calls"] == simulation.runs * simulation.timesteps
+    assert policy["p99_us"] >= policy["p50_us"] > 0
+    assert "pickle.dumps" in set(df["function"])
+    assert len(pd.read_csv(tmp_path / "profile_summary.csv")) == len(df)
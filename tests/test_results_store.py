@@ -0,0 +1,99 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from experiments.checkpoint import Checkpointer
+from experiments.results_store import ResultsStore, precision_report, write_checkpoint_results, write_results
+
+
+def test_results_store_query(raw_results, tmp_path):
+    # Small parts, so that runs span several parts
+    store = write_results(tmp_path, raw_results, chunk_size=50)
+    assert len(store) == len(raw_results)
+    assert len(store.parts) > 1
+
+    df = (
+        store.select("volatile_asset_price", agent_fields=["premium_paid", "bought_from_Id", "exercisedAt"])
+        .where(runs=(2, 3), timesteps=(10, 20), agents=[0, 7])
+        .to_pandas()
+    )
+    expected = raw_results.query("2 <= run <= 3 and 10 <= timestep <= 20").reset_index(drop=True)
+    assert list(df.columns) == [
+        "simulation",
+        "subset",
+        "run",
+        "timestep",
+        "volatile_asset_price",
+        "agent_0.premium_paid",
+        "agent_7.premium_paid",
+        "agent_0.bought_from_Id",
+        "agent_7.bought_from_Id",
+        "agent_0.exercisedAt",
+        "agent_7.exercisedAt",
+    ]
+    np.testing.assert_array_equal(df["timestep"], expected["timestep"])
+    np.testing.assert_array_equal(df["volatile_asset_price"], expected["volatile_asset_price"])
+    np.testing.assert_array_equal(df["agent_7.premium_paid"], expected["agent_7"].map(lambda agent: agent.premium_paid))
+    assert list(df["agent_0.bought_from_Id"].astype(object).where(df["agent_0.bought_from_Id"].notna(), None)) == list(
+        expected["agent_0"].map(lambda agent: agent.bought_from_Id)
+    )
+    exercised_at = expected["agent_7"].map(lambda agent: agent.exercisedAt).astype(float)
+    np.testing.assert_array_equal(df["agent_7.exercisedAt"], exercised_at)
+
+
+def test_results_store_final_and_numpy(raw_results, tmp_path):
+    store = write_results(tmp_path, raw_results.to_dict("records"), chunk_size=40)
+    final = store.select("volatile_asset_price", agent_fields=["exercised"]).where(final=True).to_numpy()
+
+    expected = raw_results.groupby("run").tail(1)
+    np.testing.assert_array_equal(final["run"], expected["run"])
+    np.testing.assert_array_equal(final["volatile_asset_price"], expected["volatile_asset_price"])
+    assert final["agent.exercised"].shape == (len(expected), len(store.agents))
+
+    empty = store.select("volatile_asset_price").where(runs=[99]).to_numpy()
+    assert len(empty["volatile_asset_price"]) == 0
+    assert sum(len(df) for df in store.select().where(subsets=0).iter_pandas()) == len(raw_results)
+
+
+def test_write_checkpoint_results(simulation, tmp_path):
+    checkpointer = Checkpointer(tmp_path / "checkpoints", every=10)
+    checkpointer.run(simulation)
+    store = write_checkpoint_results(tmp_path / "results", tmp_path / "checkpoints")
+
+    expected = pd.DataFrame(simulation.results)
+    assert len(store) == len(expected)
+    np.testing.assert_array_equal(
+        ResultsStore(tmp_path / "results").select("discounted_payoff").to_numpy()["discounted_payoff"],
+        expected["discounted_payoff"],
+    )
+
+
+# Decoding missing optional integers must not cast NaN to an integer
+@pytest.mark.filterwarnings("error::RuntimeWarning")
+def test_compact_results_store(raw_results, tmp_path):
+    store = write_results(tmp_path / "full", raw_results)
+    compact_store = write_results(tmp_path / "compact", raw_results, chunk_size=50, compact=True)
+
+    report = precision_report(compact_store, store)
+    assert report["within_precision"].all(), report
+    assert report.loc["volatile_asset_price", "dtype"] == "float32"
+    assert report.loc["agent.bought_from_Id", "dtype"] == "int32"
+    assert report.loc["agent.option_side", "dtype"] == "int8"
+
+    def size(directory):
+        return sum(os.path.getsize(path) for path in glob.glob(os.path.join(directory, "*", "*.npy")))
+
+    assert size(tmp_path / "compact") < 0.6 * size(tmp_path / "full")
+
+    df = compact_store.select(agent_fields=["option_side", "sold_to_Id", "premium_received"]).where(agents=[3]).to_pandas()
+    expected = raw_results["agent_3"]
+    assert list(df["agent_3.option_side"].astype(object).where(df["agent_3.option_side"].notna(), None)) == list(
+        expected.map(lambda agent: agent.option_side)
+    )
+    assert list(df["agent_3.sold_to_Id"].astype(object).where(df["agent_3.sold_to_Id"].notna(), None)) == [
+        None if agent.sold_to_Id is None else int(agent.sold_to_Id) for agent in expected
+    ]
+    np.testing.assert_allclose(df["agent_3.premium_received"], expected.map(lambda agent: agent.premium_received), rtol=1e-7)
@@ -0,0 +1,16 @@
+import numpy as np
+
+from experiments.scaling import fit_scaling_exponent, log_grid
+
+
+def test_log_grid():
+    assert log_grid(10, 1_000, 3) == [10, 100, 1_000]
+    assert log_grid(1, 2, 5) == [1, 2]
+
+
+def test_fit_scaling_exponent():
+    x = np.array([10, 100, 1_000])
+
+    assert np.isclose(fit_scaling_exponent(x, 3 * x**2), 2)
+    assert np.isclose(fit_scaling_exponent(x, 0.5 * x), 1)
+    assert fit_scaling_exponent([10], [1]) is None
@@ -0,0 +1,59 @@
+import copy
+
+import pandas as pd
+import pytest
+
+from experiments.checkpoint import Checkpointer, load_parameters
+from experiments.shard import main, merge_shards, shard_from_environment
+
+
+def test_merge_shards_identical_to_single_node(simulation, tmp_path):
+    simulation = copy.deepcopy(simulation)
+    simulation.runs = 5
+    simulation.timesteps = 30
+
+    Checkpointer(tmp_path / "single", seed=7).run(simulation)
+    expected = pd.DataFrame(simulation.results)
+
+    directories = [tmp_path / f"shard-{index}" for index in range(3)]
+    for index, directory in enumerate(directories):
+        Checkpointer(directory, seed=7).run(simulation, shard=(index, 3))
+        assert sorted({result["run"] for result in simulation.results}) == list(range(index + 1, 6, 3))
+
+    with pytest.raises(ValueError):
+        merge_shards(directories[:2])
+    # A shard of a different configuration isn't merged
+    put = copy.deepcopy(simulation)
+    put.model.params.update({"option_type": ["put"]})
+    Checkpointer(tmp_path / "put", seed=7).run(put, shard=(2, 3))
+    with pytest.raises(ValueError):
+        merge_shards(directories[:2] + [tmp_path / "put"])
+
+    results, exceptions = merge_shards(list(reversed(directories)))
+    pd.testing.assert_frame_equal(pd.DataFrame(results), expected)
+    assert [exception["run"] for exception in exceptions] == list(range(5))
+
+
+def test_shard_from_environment():
+    assert shard_from_environment({"SLURM_ARRAY_TASK_ID": "3"}) == 3
+    assert shard_from_environment({"SGE_TASK_ID": "1"}) == 0
+    with pytest.raises(ValueError):
+        shard_from_environment({})
+
+
+def test_shard_main_post_processes_with_experiment_parameters(simulation, tmp_path):
+    simulation = copy.deepcopy(simulation)
+    simulation.runs = 2
+    simulation.timesteps = 10
+    simulation.model.params.update({"p_buy": [0.05, 0.1]})
+
+    directories = [tmp_path / f"shard-{index}" for index in range(2)]
+    for index, directory in enumerate(directories):
+        Checkpointer(directory).run(simulation, shard=(index, 2))
+    assert load_parameters(directories[0])["p_buy"] == [0.05, 0.1]
+
+    output = tmp_path / "results.pkl"
+    main([str(directory) for directory in directories] + ["--output", str(output)])
+    df = pd.read_pickle(output)
+    assert sorted(df["subset"].unique()) == [0, 1]
+    assert (df["dt"] == simulation.model.params["dt"][0]).all()
@@ -0,0 +1,99 @@
+import multiprocessing
+import pickle
+
+import numpy as np
+import pytest
+
+from model.stochastic_processes import ProcessSpec, SampledProcess, create_stochastic_process_realizations
+
+SPEC = ProcessSpec("manual_gbm_process", timesteps=50, runs=8, parameters={"mu": 0.1, "sigma": 0.25, "initial_price": 2000})
+
+
+def read_samples(process):
+    return process.samples.copy()
+
+
+def test_process_spec():
+    expected = create_stochastic_process_realizations(
+        "manual_gbm_process", timesteps=50, runs=8, mu=0.1, sigma=0.25, initial_price=2000
+    )
+    np.testing.assert_array_equal(SPEC.generate(), expected)
+
+    seeded = ProcessSpec(SPEC.process, timesteps=50, runs=8, seed=3, parameters=SPEC.parameters)
+    np.testing.assert_array_equal(seeded.generate(), seeded.generate())
+    assert not np.array_equal(seeded.generate(), expected)
+
+
+def test_shared_memory_process_pickled_as_handle():
+    process = SampledProcess(spec=SPEC, storage="shared_memory")
+    large_process = SampledProcess(
+        spec=ProcessSpec(SPEC.process, timesteps=365, runs=500, parameters=SPEC.parameters), storage="shared_memory"
+    )
+    # The pickled size doesn't depend on the size of the samples
+    assert len(pickle.dumps(process)) < len(pickle.dumps(large_process)) < 1_000 < large_process.samples.nbytes
+
+    with multiprocessing.get_context("spawn").Pool(2) as pool:
+        for samples in pool.map(read_samples, [process] * 4):
+            np.testing.assert_array_equal(samples, SPEC.generate())
+
+    attached = pickle.loads(pickle.dumps(process))
+    assert attached(3, 10) == process(3, 10)
+    assert not attached.samples.flags.writeable
+
+
+def test_missing_shared_memory_regenerated_from_spec():
+    process = SampledProcess(spec=SPEC, storage="shared_memory")
+    state = pickle.dumps(process)
+    process._shared_memory.unlink()
+    np.testing.assert_array_equal(pickle.loads(state).samples, SPEC.generate())
+
+    with pytest.raises(ValueError):
+        SampledProcess(samples=SPEC.generate(), spec=SPEC)
+
+    # Samples of a process without a seed that depend on previously generated processes aren't regenerated
+    unseeded = ProcessSpec("geometric_brownian_motion_process", timesteps=10, parameters={"mu": 0.1, "sigma": 0.25})
+    assert SPEC.deterministic and not unseeded.deterministic
+    process = SampledProcess(spec=unseeded, storage="shared_memory")
+    state = pickle.dumps(process)
+    process._shared_memory.unlink()
+    with pytest.raises(RuntimeError):
+        pickle.loads(state)
+
+
+def test_memmap_process(tmp_path):
+    path = str(tmp_path / "paths.npy")
+    process = SampledProcess(samples=SPEC.generate(), storage="memmap", path=path)
+    attached = pickle.loads(pickle.dumps(process))
+    assert isinstance(attached.samples, np.memmap)
+    np.testing.assert_array_equal(attached.samples, SPEC.generate())
+
+
+@pytest.mark.parametrize("process", ["heston_process", "merton_jump_diffusion_process", "regime_switching_gbm_process"])
+def test_batched_processes(process):
+    samples = create_stochastic_process_realizations(process, timesteps=365, runs=2_000, seed=3, mu=0.1, initial_price=2000)
+    assert samples.shape == (2_000, 365)
+    assert (samples[:, 0] != 2000).all() and (samples > 0).all()
+    # Each run is seeded with the seed and the run, independently of the number of runs
+    fewer_runs = create_stochastic_process_realizations(process, timesteps=365, runs=5, seed=3, mu=0.1, initial_price=2000)
+    np.testing.assert_array_equal(fewer_runs, samples[:5])
+    # The expected return is `mu`, net of the volatility and jumps
+    terminal_returns = samples[:, -1] / 2000
+    standard_error = terminal_returns.std() / np.sqrt(len(terminal_returns))
+    assert abs(terminal_returns.mean() - np.exp(0.1)) < 4 * standard_error
+
+
+def test_stochastic_volatility_and_jumps():
+    heston = create_stochastic_process_realizations("heston_process", timesteps=365, runs=500, seed=1, sigma=0.5, xi=1.0)
+    merton = create_stochastic_process_realizations("merton_jump_diffusion_process", timesteps=365, runs=500, seed=1)
+    # Stochastic volatility clusters: the magnitude of returns is autocorrelated
+    magnitude = np.abs(np.diff(np.log(heston), axis=1))
+    assert np.corrcoef(magnitude[:, 1:].ravel(), magnitude[:, :-1].ravel())[0, 1] > 0.05
+    # Jumps fatten the tails of returns
+    returns = np.diff(np.log(merton), axis=1).ravel()
+    assert ((returns - returns.mean()) ** 4).mean() / returns.var() ** 2 > 5
+
+    # Without transitions, a regime-switching GBM stays in its initial regime
+    regimes = create_stochastic_process_realizations(
+        "regime_switching_gbm_process", timesteps=365, runs=500, seed=1, transition_matrix=np.eye(2), initial_regime=1
+    )
+    assert np.diff(np.log(regimes), axis=1).std() * np.sqrt(365) == pytest.approx(1.0, rel=0.02)
@@ -0,0 +1,66 @@
+import copy
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from model.strategies import Market, Population, assign_strategies
+from model.system_parameters import parameters
+
+
+PARAMS = {key: value[0] for key, value in parameters.items()}
+
+
+def test_assign_strategies():
+    strategy_of = assign_strategies({"random": 0.5, "threshold_exerciser": 0.2, "volatility_seller": 0.3}, 10)
+    np.testing.assert_array_equal(np.bincount(strategy_of), [5, 2, 3])
+    assert (np.diff(strategy_of) >= 0).all()
+    with pytest.raises(ValueError):
+        assign_strategies({"martingale": 1.0}, 10)
+    with pytest.raises(ValueError):
+        assign_strategies({"random": 0.0}, 10)
+
+
+def test_strategy_kernels():
+    agent_strategies = {"threshold_exerciser": 1, "premium_sensitive_buyer": 1, "volatility_seller": 1}
+    params = {**PARAMS, "p_buy": 1.0, "p_sell": 1.0, "p_exercise": 1.0}
+    population = Population(agent_strategies, params, 6)
+    calm = Market(timestep=10, underlying_price=2_000.0, option_price=50.0, volatility=0.1)
+    expensive = calm._replace(option_price=500.0, volatility=1.0)
+
+    # Premium-sensitive buyers only buy cheap options, and volatility sellers only sell in volatile markets, and never buy
+    np.testing.assert_array_equal(population.buy(calm), [1, 1, 1, 1, 0, 0])
+    np.testing.assert_array_equal(population.buy(expensive), [1, 1, 0, 0, 0, 0])
+    np.testing.assert_array_equal(population.sell(calm), [1, 1, 1, 1, 0, 0])
+    np.testing.assert_array_equal(population.sell(expensive), [1, 1, 1, 1, 1, 1])
+
+    # Options are exercised by the strategy of their holder: threshold exercisers require a return of `exercise_threshold`
+    holders = [0, 2, 0, 2]
+    intrinsic_value = np.array([120.0, 120.0, 160.0, 160.0])
+    exercised = population.exercise(calm, holders, intrinsic_value, 100.0)
+    np.testing.assert_array_equal(exercised, [False, True, True, True])
+
+
+def test_single_strategy_draws():
+    # A population of a single strategy draws the same random numbers as a single draw for all agents
+    market = Market(timestep=10, underlying_price=2_000.0, option_price=50.0, volatility=0.1)
+    np.random.seed(1)
+    mask = Population.from_params(PARAMS, 1_000).sell(market)
+    np.random.seed(1)
+    np.testing.assert_array_equal(mask, np.random.random(1_000) < PARAMS["p_sell"])
+
+
+def test_mixed_population_simulation(simulation):
+    simulation = copy.deepcopy(simulation)
+    simulation.runs = 1
+    simulation.model.params.update(
+        {"agent_strategies": [{"random": 0.5, "volatility_seller": 0.5}], "volatility_threshold": [0.0]}
+    )
+    df = pd.DataFrame(simulation.run())
+
+    final = df.iloc[-1]
+    agents = [final[f"agent_{i}"] for i in range(len(simulation.model.params["agents"][0]))]
+    # Volatility sellers, the second half of the agents, never buy
+    sellers = agents[len(agents) // 2 :]
+    assert all(agent.option_bought_at is None for agent in sellers)
+    assert any(agent.option_bought_at is not None for agent in agents)
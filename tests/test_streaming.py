@@ -0,0 +1,86 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from experiments.checkpoint import Checkpointer
+from experiments.notebook_helpers import get_run_paths
+from experiments.streaming import METRICS, StreamingAggregator, TimestepMoments, TimestepQuantileSketch
+
+
+def test_moments_and_sketch_merge():
+    rng = np.random.default_rng(1)
+    values = np.exp(np.cumsum(rng.normal(0, 0.02, (4_000, 50)), axis=1))
+    values[:100, 10] = np.nan
+
+    moments = [TimestepMoments(50), TimestepMoments(50)]
+    sketches = [TimestepQuantileSketch(50), TimestepQuantileSketch(50)]
+    for i, run in enumerate(values):
+        moments[i % 2].update(run)
+        sketches[i % 2].update(run)
+    moments[0].merge(moments[1])
+    sketches[0].merge(sketches[1])
+
+    np.testing.assert_allclose(moments[0].mean, np.nanmean(values, axis=0))
+    np.testing.assert_allclose(moments[0].std, np.nanstd(values, axis=0, ddof=1))
+    np.testing.assert_array_equal(moments[0].max, np.nanmax(values, axis=0))
+    assert moments[0].count[10] == 3_900
+
+    # Memory is bounded independently of the number of runs
+    assert sketches[0].means.shape[1] <= sketches[0].compression + sketches[0].buffer_size
+
+    quantiles = np.array([0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99])
+    estimates = sketches[0].quantile(quantiles)
+    for timestep in range(50):
+        column = values[:, timestep][~np.isnan(values[:, timestep])]
+        ranks = (column[:, None] <= estimates[:, timestep]).mean(axis=0)
+        np.testing.assert_allclose(ranks, quantiles, atol=0.01)
+    np.testing.assert_array_equal(sketches[0].quantile([0, 1]), [np.nanmin(values, axis=0), np.nanmax(values, axis=0)])
+
+
+def test_streaming_aggregator(simulation, raw_results, tmp_path):
+    aggregator = StreamingAggregator()
+    aggregator.update_results(raw_results)
+    paths = get_run_paths(raw_results, "volatile_asset_price")
+
+    assert aggregator.runs[(0, 0)] == paths.shape[1]
+    moments = aggregator.moments("volatile_asset_price")
+    np.testing.assert_allclose(moments.mean, paths.mean(axis=1))
+    # With fewer runs than centroids, the sketch is exact at the minimum, median and maximum
+    bands = aggregator.quantile_bands("volatile_asset_price", quantiles=(0, 0.5, 1))
+    np.testing.assert_allclose(bands[0], paths.min(axis=1))
+    np.testing.assert_allclose(bands[0.5], np.median(paths, axis=1))
+    np.testing.assert_allclose(bands[1], paths.max(axis=1))
+
+    table = aggregator.risk_table("open_interest")
+    assert list(table.index) == [len(paths) - 1]
+    assert table["runs"].iloc[0] == paths.shape[1]
+
+    # Aggregates of runs computed in worker processes are merged
+    Checkpointer(tmp_path, every=10).run(simulation)
+    metrics = {**METRICS, "price_squared": lambda state: state["volatile_asset_price"] ** 2}
+    merged = StreamingAggregator.from_checkpoint(tmp_path, metrics=metrics, processes=2)
+    expected = StreamingAggregator(metrics)
+    expected.update_results(simulation.results)
+    for metric in expected.metrics:
+        np.testing.assert_allclose(merged.moments(metric).mean, expected.moments(metric).mean)
+        np.testing.assert_allclose(merged.moments(metric).variance, expected.moments(metric).variance)
+
+
+def _price_squared(state):
+    return state["volatile_asset_price"] ** 2
+
+
+def test_streaming_aggregator_pickled_metrics(raw_results):
+    aggregator = StreamingAggregator({**METRICS, "price_squared": _price_squared})
+    aggregator.update_results(raw_results)
+
+    restored = pickle.loads(pickle.dumps(aggregator))
+    assert restored.metrics == aggregator.metrics
+    np.testing.assert_array_equal(restored.moments("price_squared").mean, aggregator.moments("price_squared").mean)
+
+    # Metrics pickled by name must be registered in `METRICS`
+    state = aggregator.__getstate__()
+    state["metrics"]["unknown"] = "unknown"
+    with pytest.raises(ValueError, match="Unknown metric unknown"):
+        StreamingAggregator().__setstate__(state)
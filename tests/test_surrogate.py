@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+from scipy.optimize import check_grad
+
+from experiments.surrogate import GaussianProcess, KPISurrogate, summarise_sweep, validation_report
+from experiments.sweep import run_sweep
+
+
+def test_gaussian_process_gradient():
+    rng = np.random.default_rng(1)
+    X = rng.uniform(size=(20, 2))
+    y = np.sin(3 * X[:, 0]) + X[:, 1]
+    squared_differences = (X[:, None, :] - X[None, :, :]) ** 2
+    gp = GaussianProcess()
+
+    error = check_grad(
+        lambda theta: gp._negative_log_marginal_likelihood(theta, X, y, squared_differences)[0],
+        lambda theta: gp._negative_log_marginal_likelihood(theta, X, y, squared_differences)[1],
+        np.array([-1.0, 0.5, 0.2, -2.0]),
+    )
+    assert error < 1e-4
+
+
+def test_surrogate_predicts_smooth_function(tmp_path):
+    rng = np.random.default_rng(1)
+    n = 60
+    points = pd.DataFrame(
+        {
+            "mu": rng.uniform(-0.2, 0.2, n),
+            "strike_price": rng.uniform(1_500, 2_500, n),
+            "option_type": rng.choice(["call", "put"], n),
+        }
+    )
+    sign = np.where(points["option_type"] == "call", 1, -1)
+    summary = points.assign(buyer_pnl_mean=sign * 100 * points["mu"] - (points["strike_price"] - 2_000) / 100)
+
+    features = ["mu", "strike_price", "option_type"]
+    surrogate = KPISurrogate.fit_summary(summary.iloc[:50], features, ["buyer_pnl_mean"])
+    predicted = surrogate.predict(summary.iloc[50:], return_std=True)
+
+    actual = summary["buyer_pnl_mean"].iloc[50:]
+    assert np.abs(predicted["buyer_pnl_mean"] - actual).max() < 0.05 * np.ptp(summary["buyer_pnl_mean"])
+    assert (predicted["buyer_pnl_mean_std"] >= 0).all()
+
+
+def test_validation_report(simulation, tmp_path):
+    results = run_sweep(
+        scenarios={"Bull": {"mu": 0.1, "sigma": 0.25}, "Bear": {"mu": -0.15, "sigma": 0.25}},
+        option_types=["call", "put"],
+        strikes=[1_800, 2_000, 2_200],
+        runs=3,
+        timesteps=10,
+        simulation=simulation,
+    )
+    summary = summarise_sweep(results)
+    assert len(summary) == 2 * 2 * 3
+    assert {"buyer_pnl_mean", "buyer_pnl_q05", "seller_pnl_q95", "exercise_rate_mean"} <= set(summary.columns)
+
+    metrics = validation_report(results, output_dir=tmp_path, folds=3, restarts=0)
+    assert set(metrics["target"]) >= {"buyer_pnl_mean", "seller_pnl_mean"}
+    assert (tmp_path / "surrogate_validation.json").exists()
+    assert (tmp_path / "surrogate_predictions.csv").exists()
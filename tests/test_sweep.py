@@ -0,0 +1,25 @@
+from experiments.sweep import create_sweep_simulation, run_sweep
+
+SCENARIOS = {"Bull": {"mu": 0.1, "sigma": 0.25}, "Bear": {"mu": -0.15, "sigma": 0.25}}
+
+
+def test_sweep_shares_price_paths(simulation):
+    sweep_simulation, subsets = create_sweep_simulation(
+        scenarios=SCENARIOS, option_types=["call", "put"], strikes=[1_900, 2_100], runs=2, timesteps=10, simulation=simulation
+    )
+    processes = sweep_simulation.model.params["volatile_asset_price_process"]
+
+    assert len(subsets) == len(processes) == 8
+    assert len({id(process) for process in processes}) == 2
+    assert processes[0] is processes[3]
+    assert [subset["scenario"] for subset in subsets] == ["Bull"] * 4 + ["Bear"] * 4
+
+
+def test_run_sweep(simulation):
+    df = run_sweep(scenarios=SCENARIOS, option_types=["call", "straddle"], runs=2, timesteps=10, simulation=simulation)
+
+    assert len(df) == 2 * 2 * 2
+    assert set(df["option_type"]) == {"call", "straddle"}
+    # Scenarios share price paths across option types
+    bull = df.query('scenario == "Bull"')
+    assert bull.groupby("run")["final_va_price"].nunique().eq(1).all()
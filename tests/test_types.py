@@ -0,0 +1,53 @@
+import copy
+import pickle
+
+import pytest
+
+import model.types as types
+from model.types import Agent, Option
+
+
+def test_agent_fields_and_aliases():
+    agent = Agent(agent_id="1", _premium_paid=10.0)
+
+    assert agent.premium_paid == agent._premium_paid == 10.0
+    agent._exercised = True
+    assert agent.exercised is True
+    assert list(agent.__dict__)[:3] == ["agent_id", "_option_side", "_has_counterparty"]
+    assert agent.key == "agent_1"
+    with pytest.raises(AttributeError):
+        agent.unknown_field = 1
+    with pytest.raises(TypeError):
+        Agent(agent_id="1", unknown_field=1)
+
+
+def test_agent_copy():
+    agent = Agent(agent_id="1", premium_paid=10.0, bought_from_Id="2")
+
+    for copied in [pickle.loads(pickle.dumps(agent, -1)), copy.deepcopy(agent), copy.copy(agent)]:
+        assert copied == agent
+        assert copied is not agent
+
+
+def test_agent_validation(monkeypatch):
+    Agent(agent_id=1)
+    with pytest.raises(TypeError):
+        Agent(agent_id=1).validate()
+
+    monkeypatch.setattr(types, "DEBUG", True)
+    with pytest.raises(TypeError):
+        Agent(agent_id="1", exercised="yes")
+    Agent(agent_id="1", premium_paid=1, option_side="buy").validate()
+
+
+def test_agent_buy_and_exercise_option():
+    buyer, seller = Agent(agent_id="0"), Agent(agent_id="1", accepting_buy_order=True)
+    option = Option(option_type="call", strike_price=2_000, maturity=365, risk_free_rate=0.03)
+
+    buyer.buy_option(seller, 10, 100.0)
+    buyer.exercise(seller, option, 2_500, 30)
+
+    assert (buyer.bought_from_Id, seller.sold_to_Id) == ("1", "0")
+    assert buyer.payoff_received == seller.payoff_paid == 500
+    assert buyer.time_held == seller.time_held == 20
+    assert buyer.exercised and seller.exercised and not seller.accepting_buy_order